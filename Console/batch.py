@@ -0,0 +1,244 @@
+# Author: Paul Wyers
+# Copyright (C) 2025 Paul Wyers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Headless batch G-code generation with the GUI's pipeline (TrueType or
+single-line stroke fonts).
+
+Reads labels from a CSV, JSON or text file (or stdin) and writes G-code
+through the same geometry and gcode layers the GUI uses — no window, no
+display, no system font scan. For example:
+
+    python batch.py tags.csv --font "DejaVu Sans" -o tags.gcode
+    python batch.py tags.json --font /path/Arial.ttf --per-file 50 -o out/tag.gcode
+    python batch.py tags.txt --font simplex -o tags.gcode   (single-line stroke font)
+    export_tags | python batch.py - --fill -o -
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "GUI"))
+
+import gcode  # noqa: E402  (these need the path above)
+import geometry  # noqa: E402
+import machine  # noqa: E402
+import strokefont  # noqa: E402
+
+
+def parse_labels(text, fmt, column="label"):
+    """Label strings from CSV / JSON / plain-text content.
+
+    csv:  the `column` column if the header has one, else the first column
+    json: a list of strings, a list of objects with a `column` key, or an
+          object holding such a list under "labels"
+    txt:  one label per line
+    Blank labels are dropped."""
+    if fmt == "json":
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("labels", [])
+        labels = [row.get(column, "") if isinstance(row, dict) else row for row in data]
+    elif fmt == "csv":
+        rows = list(csv.reader(io.StringIO(text)))
+        col = 0
+        if rows and column in rows[0]:
+            col = rows[0].index(column)
+            rows = rows[1:]
+        labels = [row[col] if col < len(row) else "" for row in rows]
+    else:
+        labels = text.splitlines()
+    return [str(lbl).strip() for lbl in labels if str(lbl).strip()]
+
+
+def guess_format(path, text):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".csv", ".json", ".txt"):
+        return ext[1:]
+    return "json" if text.lstrip().startswith(("[", "{")) else "txt"
+
+
+def resolve_font(font):
+    """A font path as given, one of the stroke fonts in fonts/ by name
+    ("simplex" or "font_simplex"), or a family name looked up in
+    matplotlib's font cache — no findSystemFonts() scan of every font on
+    the box. Raises ValueError if none of those finds it."""
+    if os.path.isfile(font):
+        return font
+    strokes = strokefont.stroke_fonts()
+    for name in (font, "font_" + font):
+        if name in strokes:
+            return strokes[name]
+    from matplotlib.font_manager import FontProperties, findfont
+    try:
+        return findfont(FontProperties(family=font), fallback_to_default=False)
+    except ValueError:
+        raise ValueError(f"font not found: {font!r} (give a family name, a stroke font "
+                         f"name or a .ttf path)") from None
+
+
+def chunked(items, size):
+    if not size:
+        return [items]
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def output_paths(output, count):
+    """One path per output program: `output` itself for a single one, else
+    numbered siblings (tags.gcode -> tags_001.gcode, tags_002.gcode, …)."""
+    if count == 1:
+        return [output]
+    stem, ext = os.path.splitext(output)
+    return [f"{stem}_{i:03d}{ext or '.gcode'}" for i in range(1, count + 1)]
+
+
+def non_negative_int(text):
+    """argparse type: an int >= 0."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"expected a whole number >= 0, got {text!r}")
+    return value
+
+
+def build_parser():
+    p = argparse.ArgumentParser(
+        description="Generate label G-code without the GUI (TrueType or stroke fonts)."
+    )
+    p.add_argument("labels", help="CSV, JSON or text file of labels, or - for stdin")
+    p.add_argument("--font", required=True,
+                   help="TTF file path, font family name, or a stroke font from fonts/ "
+                        "(e.g. simplex)")
+    p.add_argument("-o", "--output", default="labels.gcode",
+                   help="output .gcode file, or - for stdout (default: labels.gcode)")
+    p.add_argument("--format", choices=("auto", "csv", "json", "txt"), default="auto",
+                   help="input format (default: from the file extension)")
+    p.add_argument("--column", default="label",
+                   help="CSV column / JSON key holding the label text (default: label)")
+    p.add_argument("--font-height", type=float, default=10.0,
+                   help="capital letter height in mm (default: 10)")
+    p.add_argument("--spacing", type=float, default=10.0,
+                   help="gap between labels in mm (default: 10)")
+    p.add_argument("--label-size", default="Auto",
+                   help="fixed label size WxH in mm, e.g. 60x20 (default: Auto)")
+    p.add_argument("--fill", action="store_true", help="hatch-fill the text")
+    p.add_argument("--per-file", type=non_negative_int, default=0, metavar="N",
+                   help="split the batch into files of at most N labels each "
+                        "(a batch needing several material sheets is split anyway)")
+    p.add_argument("--settings",
+                   help="cutting parameters JSON (default: the GUI's machine_settings.json, "
+                        "or built-in defaults without one)")
+    p.add_argument("--workers", type=int, default=None, metavar="N",
+                   help="processes rendering the label text of a big batch "
+                        "(default: every CPU; 1 renders in this process)")
+    p.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.verbose:
+        machine.set_log_sink(lambda msg: print(msg, file=sys.stderr))
+
+    if args.labels == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.labels, encoding="utf-8-sig") as f:
+            text = f.read()
+    fmt = guess_format(args.labels, text) if args.format == "auto" else args.format
+    labels = parse_labels(text, fmt, args.column)
+    if not labels:
+        print("no labels to generate", file=sys.stderr)
+        return 1
+    try:
+        label_size = geometry.parse_label_size(args.label_size)
+    except ValueError:
+        print(f"invalid label size: {args.label_size!r} (use WxH, e.g. 60x20)",
+              file=sys.stderr)
+        return 2
+
+    if args.settings is None:
+        gcode.load_settings()
+    else:
+        try:
+            gcode.load_settings(args.settings, strict=True)
+        except (OSError, ValueError) as e:
+            print(f"cannot read settings {args.settings}: {e}", file=sys.stderr)
+            return 2
+    settings = gcode.cnc_settings
+    try:
+        font_path = resolve_font(args.font)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    batches = chunked(labels, args.per_file)
+
+    # Each chunk is packed onto as many material sheets as it needs; every
+    # sheet is its own program (one machine setup)
+    jobs = []
+    for batch in batches:
+        layout = geometry.build_layout(
+            batch, font_path, args.font_height, args.spacing,
+            settings["cutout_padding"], settings["material_width"],
+            settings["material_height"], label_size=label_size,
+            margin=geometry.kerf_radius(settings), workers=args.workers,
+        )
+        jobs.extend(geometry.sheet_layouts(layout))
+    geometry.flush_glyph_stores()
+    if args.output == "-" and len(jobs) > 1:
+        print(f"the batch needs {len(jobs)} programs (sheets/--per-file): "
+              "give a file output, not stdout", file=sys.stderr)
+        return 2
+
+    estimates = []
+    for layout, path in zip(jobs, output_paths(args.output, len(jobs))):
+        if any(item["cutout"][2] > settings["material_width"] or item["cutout"][1] < 0
+               for item in layout):
+            print(f"warning: {path}: labels exceed the material size", file=sys.stderr)
+        too_small = [item["label"] for item in layout if not item["fits"]]
+        if too_small:
+            print(f"warning: {path}: text too big for the label size: "
+                  + ", ".join(too_small), file=sys.stderr)
+        # The text is streamed out as it's rendered; only the compact
+        # toolpath is held, for the run-time estimate
+        tp = gcode.build_toolpath(layout, settings, args.fill)
+        est = gcode.estimate_time(tp, settings)
+        estimates.append(est)
+        lines = gcode.iter_gcode(tp, settings)
+        if path == "-":
+            gcode.write_gcode(sys.stdout, lines)
+            sys.stdout.write("\n")
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            count = gcode.write_gcode(path, lines)
+            print(f"{path}: {len(layout)} labels, {count} lines", file=sys.stderr)
+        print(f"{path}: run time {gcode.describe_estimate(est)}", file=sys.stderr)
+        if args.verbose:
+            for label, seconds in zip(tp.labels, est["labels"]):
+                print(f"  {label}: {gcode.format_duration(seconds)}", file=sys.stderr)
+    if len(estimates) > 1:
+        print(f"job run time {gcode.describe_estimate(gcode.sum_estimates(estimates))}",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,9 +14,21 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 
-import json
+"""Grid of engraved labels in the single-line stroke font, as G-code.
+
+Glyphs come from GUI/strokefont.py, compiled once into NumPy polylines.
+A label's G-code is filled in from per-glyph templates in one pass, so
+thousands of tags take milliseconds."""
+
 import math
 import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "GUI"))
+
+import strokefont  # noqa: E402  (needs the path above)
 
 # Settings
 TEXT_DEPTH = -0.2
@@ -28,8 +40,9 @@ FEED_RATE_ENGRAVE = 300
 FEED_RATE_CUT = 200
 PLUNGE_RATE = 100
 PADDING = 10
-LETTER_SPACING = 10
-CHAR_SPACING = 2
+CHAR_SPACING = 2  # gap between one glyph's strokes and the next
+SPACE_WIDTH = 6  # a space, or a character the font lacks
+KERNING = {}  # character pair -> extra advance, e.g. {"AV": -1.5, "LT": -2}
 LINE_HEIGHT = 10  # Each glyph is drawn in a 10mm tall cell
 GRID_CELL_HEIGHT = 30  # label height including padding
 
@@ -38,86 +51,171 @@ FONT_PATH = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), "..", "fonts", "normalized_full_font.json"
 )
 
-with open(FONT_PATH) as f:
-    FONT = json.load(f)
+FONT = strokefont.open_font(FONT_PATH)  # the packed .sfont beside it when in step
+# Proportional: every glyph advances by its own width (all sizes are in mm)
+LAYOUT = strokefont.TextLayout(FONT, CHAR_SPACING, SPACE_WIDTH, KERNING)
 
+# Labels rendered per block of G-code by iter_grid_gcode
+CHUNK_LABELS = 256
 
-def text_width(text):
-    return len(text) * (LETTER_SPACING + CHAR_SPACING) - CHAR_SPACING
+# Where a coordinate goes in a G-code template; fill_holes() writes it in
+HOLE = "\x01"
 
+# char -> (G-code template, points) for its glyph; () if nothing is drawn
+_compiled = {}
 
-def draw_letter(char, offset_x, offset_y):
-    gcode = []
-    if char == " ":
-        return []  # spaces just advance the cursor
-    strokes = FONT.get(char)
-    if strokes is None:
-        print(f"WARNING: character '{char}' not found in font. Skipping.")
-        return []
-    for (x1, y1), (x2, y2) in strokes:
-        gcode.append(f"G0 X{offset_x + x1:.2f} Y{offset_y + y1:.2f}")
-        gcode.append(f"G1 Z{TEXT_DEPTH:.2f} F{PLUNGE_RATE}")
-        gcode.append(f"G1 X{offset_x + x2:.2f} Y{offset_y + y2:.2f} F{FEED_RATE_ENGRAVE}")
-        gcode.append(f"G0 Z{SAFE_Z:.2f}")
-    return gcode
 
-
-def generate_grid_gcode(labels, filename, columns=3, spacing_x=20, spacing_y=20):
+def text_width(text):
+    return LAYOUT.width(text)
+
+
+def fill_holes(text, values):
+    """text with each HOLE replaced by the next of `values`, as "%.2f".
+
+    A grid repeats the same few thousand coordinates over and over (every
+    row shares its y values, every column its x values), so only the
+    distinct values are formatted; np.unique maps each hole to its string
+    and the pieces are joined once."""
+    pieces = text.split(HOLE)
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if len(values) != len(pieces) - 1:
+        raise ValueError(f"{len(pieces) - 1} holes for {len(values)} values")
+    distinct, index = np.unique(values, return_inverse=True)
+    strings = np.array(["%.2f" % v for v in distinct.tolist()], dtype=object)
+    out = [None] * (2 * len(values) + 1)
+    out[::2] = pieces
+    out[1::2] = strings[index.ravel()].tolist()
+    return "".join(out)
+
+
+def glyph_template(glyph):
+    """The G-code for a compiled glyph with a HOLE for every point
+    coordinate: per polyline, travel to its start, plunge, cut along it and
+    lift. Strokes that share an endpoint are one polyline, so the tool
+    never retracts between them."""
+    lines = []
+    for n in glyph.sizes:
+        lines += [f"G0 X{HOLE} Y{HOLE}", f"G1 Z{TEXT_DEPTH:.2f} F{PLUNGE_RATE}",
+                  f"G1 X{HOLE} Y{HOLE} F{FEED_RATE_ENGRAVE}"]
+        lines += [f"G1 X{HOLE} Y{HOLE}"] * (n - 2)
+        lines.append(f"G0 Z{SAFE_Z:.2f}")
+    return "\n".join(lines)
+
+
+def cutout_template(width, height):
+    """(template, points) for the multi-pass rectangle around a label,
+    relative to its corner; "{0}" in the template is the label number.
+    The last pass is clamped to CUT_DEPTH."""
+    passes = max(1, math.ceil(abs(CUT_DEPTH) / abs(PASS_DEPTH)))
+    lines = []
+    for p in range(1, passes + 1):
+        z = max(CUT_DEPTH, p * PASS_DEPTH)
+        lines += [
+            f"( Cut Label {{0}} Pass {p} )",
+            f"G0 X{HOLE} Y{HOLE}",
+            f"G1 Z{z:.2f} F{PLUNGE_RATE}",
+            f"G1 X{HOLE} Y{HOLE} F{FEED_RATE_CUT}",
+            f"G1 X{HOLE} Y{HOLE}",
+            f"G1 X{HOLE} Y{HOLE}",
+            f"G1 X{HOLE} Y{HOLE}",
+            f"G0 Z{SAFE_Z:.2f}",
+        ]
+    rect = [(0.0, 0.0), (width, 0.0), (width, height), (0.0, height), (0.0, 0.0)]
+    return "\n".join(lines), np.array(rect * passes, dtype=np.float64)
+
+
+def place(points, xs, ys):
+    """The point arrays, each moved by its (x, y), as one flat array of
+    coordinates in order."""
+    counts = [len(p) for p in points]
+    xy = np.concatenate(points)
+    xy[:, 0] += np.repeat(xs, counts)
+    xy[:, 1] += np.repeat(ys, counts)
+    return xy.ravel()
+
+
+def _compile(char):
+    """(template, points) for char, cached; () for a space, and () with a
+    warning (every time) for a character the font lacks."""
+    glyph = FONT.glyph(char)
+    if glyph is None and char != " ":
+        print(f"WARNING: character '{char}' not found in font. Skipping.")
+        return ()
+    entry = (glyph_template(glyph), glyph.points) if glyph and glyph.sizes else ()
+    _compiled[char] = entry
+    return entry
+
+
+def _add_text(text, start_x, start_y, templates, points, xs, ys):
+    """Queue the glyphs of one line of text for fill_holes()."""
+    offsets, _ = LAYOUT.place(text)
+    for char, x in zip(text, offsets):
+        entry = _compiled.get(char) or _compile(char)
+        if entry:
+            templates.append(entry[0])
+            points.append(entry[1])
+            xs.append(start_x + x)
+            ys.append(start_y)
+
+
+def draw_text(text, start_x, start_y):
+    """G-code for one line of text as a block of lines ("" if nothing is
+    drawn)."""
+    templates, points, xs, ys = [], [], [], []
+    _add_text(text, start_x, start_y, templates, points, xs, ys)
+    if not templates:
+        return ""
+    return fill_holes("\n".join(templates), place(points, xs, ys))
+
+
+def iter_grid_gcode(labels, columns=3, spacing_x=20, spacing_y=20):
+    """The grid program a block of lines at a time (CHUNK_LABELS labels to
+    a block) — the whole program is never held in memory."""
     # Size the grid cell to the longest label so text never overflows into a neighbour
-    cell_width = max(text_width(t) for t in labels) + 2 * PADDING
+    widths = [text_width(t) for t in labels]
+    cell_width = max(widths) + 2 * PADDING
     cell_height = GRID_CELL_HEIGHT
 
-    gcode = [
+    yield "\n".join([
         "G21 ; mm",
         "G90 ; absolute",
         f"G0 Z{SAFE_Z:.2f}",
         f"M3 S{SPINDLE_RPM} ; spindle on",
         "G4 P2 ; wait for spindle to reach speed",
         "( Start Grid Layout )",
-    ]
-
-    row = col = 0
-
-    for idx, text in enumerate(labels):
-        base_x = col * (cell_width + spacing_x)
-        base_y = row * (cell_height + spacing_y)
-
-        # Centered text offsets within label
-        text_w = text_width(text)
-        start_x = base_x + (cell_width - text_w) / 2
-        start_y = base_y + (cell_height - LINE_HEIGHT) / 2
-
-        gcode.append(f"( Label {idx+1}: '{text}' at row {row}, col {col} )")
-
-        for i, char in enumerate(text):
-            offset = start_x + i * (LETTER_SPACING + CHAR_SPACING)
-            gcode += draw_letter(char, offset, start_y)
-
-        # Rectangle cutout with multi-pass; last pass is clamped to CUT_DEPTH
-        passes = max(1, math.ceil(abs(CUT_DEPTH) / abs(PASS_DEPTH)))
-        for p in range(1, passes + 1):
-            z = max(CUT_DEPTH, p * PASS_DEPTH)
-            gcode += [
-                f"( Cut Label {idx+1} Pass {p} )",
-                f"G0 X{base_x:.2f} Y{base_y:.2f}",
-                f"G1 Z{z:.2f} F{PLUNGE_RATE}",
-                f"G1 X{base_x + cell_width:.2f} Y{base_y:.2f} F{FEED_RATE_CUT}",
-                f"G1 X{base_x + cell_width:.2f} Y{base_y + cell_height:.2f}",
-                f"G1 X{base_x:.2f} Y{base_y + cell_height:.2f}",
-                f"G1 X{base_x:.2f} Y{base_y:.2f}",
-                f"G0 Z{SAFE_Z:.2f}",
-            ]
-
-        col += 1
-        if col >= columns:
-            col = 0
-            row += 1
-
-    gcode.append("M5 ; spindle off")
-    gcode.append("M30 ; End of job")
+    ])
+
+    cutout, cutout_points = cutout_template(cell_width, cell_height)
+    for first in range(0, len(labels), CHUNK_LABELS):
+        templates, points, xs, ys = [], [], [], []
+        for idx in range(first, min(first + CHUNK_LABELS, len(labels))):
+            text = labels[idx]
+            row, col = divmod(idx, columns)
+            base_x = col * (cell_width + spacing_x)
+            base_y = row * (cell_height + spacing_y)
+
+            # Centered text offsets within label
+            start_x = base_x + (cell_width - widths[idx]) / 2
+            start_y = base_y + (cell_height - LINE_HEIGHT) / 2
+
+            templates.append(f"( Label {idx+1}: '{text.replace(HOLE, '')}' "
+                             f"at row {row}, col {col} )")
+            _add_text(text, start_x, start_y, templates, points, xs, ys)
+            templates.append(cutout.format(idx + 1))
+            points.append(cutout_points)
+            xs.append(base_x)
+            ys.append(base_y)
+        yield fill_holes("\n".join(templates), place(points, xs, ys))
+
+    yield "M5 ; spindle off"
+    yield "M30 ; End of job"
+
 
+def generate_grid_gcode(labels, filename, columns=3, spacing_x=20, spacing_y=20):
+    # Written as it's generated: big grids never sit in memory as one string
     with open(filename, "w") as f:
-        f.write("\n".join(gcode))
+        for n, block in enumerate(iter_grid_gcode(labels, columns, spacing_x, spacing_y)):
+            f.write("\n" + block if n else block)
 
     print(f"\nGrid layout written to {filename}")
 
@@ -14,798 +14,139 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 
-import json
-import math
+import itertools
 import os
-import re
 import threading
 import time
-import tkinter as tk
-import urllib.parse
-import urllib.request
-from tkinter import (
-    StringVar, OptionMenu, Label, Canvas, Entry, Toplevel, Button,
-    Checkbutton, filedialog, messagebox,
-)
+from collections import OrderedDict
 
-from matplotlib.font_manager import FontProperties, findSystemFonts
-from matplotlib.textpath import TextPath
 import numpy as np
-from shapely.geometry import LineString, Polygon
-import shapely.affinity
 
-# Settings file lives next to this script, not in whatever directory the app
-# happens to be launched from.
-SETTINGS_FILE = os.path.join(
-    os.path.dirname(os.path.abspath(__file__)), "machine_settings.json"
+from gcode import (
+    GRBL_MOTION_DEFAULTS, build_toolpath, cnc_settings, describe_estimate,
+    estimate_time, format_duration, generate_dry_run_lines, iter_gcode,
+    load_settings, save_settings, sendable_line_count, sum_estimates, toolpath_runs,
+    toolpath_segments, write_gcode,
+)
+from geometry import (
+    build_layout, flush_glyph_stores, geom_lines, geom_polygons, geom_rings,
+    get_system_fonts, index_fonts, kerf_radius, load_font_index, parse_label_size,
+    refresh_font_index, save_font_index, sheet_layouts, stroke_font_choices,
+)
+from machine import (
+    GRBL_RX_BUFFER, GRBL_SETTING_DESCRIPTIONS, app_log, home_machine,
+    jog, open_grbl, parse_grbl_settings, query_status,
+    read_grbl_settings, sendable_lines, set_log_sink, set_work_zero, stream_gcode,
+    write_grbl_settings,
 )
-
-DEFAULT_SETTINGS = {
-    "text_cut_depth": 0.2,
-    "label_cutout_depth": 1.6,
-    "pass_depth": 0.4,
-    "tool_diameter": 0.3,
-    "safe_z": 5.0,
-    "offset_x": 0.0,
-    "offset_y": 0.0,
-    "feed_rate": 300,
-    "plunge_rate": 100,
-    "spindle_rpm": 10000,
-    "laser_power": 1000,
-    "tool_mode": "Spindle",
-    "cutout_padding": 2.0,
-    "laser_kerf": 0.15,
-    "tab_width": 3.0,
-    "tab_height": 0.4,
-    "material_width": 1000,
-    "material_height": 600,
-    "machine_target": "",   # last-used machine connection (COM port / IP / ws URL)
-    "machine_baud": 115200,
-}
-
-cnc_settings = DEFAULT_SETTINGS.copy()
-
-
-def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        try:
-            with open(SETTINGS_FILE, "r") as f:
-                cnc_settings.update(json.load(f))
-        except (ValueError, OSError):
-            pass  # corrupt/unreadable settings file: fall back to defaults
-
-
-def save_settings():
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(cnc_settings, f, indent=2)
 
 
 # ---------------------------------------------------------------------------
-# Geometry — no GUI dependencies, shared by the preview and the G-code export
-# so the two can never drift apart.
+# Background computation — layout and G-code jobs run off the Tk thread
 # ---------------------------------------------------------------------------
 
-# Fonts are rendered at a fixed size, then scaled so that capital letters come
-# out at the requested height in mm. (FontProperties size is a point size for
-# the em box — it is NOT the printed glyph height, so it can't be used as mm.)
-FONT_RENDER_SIZE = 100.0
-
-_cap_height_cache = {}
+PROGRESS_INTERVAL_S = 0.1
 
 
-def cap_height(font_path):
-    if font_path not in _cap_height_cache:
-        tp = TextPath((0, 0), "X", prop=FontProperties(fname=font_path, size=FONT_RENDER_SIZE))
-        h = tp.get_extents().height
-        _cap_height_cache[font_path] = h if h > 0 else FONT_RENDER_SIZE
-    return _cap_height_cache[font_path]
+class JobCancelled(Exception):
+    """Raised inside a job's progress callback once a newer job replaced it."""
 
 
-_text_geom_cache = {}
+class ComputeWorker:
+    """One worker thread for layout / G-code jobs, newest request wins.
 
-
-def text_geometry(label, font_path, font_height_mm):
-    """Shapely geometry for a label with letter counters (the hole in O, A, e…)
-    as real holes, scaled so capitals are font_height_mm tall.
-
-    Origin is the bottom-left of the text bounding box, Y up (machine-style).
-    Returns None for labels with no printable outline.
+    submit(key, fn, on_done) queues fn(progress) to run on the worker thread.
+    A newer submit with the same key replaces the older job: if it is still
+    queued it never runs, if it is running its next progress(done, total)
+    call raises JobCancelled, and either way its on_done is never called.
+    on_done(result), on_error(exc) and on_progress(done, total) run through
+    post — root.after in the GUI — so they are on the Tk thread.
     """
-    key = (label, font_path, font_height_mm)
-    if key in _text_geom_cache:
-        return _text_geom_cache[key]
-    tp = TextPath((0, 0), label, prop=FontProperties(fname=font_path, size=FONT_RENDER_SIZE))
-    geom = None
-    # TextPath returns every contour as a plain ring — outer shapes and holes
-    # alike. XOR-ing them together (even-odd rule) rebuilds the true glyph
-    # shapes with their holes.
-    for ring in tp.to_polygons():
-        if len(ring) < 3:
-            continue
-        p = Polygon(ring)
-        if not p.is_valid:
-            p = p.buffer(0)
-        if p.is_empty:
-            continue
-        geom = p if geom is None else geom.symmetric_difference(p)
-    if geom is None or geom.is_empty:
-        return None
-    scale = font_height_mm / cap_height(font_path)
-    geom = shapely.affinity.scale(geom, xfact=scale, yfact=scale, origin=(0, 0))
-    minx, miny, _, _ = geom.bounds
-    geom = shapely.affinity.translate(geom, xoff=-minx, yoff=-miny)
-    if len(_text_geom_cache) > 256:
-        _text_geom_cache.clear()
-    _text_geom_cache[key] = geom
-    return geom
-
-
-def geom_polygons(geom):
-    """Iterate the Polygon parts of a Polygon/MultiPolygon/GeometryCollection."""
-    for part in getattr(geom, "geoms", [geom]):
-        if part.geom_type == "Polygon":
-            yield part
-        elif hasattr(part, "geoms"):
-            yield from geom_polygons(part)
-
-
-def geom_rings(geom):
-    """All rings (exteriors and holes) of a geometry, as coordinate arrays."""
-    for poly in geom_polygons(geom):
-        yield np.asarray(poly.exterior.coords)
-        for interior in poly.interiors:
-            yield np.asarray(interior.coords)
-
-
-def hatch_fill(geom, spacing):
-    """Horizontal fill lines clipped to the geometry (holes are skipped)."""
-    minx, miny, maxx, maxy = geom.bounds
-    lines = []
-    y = miny + spacing / 2
-    while y < maxy:
-        seg = geom.intersection(LineString([(minx - 1, y), (maxx + 1, y)]))
-        for g in getattr(seg, "geoms", [seg]):
-            if g.geom_type == "LineString" and g.length > 1e-9:
-                coords = list(g.coords)
-                lines.append((coords[0], coords[-1]))
-        y += spacing
-    return lines
-
-
-def build_layout(labels, font_path, font_height_mm, spacing, padding,
-                 material_width, material_height, snap_grid=None,
-                 label_size=None, margin=0.0):
-    """Stack labels upward from the work origin (bottom-left of material).
-
-    Coordinates are "canvas" mm: origin top-left, Y increases downward (what
-    the preview shows). The first label's box sits at the material's
-    bottom-left corner, inset by margin on both axes — callers pass the
-    kerf/tool radius as margin so the cutout toolpath starts exactly at
-    X0 Y0. Each item's geom keeps its own origin (text bbox bottom-left,
-    Y up); x/y_top place that box on the material.
-
-    label_size: (width, height) in mm for fixed-size labels, or None to size
-    each label from its text (bbox + padding). A fixed-size label whose text
-    (plus padding clearance) doesn't fit is flagged fits=False — the caller
-    decides whether to warn or refuse.
-    """
-    def snap(v):
-        return round(v / snap_grid) * snap_grid if snap_grid else v
-
-    items = []
-    bottom = material_height - margin  # canvas y of the current stack bottom
-    for label in labels:
-        geom = text_geometry(label, font_path, font_height_mm)
-        if geom is None:
-            continue
-        _, _, width, height = geom.bounds
-        if label_size:
-            label_w, label_h = label_size
-            fits = (width + 2 * padding <= label_w + 1e-6
-                    and height + 2 * padding <= label_h + 1e-6)
-        else:
-            label_w, label_h = width + 2 * padding, height + 2 * padding
-            fits = True
-        bx0 = snap(margin)
-        by0 = snap(bottom - label_h)
-        items.append({
-            "label": label, "geom": geom,
-            "x": bx0 + (label_w - width) / 2,
-            "y_top": by0 + (label_h - height) / 2,
-            "width": width, "height": height,
-            "cutout": (bx0, by0, bx0 + label_w, by0 + label_h),
-            "fits": fits,
-        })
-        bottom = by0 - spacing
-    return items
 
+    def __init__(self, post):
+        self._post = post
+        self._wake = threading.Condition()
+        self._queue = OrderedDict()   # key -> job, oldest first
+        self._latest = {}             # key -> generation of the newest job
+        self._thread = None
+
+    def submit(self, key, fn, on_done, on_error=None, on_progress=None):
+        with self._wake:
+            gen = self._latest.get(key, 0) + 1
+            self._latest[key] = gen
+            self._queue.pop(key, None)
+            self._queue[key] = (gen, fn, on_done, on_error, on_progress)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return gen
+
+    def cancel(self, key):
+        with self._wake:
+            self._latest[key] = self._latest.get(key, 0) + 1
+            self._queue.pop(key, None)
+
+    def is_current(self, key, gen):
+        with self._wake:
+            return self._latest.get(key) == gen
+
+    def _deliver(self, key, gen, fn, *args):
+        # Checked again on the Tk thread: a newer job may have been
+        # submitted while this result was in flight
+        self._post(lambda: fn(*args) if self.is_current(key, gen) else None)
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._queue:
+                    self._wake.wait()
+                key, (gen, fn, on_done, on_error, on_progress) = \
+                    self._queue.popitem(last=False)
+
+            last = [0.0]
+
+            def progress(done, total):
+                if not self.is_current(key, gen):
+                    raise JobCancelled
+                # a few updates a second are plenty for a progress display
+                if on_progress and time.monotonic() - last[0] >= PROGRESS_INTERVAL_S:
+                    last[0] = time.monotonic()
+                    self._deliver(key, gen, on_progress, done, total)
 
-# ---------------------------------------------------------------------------
-# G-code generation (pure: layout + settings in, lines out)
-# ---------------------------------------------------------------------------
-
-def pass_depths(total, step):
-    """Cutting depths for multi-pass work; the last pass lands exactly on total."""
-    step = max(abs(step), 0.01)
-    n = max(1, math.ceil(abs(total) / step))
-    return [min(abs(total), i * step) for i in range(1, n + 1)]
-
-
-def rect_segments_with_tabs(x0, y0, x1, y1, tab_width):
-    """The rectangle perimeter split into segments, leaving a gap (tab) at the
-    middle of each side."""
-    corners = [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
-    segments = []
-    for (ax, ay), (bx, by) in zip(corners, corners[1:]):
-        length = math.hypot(bx - ax, by - ay)
-        if length <= tab_width * 2:
-            segments.append([(ax, ay), (bx, by)])
-            continue
-        t0 = (length / 2 - tab_width / 2) / length
-        t1 = (length / 2 + tab_width / 2) / length
-        segments.append([(ax, ay), (ax + (bx - ax) * t0, ay + (by - ay) * t0)])
-        segments.append([(ax + (bx - ax) * t1, ay + (by - ay) * t1), (bx, by)])
-    return segments
-
-
-def generate_gcode_lines(layout, settings, fill_text):
-    """G-code for a layout produced by build_layout().
-
-    Canvas Y (down) is converted to machine Y (up) here, in one place:
-    machine_y = material_height - canvas_y. Nothing is mirrored — TextPath
-    geometry is already Y-up, same as the machine.
-    """
-    H = settings["material_height"]
-    laser = settings["tool_mode"] == "Laser"
-    feed = settings["feed_rate"]
-    plunge = settings["plunge_rate"]
-    safe_z = settings["safe_z"]
-
-    g = ["G21 ; units: mm", "G90 ; absolute positioning"]
-    if laser:
-        # GRBL dynamic laser mode: power only applies during G1 moves, so
-        # travels (G0) don't burn. No Z motion needed.
-        g.append(f"M4 S{settings['laser_power']:.0f} ; laser on (dynamic power)")
-    else:
-        g.append(f"G0 Z{safe_z:.3f}")
-        g.append(f"M3 S{settings['spindle_rpm']:.0f} ; spindle on")
-        g.append("G4 P2 ; wait for spindle to reach speed")
-
-    # Work-origin offset: shifts the whole job away from machine home
-    ox, oy = settings["offset_x"], settings["offset_y"]
-
-    def polyline(points, depth):
-        sx, sy = points[0]
-        g.append(f"G0 X{sx + ox:.3f} Y{sy + oy:.3f}")
-        if not laser:
-            g.append(f"G1 Z{-depth:.3f} F{plunge:.0f}")
-        first = True
-        for px, py in points[1:]:
-            f_part = f" F{feed:.0f}" if first else ""
-            g.append(f"G1 X{px + ox:.3f} Y{py + oy:.3f}{f_part}")
-            first = False
-        if not laser:
-            g.append(f"G0 Z{safe_z:.3f}")
-
-    for item in layout:
-        x, y_top, height = item["x"], item["y_top"], item["height"]
-        # geom origin (text bbox bottom-left) in machine coordinates
-        geom = shapely.affinity.translate(
-            item["geom"], xoff=x, yoff=H - (y_top + height)
-        )
-
-        g.append(f"(Label: {item['label']})")
-        for depth in pass_depths(settings["text_cut_depth"], settings["pass_depth"]):
-            if fill_text:
-                for start, end in hatch_fill(geom, settings["tool_diameter"] * 0.8):
-                    polyline([start, end], depth)
-            else:
-                for ring in geom_rings(geom):
-                    polyline([tuple(pt) for pt in ring], depth)
-
-        # Cutout rectangle in machine coordinates, with the toolpath offset
-        # outward by half the tool/kerf width so the finished label comes out
-        # at the drawn size (the drawn rectangle is the label edge, not the
-        # tool centre).
-        r = (settings["laser_kerf"] if laser else settings["tool_diameter"]) / 2
-        cx0, cy0, cx1, cy1 = item["cutout"]
-        mx0, my0 = cx0 - r, H - cy1 - r
-        mx1, my1 = cx1 + r, H - cy0 + r
-        g.append(f"(Cutout for label: {item['label']})")
-        total = settings["label_cutout_depth"]
-        tab_h, tab_w = settings["tab_height"], settings["tab_width"]
-        for depth in pass_depths(total, settings["pass_depth"]):
-            # On the passes below tab height, leave gaps so the label stays
-            # attached until snapped out (spindle only — tabs don't apply to laser).
-            if not laser and tab_h > 0 and tab_w > 0 and depth > total - tab_h:
-                for seg in rect_segments_with_tabs(mx0, my0, mx1, my1, tab_w):
-                    polyline(seg, depth)
-            else:
-                polyline(
-                    [(mx0, my0), (mx1, my0), (mx1, my1), (mx0, my1), (mx0, my0)],
-                    depth,
-                )
-
-    g.append("M5 ; stop spindle/laser")
-    g.append("M2 ; end program")
-    return g
-
-
-def _gword(line, letter, default):
-    m = re.search(rf"{letter}(-?\d+\.?\d*)", line)
-    return float(m.group(1)) if m else default
-
-
-def simulate_gcode(lines):
-    """Replay generated G-code into XY segments for the toolpath preview.
-
-    Returns a list of (x0, y0, x1, y1, kind, z) in machine coordinates, where
-    kind is 'rapid', 'engrave' or 'cutout' (from the block comments the
-    generator emits) and z is the modal Z of the move (0 in laser mode).
-    Simulating the real G-code means the preview shows exactly what the
-    machine will receive — including passes, tabs and kerf offsets.
-    """
-    segments = []
-    x = y = z = 0.0
-    kind = "engrave"
-    for line in lines:
-        if line.startswith("(Label:"):
-            kind = "engrave"
-            continue
-        if line.startswith("(Cutout"):
-            kind = "cutout"
-            continue
-        m = re.match(r"G([01])\b", line)
-        if not m:
-            continue
-        nx, ny, nz = _gword(line, "X", x), _gword(line, "Y", y), _gword(line, "Z", z)
-        if nx != x or ny != y:
-            segments.append(
-                (x, y, nx, ny, "rapid" if m.group(1) == "0" else kind, nz)
-            )
-        x, y, z = nx, ny, nz
-    return segments
-
-
-def generate_dry_run_lines(layout, settings):
-    """Trace the job's outer boundary with the tool completely OFF.
-
-    No M3/M4 is ever emitted — a dry run must not fire a spindle or laser.
-    Spindle mode additionally lifts to Safe Z first; laser mode stays put in
-    Z as usual. Watch the machine trace the outline to check placement and
-    clamp clearance."""
-    if not layout:
-        return []
-    H = settings["material_height"]
-    laser = settings["tool_mode"] == "Laser"
-    r = (settings["laser_kerf"] if laser else settings["tool_diameter"]) / 2
-    ox, oy = settings["offset_x"], settings["offset_y"]
-
-    # Outer bounds of all cutout toolpaths (kerf offset included), machine coords
-    x0 = min(i["cutout"][0] for i in layout) - r + ox
-    x1 = max(i["cutout"][2] for i in layout) + r + ox
-    y0 = H - max(i["cutout"][3] for i in layout) - r + oy
-    y1 = H - min(i["cutout"][1] for i in layout) + r + oy
-    app_log(f"Dry run boundary: X{x0:.1f}..{x1:.1f} Y{y0:.1f}..{y1:.1f} (work coords)")
-
-    g = [
-        "G21 ; units: mm",
-        "G90 ; absolute positioning",
-        "(Dry run: job boundary trace only - no cutting, no tool power)",
-        "M5 ; make sure spindle/laser is off",
-    ]
-    if not laser:
-        g.append(f"G0 Z{settings['safe_z']:.3f} ; stay at safe height")
-    g.append(f"G0 X{x0:.3f} Y{y0:.3f}")
-    for px, py in [(x1, y0), (x1, y1), (x0, y1), (x0, y0)]:
-        g.append(f"G1 X{px:.3f} Y{py:.3f} F{settings['feed_rate']:.0f}")
-    g.append("M2 ; end program")
-    return g
-
-
-# ---------------------------------------------------------------------------
-# Machine link — GRBL over USB serial (a stock CNC 3018 is GRBL 1.1 on a
-# COM port; the $$ dump and <Idle|WPos:...> reports come over that link)
-# ---------------------------------------------------------------------------
-
-_log_sink = [None]
-
-
-def set_log_sink(fn):
-    """Route app_log() messages somewhere (the GUI console). None = discard."""
-    _log_sink[0] = fn
-
-
-def app_log(message):
-    sink = _log_sink[0]
-    if sink:
-        sink(str(message))
-
-
-GRBL_SETTING_DESCRIPTIONS = {
-    0: "Step pulse (µs)", 1: "Step idle delay (ms)", 2: "Step polarity mask",
-    3: "Direction polarity mask", 4: "Invert step enable", 5: "Invert limit pins",
-    6: "Invert probe pin", 10: "Status report mask", 11: "Junction deviation (mm)",
-    12: "Arc tolerance (mm)", 13: "Report in inches", 20: "Soft limits enable",
-    21: "Hard limits enable", 22: "Homing cycle enable", 23: "Homing direction mask",
-    24: "Homing feed (mm/min)", 25: "Homing seek (mm/min)", 26: "Homing debounce (ms)",
-    27: "Homing pull-off (mm)", 30: "Max spindle speed (RPM)",
-    31: "Min spindle speed (RPM)", 32: "Laser mode enable",
-    100: "X steps/mm", 101: "Y steps/mm", 102: "Z steps/mm",
-    110: "X max rate (mm/min)", 111: "Y max rate (mm/min)", 112: "Z max rate (mm/min)",
-    120: "X acceleration (mm/s²)", 121: "Y acceleration (mm/s²)",
-    122: "Z acceleration (mm/s²)",
-    130: "X max travel (mm)", 131: "Y max travel (mm)", 132: "Z max travel (mm)",
-}
-
-
-def sendable_lines(lines):
-    """G-code lines worth transmitting: comments and blanks stripped."""
-    out = []
-    for line in lines:
-        cmd = line.split(";", 1)[0].strip()
-        if cmd and not cmd.startswith("("):
-            out.append(cmd)
-    return out
-
-
-def parse_grbl_settings(lines):
-    """$$ dump lines -> {setting_number: value_string}. Ignores everything
-    else (status reports, ok, banners)."""
-    out = {}
-    for line in lines:
-        m = re.match(r"\$(\d+)=(-?\d+\.?\d*)", line.strip())
-        if m:
-            out[int(m.group(1))] = m.group(2)
-    return out
-
-
-def await_ok(ser, context="", timeout_s=120, abort=None):
-    """Read GRBL responses until ok (returns None) or error/ALARM (returns
-    the message). Status chatter like <Idle|WPos:...> is ignored.
-
-    Quiet reads are tolerated until timeout_s: synchronising commands (M5,
-    coolant, etc.) only answer ok after all buffered motion finishes, which
-    can take tens of seconds mid-job. Returns 'aborted' if the abort event
-    is set while waiting."""
-    end = time.time() + timeout_s
-    while time.time() < end:
-        if abort is not None and abort.is_set():
-            return "aborted"
-        resp = ser.readline().decode(errors="ignore").strip()
-        if resp == "ok":
-            return None
-        if resp.startswith(("error", "ALARM")):
-            app_log(f"RX {resp}")
-            return resp
-        if not resp:
-            continue  # machine still executing buffered motion — keep waiting
-        app_log(f"RX {resp}")  # <status> reports, [MSG:...], banner: keep reading
-    raise TimeoutError(f"no response from GRBL {context}".strip())
-
-
-class WebSocketLink:
-    """GRBL over a websocket (ESP32/FluidNC/vendor wifi boards speak the same
-    line protocol as serial, typically on ws://<ip>:81). Exposes the same
-    write/readline interface as pyserial so the rest of the code is
-    transport-agnostic."""
-
-    def __init__(self, url, timeout=5):
-        try:
-            import websocket  # websocket-client; imported here so the GUI runs without it
-        except ImportError:
-            raise RuntimeError(
-                "wifi connections need the websocket-client package — "
-                "run: pip install websocket-client"
-            ) from None
-
-        self.timeout = timeout
-        try:
-            self.ws = websocket.create_connection(url, timeout=timeout)
-        except websocket.WebSocketBadStatusException as exc:
-            # A 200/HTML answer means we hit a web server, not a websocket —
-            # typically ws://<ip> without :81, which lands on the web UI port
-            raise RuntimeError(
-                f"{url} answered as a web page, not a GRBL websocket. "
-                "For ESP3D wifi boards enter just the IP address; for raw "
-                "websocket GRBL include the port, e.g. ws://host:81 "
-                f"(status {exc.status_code})"
-            ) from None
-        self.buffer = b""
-
-    def write(self, data):
-        if isinstance(data, bytes):
-            data = data.decode("latin-1")
-        self.ws.send(data)
-
-    # ESP3D keepalive/control frames arrive as standalone text frames with no
-    # trailing newline; gluing them into the line buffer corrupts adjacent
-    # GRBL responses (seen live: 'PING:0' + 'ok\r\n' became 'PING:0ok')
-    CONTROL_FRAME = re.compile(r"^(PING|CURRENT_ID|ACTIVE_ID):\S*$")
-
-    def readline(self):
-        while b"\n" not in self.buffer:
             try:
-                frame = self.ws.recv()
-            except Exception:  # timeout / closed: report like a serial timeout
-                return b""
-            if isinstance(frame, str):
-                if self.CONTROL_FRAME.match(frame.strip()):
-                    continue
-                frame = frame.encode("latin-1", errors="replace")
-            self.buffer += frame
-        line, _, self.buffer = self.buffer.partition(b"\n")
-        return line + b"\n"
-
-    def reset_input_buffer(self):
-        self.buffer = b""
-        self.ws.settimeout(0.2)
-        try:
-            while True:
-                self.ws.recv()  # drain pending frames
-        except Exception:
-            pass
-        self.ws.settimeout(self.timeout)
-
-    def close(self):
-        try:
-            self.ws.close()
-        except Exception:
-            pass
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, *exc):
-        self.close()
+                result = fn(progress)
+            except JobCancelled:
+                continue
+            except Exception as exc:
+                if on_error:
+                    self._deliver(key, gen, on_error, exc)
+                continue
+            self._deliver(key, gen, on_done, result)
 
 
-class ESP3DLink(WebSocketLink):
-    """GRBL via an ESP3D-style wifi board (the usual 3018 wifi module).
+class Debouncer:
+    """Coalesce a burst of calls into one: fn runs once, delay_ms after the
+    last call. widget is anything with Tk's after / after_cancel."""
 
-    These boards take commands as HTTP GET /command?plain=<cmd> and push
-    GRBL's serial output to websocket clients on port 81 — the websocket
-    itself ignores incoming data. Confirmed against a live 3018: connecting
-    ws://host:81 yields CURRENT_ID/ACTIVE_ID/PING control frames, and $$ via
-    HTTP returns the settings dump as websocket frames ending in 'ok'."""
+    def __init__(self, widget, delay_ms, fn):
+        self.widget, self.delay_ms, self.fn = widget, delay_ms, fn
+        self._pending = None
 
-    def __init__(self, host, timeout=8):
-        host = re.sub(r"^https?://", "", host).strip("/")
-        host, _, ws_port = host.partition(":")
-        super().__init__(f"ws://{host}:{ws_port or 81}", timeout=timeout)
-        self.host = host
+    def __call__(self, *_event):
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+        self._pending = self.widget.after(self.delay_ms, self._fire)
 
-    def write(self, data):
-        if isinstance(data, bytes):
-            data = data.decode("latin-1")
-        for cmd in data.replace("\r", "\n").split("\n"):
-            if not cmd:
-                continue
-            url = (f"http://{self.host}/command?plain="
-                   f"{urllib.parse.quote(cmd, safe='')}")
-            urllib.request.urlopen(url, timeout=self.timeout).read()
-
-
-def normalize_target(target):
-    """Forgive sloppy URLs: 'ws:host:81' or 'ws:/host' -> 'ws://host:81'."""
-    t = target.strip()
-    m = re.match(r"^(wss?|https?):/{0,2}(.+)$", t, re.IGNORECASE)
-    if m:
-        return f"{m.group(1).lower()}://{m.group(2)}"
-    return t
-
-
-def link_kind(target):
-    """'serial' (COM3, /dev/ttyUSB0), 'ws' (ws://host:81, raw bidirectional
-    websocket GRBL like FluidNC), or 'esp3d' (bare IP / http:// address)."""
-    if target.startswith(("ws://", "wss://")):
-        return "ws"
-    if target.startswith(("http://", "https://")) or ("." in target and "/" not in target):
-        return "esp3d"
-    return "serial"
-
-
-def open_grbl(target, baud):
-    """Open a GRBL link — see link_kind for accepted target forms."""
-    target = normalize_target(target)
-    kind = link_kind(target)
-    if kind == "ws":
-        app_log(f"Opening websocket {target}")
-        link = WebSocketLink(target)
-        # ESP3D-style boards ignore websocket input entirely; they announce
-        # themselves with CURRENT_ID/ACTIVE_ID frames on connect. Detect that
-        # and switch to HTTP command mode instead of timing out on $$.
-        link.ws.settimeout(1.5)
-        seen = []
-        try:
-            while len(seen) < 4:
-                seen.append(link.ws.recv())
-        except Exception:
-            pass
-        link.ws.settimeout(link.timeout)
-        if any(str(f).startswith(("CURRENT_ID", "ACTIVE_ID")) for f in seen):
-            host = re.sub(r"^wss?://", "", target).split("/", 1)[0]
-            app_log(f"ESP3D board detected on {target} — "
-                    f"switching to HTTP command mode ({host})")
-            link.close()
-            link = ESP3DLink(host)
-        else:
-            for f in seen:  # keep any real data we swallowed while probing
-                if isinstance(f, str):
-                    f = f.encode("latin-1", "replace")
-                link.buffer += f
-    elif kind == "esp3d":
-        app_log(f"Opening ESP3D wifi link to {target}")
-        link = ESP3DLink(target)
-    else:
-        try:
-            import serial  # pyserial; imported here so the GUI runs without it
-        except ImportError:
-            raise RuntimeError(
-                "serial connections need the pyserial package — "
-                "run: pip install pyserial"
-            ) from None
-
-        app_log(f"Opening {target} at {baud} baud (serial)")
-        link = serial.Serial(target, baud, timeout=5)
-        link.write(b"\r\n\r\n")  # wake GRBL
-        time.sleep(2)
-    link.reset_input_buffer()
-    return link
-
-
-def home_machine(ser, timeout_s=90):
-    """Run GRBL's homing cycle ($H) and wait for it to finish. Homing can
-    take a long time, so empty reads are tolerated until timeout_s. Returns
-    None on success or the GRBL error/ALARM message."""
-    app_log("TX $H (homing…)")
-    ser.write(b"$H\n")
-    end = time.time() + timeout_s
-    while time.time() < end:
-        resp = ser.readline().decode(errors="ignore").strip()
-        if resp == "ok":
-            app_log("Homing complete")
-            return None
-        if resp.startswith(("error", "ALARM")):
-            app_log(f"RX {resp}")
-            return resp
-        if resp:
-            app_log(f"RX {resp}")
-    raise TimeoutError(f"homing did not complete within {timeout_s}s")
-
-
-def stream_gcode(ser, lines, on_progress=None, abort=None, home=False):
-    """Stream a job to GRBL call-and-response style (send a line, wait for
-    ok) over an already-open link. Returns (sent, errors). Setting the abort
-    event feed-holds then soft-resets the controller. With home=True, a $H
-    homing cycle runs first — nothing is streamed unless it succeeds."""
-    cmds = sendable_lines(lines)
-    errors = 0
-    if home:
-        err = home_machine(ser)
-        if err:
-            raise RuntimeError(f"homing failed ({err}) — nothing was sent")
-    app_log(f"Streaming {len(cmds)} lines")
-    for i, cmd in enumerate(cmds, 1):
-        if abort is not None and abort.is_set():
-            app_log("ABORT: feed hold + soft reset")
-            ser.write(b"!")        # feed hold
-            time.sleep(0.2)
-            ser.write(b"\x18")     # soft reset: abandon the job
-            return i - 1, errors
-        app_log(f"TX {cmd}")
-        ser.write((cmd + "\n").encode("ascii"))
-        result = await_ok(ser, f"at line {i} ({cmd!r})", abort=abort)
-        if result == "aborted":
-            app_log("ABORT while waiting: feed hold + soft reset")
-            ser.write(b"!")
-            time.sleep(0.2)
-            ser.write(b"\x18")
-            return i - 1, errors
-        if result:
-            errors += 1
-        if on_progress:
-            on_progress(i, len(cmds))
-    return len(cmds), errors
-
-
-def read_grbl_settings(ser):
-    """Query $$ over an open link and return {number: value_string}."""
-    app_log("TX $$")
-    ser.write(b"$$\n")
-    lines = []
-    while True:
-        resp = ser.readline().decode(errors="ignore").strip()
-        if resp == "ok":
-            break
-        if not resp:
-            raise TimeoutError("no response to $$")
-        app_log(f"RX {resp}")
-        lines.append(resp)
-    return parse_grbl_settings(lines)
-
-
-def write_grbl_settings(ser, changes):
-    """Write {number: value_string} as $n=value commands over an open link.
-    Returns a list of GRBL error strings (empty = all accepted)."""
-    problems = []
-    for num, val in sorted(changes.items()):
-        app_log(f"TX ${num}={val}")
-        ser.write(f"${num}={val}\n".encode("ascii"))
-        err = await_ok(ser, f"writing ${num}")
-        if err:
-            problems.append(f"${num}={val}: {err}")
-    return problems
-
-
-def jog(ser, dx=0, dy=0, dz=0, feed=1500):
-    """Relative jog via GRBL's $J interface. Returns None or the GRBL error
-    (e.g. error:15 when a soft limit would be exceeded)."""
-    parts = "".join(f" {axis}{val:g}" for axis, val in
-                    (("X", dx), ("Y", dy), ("Z", dz)) if val)
-    if not parts:
-        return None
-    cmd = f"$J=G91 G21 F{feed:g}{parts}"
-    app_log(f"TX {cmd}")
-    ser.write((cmd + "\n").encode("ascii"))
-    return await_ok(ser, "jogging")
-
-
-def set_work_zero(ser, axes="XY"):
-    """Make the current position the work zero for the given axes
-    (G10 L20 P1 — sets the G54 offset, survives reset)."""
-    cmd = "G10 L20 P1 " + " ".join(f"{a}0" for a in axes)
-    app_log(f"TX {cmd}")
-    ser.write((cmd + "\n").encode("ascii"))
-    return await_ok(ser, "setting work zero")
-
-
-def query_status(ser):
-    """Ask for a realtime status report and return the raw '<...>' string,
-    or None if none arrives in time."""
-    ser.write(b"?")
-    end = time.time() + 3
-    while time.time() < end:
-        resp = ser.readline().decode(errors="ignore").strip()
-        if resp.startswith("<"):
-            app_log(f"RX {resp}")
-            return resp
-        if not resp:
-            break
-    return None
-
-
-# Back-compat wrappers that manage their own connection
-def stream_gcode_serial(port, baud, lines, **kwargs):
-    with open_grbl(port, baud) as ser:
-        return stream_gcode(ser, lines, **kwargs)
-
-
-def grbl_read_settings(port, baud):
-    with open_grbl(port, baud) as ser:
-        return read_grbl_settings(ser)
-
-
-def grbl_write_settings(port, baud, changes):
-    with open_grbl(port, baud) as ser:
-        return write_grbl_settings(ser, changes)
+    def _fire(self):
+        self._pending = None
+        self.fn()
 
 
 # ---------------------------------------------------------------------------
 # GUI
 # ---------------------------------------------------------------------------
 
-def get_system_fonts():
-    font_dict = {}
-    for path in findSystemFonts(fontpaths=None, fontext="ttf"):
-        try:
-            name = FontProperties(fname=path).get_name()
-            font_dict.setdefault(name, path)
-        except Exception:
-            pass
-    return dict(sorted(font_dict.items()))
-
-
 SETTINGS_FIELDS = [
     ("text_cut_depth", "Text Cut Depth (mm)"),
     ("label_cutout_depth", "Label Cutout Depth (mm)"),
@@ -824,31 +165,54 @@ SETTINGS_FIELDS = [
     ("tab_height", "Tab Height (mm, 0 = no tabs)"),
     ("material_width", "Material Width (mm)"),
     ("material_height", "Material Height (mm)"),
+    ("link_distance", "Max Link at Depth (mm, 0 = always retract)"),
+    ("simplify_tolerance", "Simplify Tolerance (mm, 0 = off)"),
+    ("arc_tolerance", "Arc Fit Tolerance (mm, 0 = no G2/G3)"),
 ]
 
 SNAP_GRID_MM = 5
+PREVIEW_DEBOUNCE_MS = 150  # quiet time after the last keystroke before redrawing
 CANVAS_W, CANVAS_H = 900, 550
 
 
 def main():
+    # tkinter is only needed for the window itself: the geometry, gcode and
+    # machine layers all run headless (see Console/batch.py)
+    import tkinter as tk
+    from tkinter import (
+        StringVar, OptionMenu, Label, Canvas, Entry, Toplevel, Button,
+        Checkbutton, filedialog, messagebox,
+    )
+
     load_settings()
 
-    system_fonts = get_system_fonts()
+    # Open straight away with the fonts indexed by the last run, and re-check
+    # the installed ones in the background (the first run has to scan now)
+    font_index = load_font_index()
+    system_fonts = index_fonts(font_index)
+    scanned = not system_fonts
+    if scanned:
+        system_fonts = get_system_fonts()
+    # The single-line stroke fonts from fonts/ follow the TrueType ones
+    system_fonts.update(stroke_font_choices())
     if not system_fonts:
         messagebox.showerror(
             "No fonts found",
-            "No TrueType fonts were found on this system. Install a TTF font and retry.",
+            "No TrueType or stroke fonts were found. Install a TTF font and retry.",
         )
         return
 
     root = tk.Tk()
     root.title("CNC Label Maker")
+    worker = ComputeWorker(lambda fn: root.after(0, fn))
 
     state = {
         "zoom": 1.0,
         "pan": [0.0, 0.0],   # screen-px offset from drag-panning
         "drag": None,
         "font_path": next(iter(system_fonts.values())),
+        "sheet": 0,          # which material sheet the preview shows
+        "preview_job": None,  # inputs of the last preview submitted
     }
 
     # --- console window ---
@@ -892,16 +256,6 @@ def main():
             text.see("end")
             text.config(state="disabled")
 
-    def parse_label_size(raw):
-        """'Auto' -> None, '60x20' -> (60.0, 20.0); raises ValueError otherwise."""
-        raw = raw.strip().lower().replace("×", "x")
-        if raw in ("", "auto"):
-            return None
-        w, h = (float(p) for p in raw.split("x"))
-        if w <= 0 or h <= 0:
-            raise ValueError(raw)
-        return (w, h)
-
     def read_inputs():
         """Widget values -> layout inputs, or None if a field is invalid."""
         try:
@@ -914,152 +268,360 @@ def main():
         labels = [lbl.strip().rstrip(",") for lbl in text.splitlines() if lbl.strip()]
         return labels, font_height, spacing, label_size
 
-    def current_layout():
+    def snapshot():
+        """Layout inputs copied on the Tk thread, so a background job never
+        reads widgets or settings that change under it. None if a field is
+        invalid."""
         inputs = read_inputs()
         if inputs is None:
             return None
         labels, font_height, spacing, label_size = inputs
-        laser = cnc_settings["tool_mode"] == "Laser"
-        kerf_r = (cnc_settings["laser_kerf"] if laser else cnc_settings["tool_diameter"]) / 2
-        return build_layout(
-            labels, state["font_path"], font_height, spacing,
-            cnc_settings["cutout_padding"], cnc_settings["material_width"],
-            cnc_settings["material_height"],
-            snap_grid=SNAP_GRID_MM if snap_var.get() else None,
-            label_size=label_size, margin=kerf_r,
-        )
+        return {
+            "labels": labels, "font_path": state["font_path"],
+            "font_height": font_height, "spacing": spacing,
+            "label_size": label_size, "snap": snap_var.get(),
+            "fill": fill_text_var.get(), "settings": dict(cnc_settings),
+            "sheet": state["sheet"], "toolpath": toolpath_var.get(),
+        }
+
+    def job_sheets(job, progress=None):
+        """Worker side: the job's layout, one list of items per sheet."""
+        s = job["settings"]
+        return sheet_layouts(build_layout(
+            job["labels"], job["font_path"], job["font_height"], job["spacing"],
+            s["cutout_padding"], s["material_width"], s["material_height"],
+            snap_grid=SNAP_GRID_MM if job["snap"] else None,
+            label_size=job["label_size"], margin=kerf_radius(s), progress=progress,
+        ))
+
+    def pick_sheet(job, sheets):
+        """(index, layout) of the sheet on show, clamped to the sheets there are."""
+        if not sheets:
+            return 0, []
+        k = min(job["sheet"], len(sheets) - 1)
+        return k, sheets[k]
+
+    # Layout and G-code are computed on the worker thread; results come back
+    # through root.after. busy holds the running jobs' progress text.
+    busy = {}
+
+    def show_busy():
+        busy_label.config(text=" · ".join(busy.values()))
+
+    def run_job(key, what, fn, on_done, on_error=None):
+        """Run fn(progress) in the background, showing progress as `what`;
+        then on_done(result) on the Tk thread. A newer job with the same key
+        replaces this one."""
+        busy[key] = f"{what}…"
+        show_busy()
+
+        def progress(done, total):
+            busy[key] = f"{what}… {done}/{total} labels"
+            show_busy()
+
+        def finished(result):
+            busy.pop(key, None)
+            show_busy()
+            on_done(result)
+
+        def failed(exc):
+            busy.pop(key, None)
+            show_busy()
+            app_log(f"{what} failed: {exc}")
+            if on_error:
+                on_error(exc)
+            else:
+                messagebox.showerror("Error", f"{what} failed: {exc}")
 
-    def update_preview():
-        canvas.delete("all")
-        mat_w, mat_h = cnc_settings["material_width"], cnc_settings["material_height"]
+        worker.submit(key, fn, finished, failed, progress)
 
-        if read_inputs() is None:
-            canvas.create_text(
-                200, 40, text="Invalid font height, spacing or label size", fill="red"
-            )
-            return
-        layout = current_layout()
+    def show_sheet(step):
+        state["sheet"] = max(0, state["sheet"] + step)
+        update_preview()
 
-        # World (mm) -> screen (px): fit the whole material sheet into the
-        # canvas at zoom 1, and zoom about the canvas centre so content stays
-        # in view.
+    # Retained preview scene. Items are drawn in canvas pixels for the view
+    # transform in scene["view"] — screen = world_mm * scale + (tx, ty) — and
+    # zoom/pan re-map the existing items with canvas.scale / canvas.move
+    # instead of drawing them again. A layout change only redraws labels
+    # whose shape changed; a label that just moved is moved.
+    #   "scene"    every item that lives in world coordinates
+    #   "label"    design view, plus one "lbl<n>" tag per label
+    #   "toolpath" simulated G-code view
+    #   "overlay"  cheap per-view extras (material edge, origin, badges,
+    #              legend, warnings): redrawn on every view change
+    scene = {
+        "view": None,       # (scale, tx, ty) the scene items are drawn at
+        "labels": {},       # shape signature -> [(tag, (x, y)), ...]
+        "toolpath": None,   # Toolpath the toolpath items were drawn from
+        "layout": [],       # sheet on show, for the overlay
+        "tags": itertools.count(),
+    }
+
+    def view_transform():
+        mat_w, mat_h = cnc_settings["material_width"], cnc_settings["material_height"]
+        # Fit the whole material sheet into the canvas at zoom 1, and zoom
+        # about the canvas centre so content stays in view
         scale = min(CANVAS_W / mat_w, CANVAS_H / mat_h) * 0.95 * state["zoom"]
         pan_x, pan_y = state["pan"]
+        return (scale,
+                CANVAS_W / 2 - mat_w / 2 * scale + pan_x,
+                CANVAS_H / 2 - mat_h / 2 * scale + pan_y)
+
+    def sync_view():
+        """Re-map the drawn scene onto the current zoom/pan."""
+        view, old = view_transform(), scene["view"]
+        if old is not None and old != view:
+            f = view[0] / old[0]
+            canvas.scale("scene", 0, 0, f, f)
+            canvas.move("scene", view[1] - old[1] * f, view[2] - old[2] * f)
+        scene["view"] = view
+
+    def refresh_view():
+        """Zoom/pan: nothing is recomputed or redrawn but the overlay."""
+        sync_view()
+        draw_overlay()
+
+    def clear_scene():
+        canvas.delete("scene")
+        scene["labels"].clear()
+        scene["toolpath"] = None
+        scene["layout"] = []
+
+    def label_signature(item, fill):
+        """Everything that decides how a label looks, but not where it is."""
+        x0, y0, x1, y1 = item["cutout"]
+        return (item["label"], state["font_path"], item["width"], item["height"],
+                item["x"] - x0, item["y_top"] - y0, x1 - x0, y1 - y0,
+                item["fits"], fill)
+
+    def draw_label(item, tag, fill):
+        scale, tx, ty = scene["view"]
+        x, y_top, height = item["x"], item["y_top"], item["height"]
+        tags = ("scene", "label", tag)
+
+        # geom is Y-up with origin at the text bbox bottom-left; the canvas
+        # is Y-down, so: world_y = y_top + height - geom_y
+        def to_canvas(coords):
+            pts = np.asarray(coords, dtype=float)
+            return np.column_stack((
+                (pts[:, 0] + x) * scale + tx,
+                (y_top + height - pts[:, 1]) * scale + ty,
+            )).ravel().tolist()
+
+        if fill:
+            for poly in geom_polygons(item["geom"]):
+                canvas.create_polygon(to_canvas(poly.exterior.coords),
+                                      fill="black", outline="black", tags=tags)
+                for interior in poly.interiors:
+                    canvas.create_polygon(to_canvas(interior.coords),
+                                          fill="white", outline="white", tags=tags)
+        else:
+            for ring in geom_rings(item["geom"]):
+                canvas.create_line(to_canvas(ring), fill="red", tags=tags)
+        # Stroke fonts: the centrelines the tool follows, whatever the mode
+        for line in geom_lines(item["geom"]):
+            canvas.create_line(to_canvas(line), fill="black" if fill else "red",
+                               width=2 if fill else 1, tags=tags)
+
+        cx0, cy0, cx1, cy1 = item["cutout"]
+        canvas.create_rectangle(
+            cx0 * scale + tx, cy0 * scale + ty, cx1 * scale + tx, cy1 * scale + ty,
+            outline="blue" if item["fits"] else "red", dash=(2, 2), tags=tags,
+        )
+
+    def sync_labels(layout, fill):
+        """Design view: reuse, move, or (re)draw each label's items."""
+        scale = scene["view"][0]
+        old, new = scene["labels"], {}
+        for item in layout:
+            sig = label_signature(item, fill)
+            pos = tuple(item["cutout"][:2])
+            drawn = old.get(sig)
+            if drawn:
+                # prefer the copy already in place (duplicate labels)
+                k = next((k for k, (_, p) in enumerate(drawn) if p == pos), 0)
+                tag, was = drawn.pop(k)
+                if was != pos:
+                    canvas.move(tag, (pos[0] - was[0]) * scale, (pos[1] - was[1]) * scale)
+            else:
+                tag = f"lbl{next(scene['tags'])}"
+                draw_label(item, tag, fill)
+            new.setdefault(sig, []).append((tag, pos))
+        for drawn in old.values():
+            for tag, _ in drawn:
+                canvas.delete(tag)
+        scene["labels"] = new
+
+    def sync_toolpath(tp, runs):
+        """Toolpath view: the moves the exported G-code is rendered from, so
+        the preview cannot lie. Redrawn only when the toolpath changes."""
+        if tp is scene["toolpath"]:
+            return
+        canvas.delete("toolpath")
+        scene["toolpath"] = tp
+        scale, tx, ty = scene["view"]
+        mat_h = cnc_settings["material_height"]
+        job_ox, job_oy = cnc_settings["offset_x"], cnc_settings["offset_y"]
+        final_z = min((z for kind, z, _ in runs if kind == "cutout"), default=0.0)
+        order = {"rapid": 0, "engrave": 1, "cutout": 2}
+
+        def draw_rank(run):
+            kind, z, _ = run
+            return (order[kind], 1 if kind == "cutout" and abs(z - final_z) < 1e-6 else 0)
+
+        # Earlier cutout passes draw first (light blue) so tab gaps in the
+        # final (dark) pass show through where the tabs are
+        tags = ("scene", "toolpath")
+        for kind, z, pts in sorted(runs, key=draw_rank):
+            pts = np.asarray(pts, dtype=float).reshape(-1, 2)
+            flat = np.column_stack((
+                (pts[:, 0] - job_ox) * scale + tx,
+                (mat_h - (pts[:, 1] - job_oy)) * scale + ty,
+            )).ravel().tolist()
+            if kind == "rapid":
+                canvas.create_line(flat, fill="#bbbbbb", dash=(2, 3), tags=tags)
+            elif kind == "engrave":
+                canvas.create_line(flat, fill="red", tags=tags)
+            elif abs(z - final_z) < 1e-6:
+                canvas.create_line(flat, fill="#0000cc", width=2, tags=tags)
+            else:
+                canvas.create_line(flat, fill="#aac6e8", tags=tags)
+
+    def draw_overlay(message=None):
+        canvas.delete("overlay")
+        tags = ("overlay",)
+        if message:
+            canvas.create_text(200, 40, text=message, fill="red", tags=tags)
+            return
+        mat_w, mat_h = cnc_settings["material_width"], cnc_settings["material_height"]
+        scale, tx, ty = scene["view"]
 
         def sx(wx):
-            return (wx - mat_w / 2) * scale + CANVAS_W / 2 + pan_x
+            return wx * scale + tx
 
         def sy(wy):
-            return (wy - mat_h / 2) * scale + CANVAS_H / 2 + pan_y
+            return wy * scale + ty
 
         # Material boundary and work zero (machine origin = bottom-left)
-        canvas.create_rectangle(sx(0), sy(0), sx(mat_w), sy(mat_h), outline="gray")
+        canvas.create_rectangle(sx(0), sy(0), sx(mat_w), sy(mat_h), outline="gray",
+                                tags=tags)
+        canvas.tag_lower("overlay")
         zx, zy = sx(0), sy(mat_h)
-        canvas.create_line(zx - 8, zy, zx + 8, zy, fill="green")
-        canvas.create_line(zx, zy - 8, zx, zy + 8, fill="green")
+        canvas.create_line(zx - 8, zy, zx + 8, zy, fill="green", tags=tags)
+        canvas.create_line(zx, zy - 8, zx, zy + 8, fill="green", tags=tags)
         ox, oy = cnc_settings["offset_x"], cnc_settings["offset_y"]
         origin_label = "X0 Y0" if not (ox or oy) else f"job at X{ox:g} Y{oy:g}"
-        canvas.create_text(zx + 6, zy + 12, text=origin_label, fill="green", anchor="w")
-
-        overflow = any(
-            item["cutout"][2] > mat_w or item["cutout"][1] < 0 for item in layout
-        )
-
-        if toolpath_var.get():
-            # Simulate the real exported G-code so the preview cannot lie
-            segs = simulate_gcode(
-                generate_gcode_lines(layout, cnc_settings, fill_text_var.get())
-            )
-            job_ox, job_oy = cnc_settings["offset_x"], cnc_settings["offset_y"]
-            final_z = min((s[5] for s in segs if s[4] == "cutout"), default=0.0)
-            order = {"rapid": 0, "engrave": 1, "cutout": 2}
-
-            def draw_rank(seg):
-                kind, z = seg[4], seg[5]
-                is_final = kind == "cutout" and abs(z - final_z) < 1e-6
-                return (order[kind], 1 if is_final else 0)
-
-            # Earlier cutout passes draw first (light blue) so tab gaps in the
-            # final (dark) pass show through where the tabs are
-            for x0m, y0m, x1m, y1m, kind, z in sorted(segs, key=draw_rank):
-                p = (sx(x0m - job_ox), sy(mat_h - (y0m - job_oy)),
-                     sx(x1m - job_ox), sy(mat_h - (y1m - job_oy)))
-                if kind == "rapid":
-                    canvas.create_line(*p, fill="#bbbbbb", dash=(2, 3))
-                elif kind == "engrave":
-                    canvas.create_line(*p, fill="red")
-                elif abs(z - final_z) < 1e-6:
-                    canvas.create_line(*p, fill="#0000cc", width=2)
-                else:
-                    canvas.create_line(*p, fill="#aac6e8")
+        canvas.create_text(zx + 6, zy + 12, text=origin_label, fill="green", anchor="w",
+                           tags=tags)
 
+        layout = scene["layout"]
+        if scene["toolpath"] is not None:
             # Cut order badges (labels are engraved then cut out, in this order)
             for i, item in enumerate(layout, 1):
                 px, py = sx(item["cutout"][0]), sy(item["cutout"][1])
                 canvas.create_oval(px - 9, py - 9, px + 9, py + 9,
-                                   fill="white", outline="green")
-                canvas.create_text(px, py, text=str(i), fill="green")
+                                   fill="white", outline="green", tags=tags)
+                canvas.create_text(px, py, text=str(i), fill="green", tags=tags)
             canvas.create_text(
-                CANVAS_W / 2, CANVAS_H - 10, fill="gray",
+                CANVAS_W / 2, CANVAS_H - 10, fill="gray", tags=tags,
                 text=("grey dashes = rapids · red = engraving · dark blue = final cutout pass "
                       "(gaps = tabs) · light blue = earlier passes · numbers = cut order"),
             )
-            design_items = []  # design drawing below is skipped in toolpath view
-        else:
-            design_items = layout
-
-        for item in design_items:
-            x, y_top, height = item["x"], item["y_top"], item["height"]
-
-            # geom is Y-up with origin at the text bbox bottom-left; the canvas
-            # is Y-down, so: world_y = y_top + height - geom_y
-            def to_canvas(coords):
-                pts = np.asarray(coords, dtype=float).copy()
-                wx = pts[:, 0] + x
-                wy = y_top + height - pts[:, 1]
-                pts[:, 0] = (wx - mat_w / 2) * scale + CANVAS_W / 2 + pan_x
-                pts[:, 1] = (wy - mat_h / 2) * scale + CANVAS_H / 2 + pan_y
-                return pts
-
-            if fill_text_var.get():
-                for poly in geom_polygons(item["geom"]):
-                    ext = to_canvas(poly.exterior.coords)
-                    canvas.create_polygon(
-                        [c for pt in ext for c in pt], fill="black", outline="black"
-                    )
-                    for interior in poly.interiors:
-                        hole = to_canvas(interior.coords)
-                        canvas.create_polygon(
-                            [c for pt in hole for c in pt], fill="white", outline="white"
-                        )
-            else:
-                for ring in geom_rings(item["geom"]):
-                    pts = to_canvas(ring)
-                    for i in range(len(pts) - 1):
-                        canvas.create_line(*pts[i], *pts[i + 1], fill="red")
-
-            cx0, cy0, cx1, cy1 = item["cutout"]
-            canvas.create_rectangle(
-                sx(cx0), sy(cy0), sx(cx1), sy(cy1),
-                outline="blue" if item["fits"] else "red", dash=(2, 2),
-            )
 
         warnings = []
-        if overflow:
+        if any(item["cutout"][2] > mat_w or item["cutout"][1] < 0 for item in layout):
             warnings.append("labels exceed material size")
         if any(not item["fits"] for item in layout):
             warnings.append("text too big for label size (red)")
         if warnings:
             canvas.create_text(
-                CANVAS_W / 2, 15,
+                CANVAS_W / 2, 15, tags=tags,
                 text="Warning: " + "; ".join(warnings), fill="orange",
             )
 
+    # Last result of each preview stage and the inputs it came from, so a
+    # recompute skips the stages whose inputs didn't change (toggling the
+    # toolpath view doesn't re-lay-out; a layout edit that leaves this sheet
+    # alone doesn't regenerate its G-code). Only the worker touches it.
+    stages = {"layout": (None, None), "toolpath": (None, None)}
+
+    def staged(stage, key, fn):
+        last_key, value = stages[stage]
+        if key != last_key:
+            value = fn()
+            stages[stage] = (key, value)
+        return value
+
+    def update_preview():
+        job = snapshot()
+        if job is None:
+            worker.cancel("preview")
+            state["preview_job"] = None
+            busy.pop("preview", None)
+            show_busy()
+            clear_scene()
+            draw_overlay("Invalid font height, spacing or label size")
+            return
+        if job == state["preview_job"]:
+            return  # e.g. a cursor key: nothing the preview depends on changed
+        state["preview_job"] = job
+
+        def compute(progress):
+            s = job["settings"]
+            layout_key = (tuple(job["labels"]), job["font_path"], job["font_height"],
+                          job["spacing"], job["label_size"], job["snap"],
+                          s["cutout_padding"], s["material_width"],
+                          s["material_height"], kerf_radius(s))
+            sheets = staged("layout", layout_key, lambda: job_sheets(job, progress))
+            k, layout = pick_sheet(job, sheets)
+            tp = runs = est = None
+            if job["toolpath"]:
+                def toolpath():
+                    path = build_toolpath(layout, s, job["fill"], progress)
+                    return (path, list(toolpath_runs(toolpath_segments(path, as_array=True))),
+                            estimate_time(path, s))
+                gcode_key = (layout_key, k, job["fill"], tuple(sorted(s.items())))
+                tp, runs, est = staged("toolpath", gcode_key, toolpath)
+            return k, len(sheets), layout, tp, runs, est
+
+        def failed(exc):
+            state["preview_job"] = None  # let the same inputs try again
+            draw_overlay(f"Preview failed: {exc}")
+
+        run_job("preview", "Updating preview", compute, show_preview, on_error=failed)
+
+    def show_preview(result):
+        k, n_sheets, layout, tp, runs, est = result
+        state["sheet"] = k
+        sheet_text = f"Sheet {k + 1} of {max(n_sheets, 1)}"
+        if est is not None:
+            sheet_text += f" · ~{format_duration(est['total'])}"
+        sheet_label.config(text=sheet_text)
+
+        sync_view()
+        if tp is not None:
+            if scene["labels"]:
+                canvas.delete("label")
+                scene["labels"].clear()
+            sync_toolpath(tp, runs)
+        else:
+            if scene["toolpath"] is not None:
+                canvas.delete("toolpath")
+                scene["toolpath"] = None
+            sync_labels(layout, fill_text_var.get())
+        scene["layout"] = layout
+        draw_overlay()
+
     def generate_gcode():
-        if read_inputs() is None:
+        job = snapshot()
+        if job is None:
             messagebox.showerror("Error", "Invalid font height, spacing or label size")
             return
-        layout = current_layout()
+        run_job("export", "Laying out", lambda progress: job_sheets(job, progress),
+                lambda sheets: save_gcode(job, sheets))
+
+    def save_gcode(job, sheets):
+        layout = [item for sheet in sheets for item in sheet]
         if not layout:
             messagebox.showerror("Error", "Nothing to export — enter at least one label")
             return
@@ -1076,31 +638,69 @@ def main():
         ):
             return
 
-        gcode = generate_gcode_lines(layout, cnc_settings, fill_text_var.get())
-
         file_path = filedialog.asksaveasfilename(
             defaultextension=".gcode", filetypes=[("G-code files", "*.gcode")]
         )
-        if file_path:
-            with open(file_path, "w") as f:
-                f.write("\n".join(gcode))
-            app_log(f"Exported {len(gcode)} lines of G-code to {file_path}")
-            messagebox.showinfo("Success", f"G-code saved to {file_path}")
-        else:
+        if not file_path:
             app_log("G-code export cancelled")
+            return
+        # One program per material sheet: job.gcode -> job_sheet1.gcode, …
+        stem, ext = os.path.splitext(file_path)
+        paths = [file_path if len(sheets) == 1 else f"{stem}_sheet{n}{ext}"
+                 for n in range(1, len(sheets) + 1)]
+
+        def write_all(progress):
+            # Text is streamed straight to disk; the (compact) toolpath is
+            # kept per sheet for the run-time estimate
+            s = job["settings"]
+            estimates = []
+            for n, (sheet, path) in enumerate(zip(sheets, paths), 1):
+                tp = build_toolpath(sheet, s, job["fill"], progress)
+                count = write_gcode(path, iter_gcode(tp, s))
+                est = estimate_time(tp, s)
+                estimates.append(est)
+                app_log(f"Exported {count} lines of G-code to {path}")
+                app_log(f"Sheet {n} run time: {describe_estimate(est)}")
+                for label, seconds in zip(tp.labels, est["labels"]):
+                    app_log(f"  {label}: {format_duration(seconds)}")
+            total = sum_estimates(estimates)
+            if len(sheets) > 1:
+                app_log(f"Job run time: {describe_estimate(total)}")
+            flush_glyph_stores()  # the glyphs this job needed, for next time
+            return paths, total
+
+        run_job("export", "Writing G-code", write_all, show_saved)
+
+    def show_saved(result):
+        saved, est = result
+        when = f"\n\nEstimated run time {describe_estimate(est)}"
+        if len(saved) == 1:
+            messagebox.showinfo("Success", f"G-code saved to {saved[0]}{when}")
+        else:
+            messagebox.showinfo(
+                "Success", f"{len(saved)} sheets saved:\n\n" + "\n".join(saved) + when
+            )
 
     def export_dry_run():
-        if read_inputs() is None:
+        job = snapshot()
+        if job is None:
             messagebox.showerror("Error", "Invalid font height, spacing or label size")
             return
-        layout = current_layout()
+        run_job("dry_run", "Laying out", lambda progress: job_sheets(job, progress),
+                lambda sheets: save_dry_run(job, sheets))
+
+    def save_dry_run(job, sheets):
+        k, layout = pick_sheet(job, sheets)
         if not layout:
             messagebox.showerror("Error", "Nothing to trace — enter at least one label")
             return
-        gcode = generate_dry_run_lines(layout, cnc_settings)
-        app_log(f"Dry run generated: {len(gcode)} lines (boundary trace)")
+        gcode = generate_dry_run_lines(layout, job["settings"])
+        app_log(f"Dry run generated for sheet {k + 1} of {len(sheets)}: "
+                f"{len(gcode)} lines (boundary trace)")
         file_path = filedialog.asksaveasfilename(
-            defaultextension=".gcode", initialfile="dry_run.gcode",
+            defaultextension=".gcode",
+            initialfile="dry_run.gcode" if len(sheets) == 1
+            else f"dry_run_sheet{k + 1}.gcode",
             filetypes=[("G-code files", "*.gcode")],
         )
         if file_path:
@@ -1155,7 +755,15 @@ def main():
                 cnc_settings["machine_baud"] = int(baud_entry.get())
             except ValueError:
                 pass
+            cnc_settings["machine_rx_buffer"] = rx_buffer()
             save_settings()
+
+        def rx_buffer():
+            """Character-counting buffer size for the stream, 0 = send-and-wait."""
+            if not fast_var.get():
+                return 0
+            return cnc_settings.get("machine_rx_buffer") or GRBL_RX_BUFFER
+
         dry_var = tk.BooleanVar(value=True)
         Checkbutton(
             win, text="Dry run only (boundary trace, no cutting)", variable=dry_var
@@ -1164,6 +772,9 @@ def main():
         Checkbutton(
             win, text="Home ($H) before send", variable=home_var
         ).grid(row=3, column=2, sticky="w")
+        fast_var = tk.BooleanVar(
+            value=cnc_settings.get("machine_rx_buffer", GRBL_RX_BUFFER) > 0
+        )
         status = Label(win, text="Set your work zero, then Send",
                        wraplength=380, justify="left")
         status.grid(row=4, column=0, columnspan=3, pady=4)
@@ -1227,25 +838,46 @@ def main():
                 root.after(0, lambda: pos_label.config(text=report))
 
         def start_send():
-            if read_inputs() is None:
+            job = snapshot()
+            if job is None:
                 messagebox.showerror("Error", "Invalid font height, spacing or label size")
                 return
-            layout = current_layout()
-            if not layout:
+            dry = dry_var.get()
+
+            def compute(progress):
+                sheets = job_sheets(job, progress)
+                k, layout = pick_sheet(job, sheets)
+                if not layout:
+                    return k, len(sheets), None, 0
+                if dry:
+                    lines = generate_dry_run_lines(layout, job["settings"])
+                    return k, len(sheets), lines, len(sendable_lines(lines))
+                # The compact toolpath is kept; its text is rendered only as
+                # the stream consumes it
+                tp = build_toolpath(layout, job["settings"], job["fill"], progress)
+                total = sendable_line_count(tp, job["settings"])
+                app_log(f"Estimated run time: "
+                        f"{describe_estimate(estimate_time(tp, job['settings']))}")
+                return k, len(sheets), iter_gcode(tp, job["settings"]), total
+
+            run_job("send", "Preparing G-code", compute, lambda result: send_lines(*result))
+
+        def send_lines(k, n_sheets, lines, total):
+            if lines is None:
                 messagebox.showerror("Error", "Nothing to send — enter at least one label")
                 return
-            lines = (
-                generate_dry_run_lines(layout, cnc_settings) if dry_var.get()
-                else generate_gcode_lines(layout, cnc_settings, fill_text_var.get())
-            )
+            if n_sheets > 1:
+                # One sheet per machine setup: send the one on show
+                app_log(f"Sending sheet {k + 1} of {n_sheets}")
             home = home_var.get()
+            rx = rx_buffer()
             abort_event.clear()
 
             def do_send(ser):
                 sent, errors = stream_gcode(
                     ser, lines,
                     on_progress=lambda i, n: set_status(f"Sending… {i}/{n}"),
-                    abort=abort_event, home=home,
+                    abort=abort_event, home=home, rx_buffer=rx, total=total,
                 )
                 if abort_event.is_set():
                     set_status(f"Aborted after {sent} lines — machine was reset")
@@ -1262,8 +894,18 @@ def main():
             def do_read(ser):
                 values = read_grbl_settings(ser)
                 set_status("Settings loaded")
+                # Rates/accelerations drive the run-time estimate
+                motion = {str(key): float(values[key])
+                          for key in GRBL_MOTION_DEFAULTS if key in values}
+                if motion and motion != cnc_settings.get("grbl_motion"):
+                    root.after(0, lambda: remember_motion(motion))
                 root.after(0, lambda: build_editor(values))
 
+            def remember_motion(motion):
+                cnc_settings["grbl_motion"] = motion
+                save_settings()
+                update_preview()
+
             def build_editor(values):
                 ed = Toplevel(win)
                 ed.title("GRBL Settings ($$)")
@@ -1378,6 +1020,9 @@ def main():
 
         Button(win, text="▶ Send", command=start_send).grid(row=5, column=0, pady=6)
         Button(win, text="⛔ Abort", command=abort_event.set).grid(row=5, column=1, pady=6)
+        Checkbutton(
+            win, text="Fast streaming (fill GRBL's buffer)", variable=fast_var
+        ).grid(row=5, column=2, sticky="w")
         Button(win, text="⚙ GRBL Settings ($$)", command=open_grbl_settings).grid(
             row=6, column=0, columnspan=2, pady=(0, 6)
         )
@@ -1465,6 +1110,10 @@ def main():
         OptionMenu(win, tool_mode, "Spindle", "Laser").grid(
             row=len(SETTINGS_FIELDS), column=1
         )
+        optimize_var = tk.BooleanVar(value=cnc_settings.get("optimize_travel", True))
+        Checkbutton(win, text="Optimise cut order (shorter rapids)",
+                    variable=optimize_var).grid(row=len(SETTINGS_FIELDS) + 1,
+                                                column=0, columnspan=2)
 
         def save():
             try:
@@ -1479,12 +1128,13 @@ def main():
                     return
             cnc_settings.update(new_values)
             cnc_settings["tool_mode"] = tool_mode.get()
+            cnc_settings["optimize_travel"] = optimize_var.get()
             save_settings()
             win.destroy()
             update_preview()
 
         Button(win, text="Save", command=save).grid(
-            row=len(SETTINGS_FIELDS) + 1, column=0, columnspan=2, pady=10
+            row=len(SETTINGS_FIELDS) + 2, column=0, columnspan=2, pady=10
         )
 
     def zoom_canvas(delta, px, py):
@@ -1493,7 +1143,7 @@ def main():
         state["pan"][0] = (px - CANVAS_W / 2) * (1 - f) + state["pan"][0] * f
         state["pan"][1] = (py - CANVAS_H / 2) * (1 - f) + state["pan"][1] * f
         state["zoom"] *= f
-        update_preview()
+        refresh_view()
 
     def start_pan(event):
         state["drag"] = (event.x, event.y)
@@ -1505,17 +1155,39 @@ def main():
         state["pan"][0] += event.x - lx
         state["pan"][1] += event.y - ly
         state["drag"] = (event.x, event.y)
-        update_preview()
+        refresh_view()
 
     def reset_zoom():
         state["zoom"] = 1.0
         state["pan"] = [0.0, 0.0]
-        update_preview()
+        refresh_view()
 
     def select_font(name):
         state["font_path"] = system_fonts[name]
         update_preview()
 
+    def refresh_fonts(progress):
+        index, changed = refresh_font_index(font_index, progress=progress)
+        if not changed:
+            return None
+        save_font_index(index)
+        return {**index_fonts(index), **stroke_font_choices()}
+
+    def show_fonts(fonts):
+        if not fonts:
+            return  # nothing installed or removed since the last run
+        system_fonts.clear()
+        system_fonts.update(fonts)
+        menu = font_menu["menu"]
+        menu.delete(0, "end")
+        for name in fonts:
+            menu.add_command(label=name, command=tk._setit(font_name, name, select_font))
+        if font_name.get() not in fonts:
+            font_name.set(next(iter(fonts)))  # the font on show was uninstalled
+        if fonts[font_name.get()] != state["font_path"]:
+            select_font(font_name.get())
+        app_log(f"Font list updated: {len(fonts)} fonts")
+
     # --- menu bar ---
     menubar = tk.Menu(root)
     file_menu = tk.Menu(menubar, tearoff=0)
@@ -1566,9 +1238,8 @@ def main():
     Label(root, text="Font:").grid(row=2, column=0, sticky="e")
     font_name = StringVar()
     font_name.set(next(iter(system_fonts.keys())))
-    OptionMenu(root, font_name, *system_fonts.keys(), command=select_font).grid(
-        row=2, column=1, sticky="w"
-    )
+    font_menu = OptionMenu(root, font_name, *system_fonts.keys(), command=select_font)
+    font_menu.grid(row=2, column=1, sticky="w")
 
     Button(root, text="🔄 Reset Zoom", command=reset_zoom).grid(row=2, column=2)
     Button(root, text="💾 Export G-code", command=generate_gcode).grid(row=2, column=3)
@@ -1590,6 +1261,13 @@ def main():
     canvas = Canvas(root, width=CANVAS_W, height=CANVAS_H, bg="white")
     canvas.grid(row=3, column=0, columnspan=8, pady=10)
 
+    Button(root, text="◀ Sheet", command=lambda: show_sheet(-1)).grid(row=4, column=0)
+    sheet_label = Label(root, text="Sheet 1 of 1")
+    sheet_label.grid(row=4, column=1)
+    Button(root, text="Sheet ▶", command=lambda: show_sheet(1)).grid(row=4, column=2)
+    busy_label = Label(root, text="", fg="gray")
+    busy_label.grid(row=4, column=3, columnspan=5, sticky="w")
+
     canvas.bind("<MouseWheel>", lambda e: zoom_canvas(e.delta, e.x, e.y))
     canvas.bind("<Button-4>", lambda e: zoom_canvas(120, e.x, e.y))
     canvas.bind("<Button-5>", lambda e: zoom_canvas(-120, e.x, e.y))
@@ -1597,12 +1275,15 @@ def main():
                           ("<ButtonPress-2>", "<B2-Motion>")):
         canvas.bind(press, start_pan)
         canvas.bind(motion, do_pan)
-    entry.bind("<KeyRelease>", lambda e: update_preview())
-    font_height_entry.bind("<KeyRelease>", lambda e: update_preview())
-    spacing_entry.bind("<KeyRelease>", lambda e: update_preview())
-    size_entry.bind("<KeyRelease>", lambda e: update_preview())
+    # Typing coalesces into one recompute once the keys go quiet
+    schedule_preview = Debouncer(root, PREVIEW_DEBOUNCE_MS, update_preview)
+    for widget in (entry, font_height_entry, spacing_entry, size_entry):
+        widget.bind("<KeyRelease>", schedule_preview)
 
     update_preview()
+    if not scanned:
+        # Its own thread, so probing new fonts never holds up the preview
+        ComputeWorker(lambda fn: root.after(0, fn)).submit("fonts", refresh_fonts, show_fonts)
     root.mainloop()
 
 
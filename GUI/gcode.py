@@ -0,0 +1,1115 @@
+# Author: Paul Wyers
+# Copyright (C) 2025 Paul Wyers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Cutting settings, the Toolpath IR, streaming G-code generation and
+rendering, the G-code parser the preview shares, and the run-time estimate.
+
+Builds on geometry (numpy and shapely); needs no GUI and no matplotlib
+unless a label's glyphs have to be read from the font."""
+
+import json
+import math
+import os
+import re
+from array import array
+
+import numpy as np
+import shapely
+import shapely.affinity
+
+from geometry import geom_lines, geom_rings, hatch_fill, kerf_radius
+from machine import app_log
+
+# Settings file lives next to this script, not in whatever directory the app
+# happens to be launched from.
+SETTINGS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "machine_settings.json"
+)
+
+DEFAULT_SETTINGS = {
+    "text_cut_depth": 0.2,
+    "label_cutout_depth": 1.6,
+    "pass_depth": 0.4,
+    "tool_diameter": 0.3,
+    "safe_z": 5.0,
+    "offset_x": 0.0,
+    "offset_y": 0.0,
+    "feed_rate": 300,
+    "plunge_rate": 100,
+    "spindle_rpm": 10000,
+    "laser_power": 1000,
+    "tool_mode": "Spindle",
+    "cutout_padding": 2.0,
+    "laser_kerf": 0.15,
+    "tab_width": 3.0,
+    "tab_height": 0.4,
+    "material_width": 1000,
+    "material_height": 600,
+    "optimize_travel": True,  # reorder strokes to shorten rapids
+    "link_distance": 1.0,  # feed across at depth instead of retracting, if this close
+    "simplify_tolerance": 0.0,  # Douglas–Peucker on text outlines; 0 = off
+    "arc_tolerance": 0.0,  # fit G2/G3 arcs to curves; 0 = straight G1 only
+    "grbl_motion": {},  # $11 / $110-$122 as last read from the machine (run-time estimate)
+    "machine_target": "",   # last-used machine connection (COM port / IP / ws URL)
+    "machine_baud": 115200,
+    "machine_rx_buffer": 128,  # character-counting stream buffer; 0 = send-and-wait
+}
+
+cnc_settings = DEFAULT_SETTINGS.copy()
+
+
+def load_settings(path=SETTINGS_FILE, strict=False):
+    """Merge a settings file into cnc_settings. A missing, unreadable or
+    corrupt file leaves the defaults in place — unless strict, when it
+    raises OSError or ValueError instead (a file the user named)."""
+    if not strict and not os.path.exists(path):
+        return
+    try:
+        with open(path, "r") as f:
+            loaded = json.load(f)
+        if not isinstance(loaded, dict):
+            raise ValueError("not a JSON object")
+    except (ValueError, OSError):
+        if strict:
+            raise
+        return  # corrupt/unreadable settings file: fall back to defaults
+    cnc_settings.update(loaded)
+
+
+def save_settings():
+    with open(SETTINGS_FILE, "w") as f:
+        json.dump(cnc_settings, f, indent=2)
+
+
+# ---------------------------------------------------------------------------
+# G-code generation (pure: layout + settings in, lines out)
+# ---------------------------------------------------------------------------
+
+def pass_depths(total, step):
+    """Cutting depths for multi-pass work; the last pass lands exactly on total."""
+    step = max(abs(step), 0.01)
+    n = max(1, math.ceil(abs(total) / step))
+    return [min(abs(total), i * step) for i in range(1, n + 1)]
+
+
+def rect_segments_with_tabs(x0, y0, x1, y1, tab_width):
+    """The rectangle perimeter split into segments, leaving a gap (tab) at the
+    middle of each side."""
+    corners = [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
+    segments = []
+    for (ax, ay), (bx, by) in zip(corners, corners[1:]):
+        length = math.hypot(bx - ax, by - ay)
+        if length <= tab_width * 2:
+            segments.append([(ax, ay), (bx, by)])
+            continue
+        t0 = (length / 2 - tab_width / 2) / length
+        t1 = (length / 2 + tab_width / 2) / length
+        segments.append([(ax, ay), (ax + (bx - ax) * t0, ay + (by - ay) * t0)])
+        segments.append([(ax + (bx - ax) * t1, ay + (by - ay) * t1), (bx, by)])
+    return segments
+
+
+# 2-opt is O(n²) per sweep; beyond this many strokes per group the
+# nearest-neighbour order is kept as it is
+TWO_OPT_MAX_STROKES = 400
+
+
+def _is_ring(points):
+    return len(points) > 3 and tuple(points[0]) == tuple(points[-1])
+
+
+def _ring_from(points, pos):
+    """A closed ring re-started at its vertex nearest pos."""
+    ring = list(points[:-1])
+    d = np.hypot(*(np.asarray(ring, dtype=float) - pos).T)
+    k = int(np.argmin(d))
+    return ring[k:] + ring[:k] + [ring[k]]
+
+
+def rapid_length(strokes, start):
+    """Total XY travel between strokes cut in the given order from start."""
+    total = 0.0
+    x, y = start
+    for points in strokes:
+        total += math.hypot(points[0][0] - x, points[0][1] - y)
+        x, y = points[-1]
+    return total
+
+
+def order_strokes(strokes, start, reverse=True):
+    """Reorder polylines to cut the travel between them.
+
+    Nearest-neighbour from start, then 2-opt over the sequence. Open
+    polylines may be cut backwards when reverse=True (so hatch lines come
+    out boustrophedon); closed rings always start at the vertex nearest the
+    tool. reverse=False keeps each stroke's direction — cutouts stay
+    conventional/climb as generated. Returns the polylines in cut order."""
+    if len(strokes) < 2:
+        return [_ring_from(p, start) if _is_ring(p) else p for p in strokes]
+    n = len(strokes)
+    rings = [_is_ring(p) for p in strokes]
+    flippable = np.array([reverse and not r for r in rings])
+    firsts = np.array([p[0] for p in strokes], dtype=float)
+    lasts = np.array([p[-1] for p in strokes], dtype=float)
+    # Ring entry candidates: every vertex, tagged with its ring
+    ring_ids = [i for i in range(n) if rings[i]]
+    if ring_ids:
+        ring_pts = np.concatenate([np.asarray(strokes[i][:-1], dtype=float) for i in ring_ids])
+        ring_owner = np.repeat(ring_ids, [len(strokes[i]) - 1 for i in ring_ids])
+
+    # Nearest neighbour: entry/exit point pairs for each stroke in order
+    left = np.ones(n, dtype=bool)
+    pos = np.asarray(start, dtype=float)
+    order, flipped = [], []
+    for _ in range(n):
+        d_first = np.where(left, np.hypot(*(firsts - pos).T), np.inf)
+        d_last = np.where(left & flippable, np.hypot(*(lasts - pos).T), np.inf)
+        if ring_ids:
+            d_ring = np.where(left[ring_owner], np.hypot(*(ring_pts - pos).T), np.inf)
+            k = int(np.argmin(d_ring))
+            # a ring's best entry is its nearest vertex, not its first point
+            d_first[ring_owner[k]] = min(d_first[ring_owner[k]], d_ring[k])
+        i_first, i_last = int(np.argmin(d_first)), int(np.argmin(d_last))
+        if d_last[i_last] < d_first[i_first]:
+            i, flip = i_last, True
+        else:
+            i, flip = i_first, False
+        left[i] = False
+        order.append(i)
+        flipped.append(flip)
+        if rings[i]:
+            pos = np.asarray(_ring_from(strokes[i], pos)[0], dtype=float)
+        else:
+            pos = lasts[i] if not flip else firsts[i]
+    paths = []
+    pos = tuple(start)
+    for i, flip in zip(order, flipped):
+        p = strokes[i]
+        p = _ring_from(p, pos) if rings[i] else (p[::-1] if flip else p)
+        paths.append(p)
+        pos = p[-1]
+
+    if n <= TWO_OPT_MAX_STROKES:
+        paths = _two_opt(paths, start, reverse)
+    # Rings start where the tool arrives after the final ordering
+    pos, out = tuple(start), []
+    for p in paths:
+        p = _ring_from(p, pos) if _is_ring(p) else p
+        out.append(p)
+        pos = p[-1]
+    return out
+
+
+# Slack for link moves that run along the edge of the engraved area (hatch
+# lines end exactly on the outline)
+LINK_TOLERANCE = 1e-3
+
+
+def link_moves(strokes, region, max_distance):
+    """Which strokes can be reached from the previous one by feeding straight
+    across at depth instead of retract / rapid / plunge.
+
+    A link is allowed when the gap is at most max_distance and the straight
+    move stays inside region — the area being engraved anyway, so the
+    tool cuts nothing that wasn't going to be cut. region should be
+    prepared (shapely.prepare). Returns one bool per stroke; the first is
+    never linked."""
+    linked = np.zeros(len(strokes), dtype=bool)
+    if len(strokes) < 2 or region is None or max_distance <= 0:
+        return linked.tolist()
+    ends = np.array([p[-1] for p in strokes[:-1]], dtype=float)
+    starts = np.array([p[0] for p in strokes[1:]], dtype=float)
+    near = np.flatnonzero(np.hypot(*(starts - ends).T) <= max_distance)
+    if len(near):
+        moves = shapely.linestrings(np.stack([ends[near], starts[near]], axis=1))
+        linked[near + 1] = shapely.covers(region, moves)
+    return linked.tolist()
+
+
+def _two_opt(paths, start, reverse, max_sweeps=4):
+    """2-opt on an open tour of polylines: reversing a run of strokes also
+    reverses each stroke in it, so only allowed when every stroke in the run
+    may be cut backwards (rings always may)."""
+    paths = list(paths)
+    n = len(paths)
+    can_flip = np.array([reverse or _is_ring(p) for p in paths])
+    entry = np.array([p[0] for p in paths], dtype=float)
+    exit_ = np.array([p[-1] for p in paths], dtype=float)
+    start = np.asarray(start, dtype=float)
+    for _ in range(max_sweeps):
+        improved = False
+        for i in range(n - 1):
+            if not can_flip[i]:
+                continue
+            prev = exit_[i - 1] if i else start
+            # Reversing run i..j: prev->entry[i] and exit[j]->entry[j+1]
+            # become prev->exit[j] and entry[i]->entry[j+1]
+            gain = np.hypot(*(prev - entry[i])) - np.hypot(*(prev - exit_[i + 1:]).T)
+            nxt = entry[i + 2:]
+            gain[:-1] += (np.hypot(*(exit_[i + 1:-1] - nxt).T)
+                          - np.hypot(*(entry[i] - nxt).T))
+            # a run may only flip if nothing in it is direction-locked
+            gain[np.cumprod(can_flip[i + 1:]) == 0] = 0
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-9:
+                j = i + 1 + j
+                paths[i:j + 1] = [p[::-1] for p in reversed(paths[i:j + 1])]
+                entry[i:j + 1], exit_[i:j + 1] = exit_[i:j + 1][::-1].copy(), entry[i:j + 1][::-1].copy()
+                can_flip[i:j + 1] = can_flip[i:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Path simplification — TextPath flattens every curve into many short
+# segments. Douglas–Peucker drops the points a straight move doesn't need;
+# arc fitting replaces runs that follow a circle with one G2/G3 move.
+# ---------------------------------------------------------------------------
+
+ARC_MAX_SWEEP = math.pi  # longer arcs are split: no ambiguous near-full circles
+ARC_MAX_RADIUS = 1000.0  # mm; flatter than this is left to straight moves
+
+
+def simplify_strokes(strokes, tolerance):
+    """Douglas–Peucker simplification of every stroke, in one shapely call:
+    points within tolerance of the line through their neighbours go.
+    Endpoints (so closed rings stay closed) and two-point strokes are kept."""
+    long = [k for k, points in enumerate(strokes) if len(points) > 2]
+    if not long:
+        return strokes
+    coords = np.concatenate([np.asarray(strokes[k], dtype=float) for k in long])
+    index = np.repeat(np.arange(len(long)), [len(strokes[k]) for k in long])
+    lines = shapely.simplify(shapely.linestrings(coords, indices=index), tolerance,
+                             preserve_topology=False)
+    coords, index = shapely.get_coordinates(lines, return_index=True)
+    parts = np.split(coords, np.flatnonzero(np.diff(index)) + 1)
+    out = list(strokes)
+    for k, part in zip(long, parts):
+        out[k] = [tuple(pt) for pt in part.tolist()]
+    return out
+
+
+def _circle_centre(p0, p1, p2):
+    (ax, ay), (bx, by), (cx, cy) = p0, p1, p2
+    d = 2.0 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if abs(d) < 1e-12:
+        return None
+    a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+    return ((a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d,
+            (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d)
+
+
+def fit_arcs(points, tolerance):
+    """The moves after points[0] that trace the polyline, with runs of three
+    or more points that lie on a circle (every point and every chord
+    midpoint within tolerance of it; no change of turning direction; at
+    most ARC_MAX_SWEEP) merged into arcs. Greedy: each arc is grown as far as it
+    still fits.
+
+    Returns [(x, y, arc)], arc None for a straight move or (cx, cy,
+    clockwise) for an arc about (cx, cy)."""
+    pts = np.asarray(points, dtype=float)
+    n = len(pts)
+    seg = np.diff(pts, axis=0)
+    half = np.hypot(seg[:, 0], seg[:, 1]) / 2.0
+    # Turn at each interior point: > 0 left (CCW), < 0 right (CW)
+    turn = seg[:-1, 0] * seg[1:, 1] - seg[:-1, 1] * seg[1:, 0]
+    out = []
+    i = 0
+    while i < n - 1:
+        best = None
+        for j in range(i + 2, n):
+            turns = turn[i:j - 1]
+            if not ((turns > 0).all() or (turns < 0).all()):
+                break
+            centre = _circle_centre(pts[i], pts[(i + j) // 2], pts[j])
+            if centre is None:
+                break
+            cx, cy = centre
+            window = pts[i:j + 1]
+            dist = np.hypot(window[:, 0] - cx, window[:, 1] - cy)
+            r = dist[0]
+            if r > ARC_MAX_RADIUS or np.abs(dist - r).max() > tolerance:
+                break
+            mid = (window[:-1] + window[1:]) / 2.0
+            if np.abs(np.hypot(mid[:, 0] - cx, mid[:, 1] - cy) - r).max() > tolerance:
+                break  # the arc bulges away from a chord
+            if 2.0 * np.arcsin(np.minimum(half[i:j], r) / r).sum() > ARC_MAX_SWEEP:
+                break
+            best = (j, (float(cx), float(cy), bool(turns[0] < 0)))
+        if best is None:
+            i += 1
+            out.append((pts[i, 0], pts[i, 1], None))
+        else:
+            i, arc = best
+            out.append((pts[i, 0], pts[i, 1], arc))
+    return [(float(x), float(y), arc) for x, y, arc in out]
+
+
+ARC_ANGULAR_EPSILON = 5e-7  # as GRBL: an arc ending where it starts is a full circle
+
+
+def arc_points(x0, y0, x1, y1, cx, cy, clockwise, tolerance):
+    """Points along a G2/G3 arc from (x0, y0) to (x1, y1) about (cx, cy),
+    excluding the start: the chords GRBL's mc_arc would cut it into, none
+    further than tolerance from the true arc."""
+    rx, ry = x0 - cx, y0 - cy
+    tx, ty = x1 - cx, y1 - cy
+    sweep = math.atan2(rx * ty - ry * tx, rx * tx + ry * ty)
+    if clockwise and sweep >= -ARC_ANGULAR_EPSILON:
+        sweep -= 2 * math.pi
+    elif not clockwise and sweep <= ARC_ANGULAR_EPSILON:
+        sweep += 2 * math.pi
+    r = math.hypot(rx, ry)
+    n = 1
+    if r > tolerance:
+        n = max(1, int(abs(0.5 * sweep * r) / math.sqrt(tolerance * (2 * r - tolerance))))
+    a = math.atan2(ry, rx) + sweep * np.arange(1, n) / n
+    return list(zip((cx + r * np.cos(a)).tolist(), (cy + r * np.sin(a)).tolist())) \
+        + [(x1, y1)]
+
+
+# ---------------------------------------------------------------------------
+# Toolpath IR — typed moves between the layout and the G-code text. The
+# generator fills a Toolpath; G-code is rendered from it only at the end, and
+# the preview reads it directly instead of re-parsing the text.
+# ---------------------------------------------------------------------------
+
+MOVE_RAPID, MOVE_PLUNGE, MOVE_FEED, MOVE_RETRACT, MOVE_ARC_CW, MOVE_ARC_CCW = range(6)
+MOVE_NAMES = ("rapid", "plunge", "feed", "retract", "arc_cw", "arc_ccw")
+CUTTING_MOVES = (MOVE_FEED, MOVE_ARC_CW, MOVE_ARC_CCW)  # run at the feed rate
+
+# What a move cuts: engraving or cutout (rapid only in XY segment lists —
+# see toolpath_segments / simulate_gcode and their structured array form)
+SEGMENT_KINDS = ("rapid", "engrave", "cutout")
+KIND_CODES = {kind: code for code, kind in enumerate(SEGMENT_KINDS)}
+SEGMENT_DTYPE = np.dtype([
+    ("x0", "f8"), ("y0", "f8"), ("x1", "f8"), ("y1", "f8"), ("kind", "u1"), ("z", "f8"),
+])
+
+
+class Toolpath:
+    """Array-backed list of typed moves, one row per move:
+
+      op     MOVE_RAPID (G0 XY) / MOVE_PLUNGE (G1 Z) / MOVE_FEED (G1 XY) /
+             MOVE_RETRACT (G0 Z) / MOVE_ARC_CW (G2) / MOVE_ARC_CCW (G3)
+      x y z  tool position after the move, machine coordinates
+      cx cy  arc centre (arcs only, else 0)
+      label  index into .labels of the label the move belongs to
+      kind   KIND_CODES["engrave"] or KIND_CODES["cutout"]
+      depth  cut depth of the pass (mm, positive)
+
+    Columns are array.array, so they stay compact and columns() views them
+    as NumPy arrays without copying. sections holds (first move, label,
+    kind) for every "(Label: …)" / "(Cutout for label: …)" block, empty
+    ones included.
+    """
+
+    def __init__(self, start=(0.0, 0.0, 0.0)):
+        self.op = array("b")
+        self.x, self.y, self.z = array("d"), array("d"), array("d")
+        self.label, self.kind = array("i"), array("b")
+        self.depth = array("d")
+        self.cx, self.cy = array("d"), array("d")
+        self.labels = []
+        self.sections = []
+        self.start = start
+        self.pos = start
+        self._section = (-1, KIND_CODES["engrave"], 0.0)
+
+    def __len__(self):
+        return len(self.op)
+
+    def begin(self, label, kind):
+        """Start a label's engraving or cutout block; returns the label index."""
+        if kind == KIND_CODES["engrave"] or not self.labels:
+            self.labels.append(label)  # each label is engraved, then cut out
+        index = len(self.labels) - 1
+        self.sections.append((len(self.op), index, kind))
+        self._section = (index, kind, 0.0)
+        return index
+
+    def set_depth(self, depth):
+        index, kind, _ = self._section
+        self._section = (index, kind, depth)
+
+    def move(self, op, x=None, y=None, z=None, cx=0.0, cy=0.0):
+        px, py, pz = self.pos
+        self.pos = (px if x is None else x, py if y is None else y, pz if z is None else z)
+        index, kind, depth = self._section
+        self.op.append(op)
+        self.x.append(self.pos[0])
+        self.y.append(self.pos[1])
+        self.z.append(self.pos[2])
+        self.label.append(index)
+        self.kind.append(kind)
+        self.depth.append(depth)
+        self.cx.append(cx)
+        self.cy.append(cy)
+
+    def extend(self, other):
+        """Append another Toolpath's moves (one that starts where this ends)."""
+        base, label_base = len(self.op), len(self.labels)
+        for name in ("op", "x", "y", "z", "kind", "depth", "cx", "cy"):
+            getattr(self, name).extend(getattr(other, name))
+        self.label.frombytes(
+            (other.columns()["label"] + label_base).astype(np.int32).tobytes()
+        )
+        self.labels.extend(other.labels)
+        self.sections.extend((i + base, label + label_base, kind)
+                             for i, label, kind in other.sections)
+        self.pos = other.pos
+
+    def columns(self):
+        """The move columns as NumPy arrays (views, not copies)."""
+        return {name: np.frombuffer(getattr(self, name), dtype=dtype) for name, dtype in (
+            ("op", np.int8), ("x", np.float64), ("y", np.float64), ("z", np.float64),
+            ("label", np.int32), ("kind", np.int8), ("depth", np.float64),
+            ("cx", np.float64), ("cy", np.float64),
+        )}
+
+
+def build_toolpath(layout, settings, fill_text, progress=None):
+    """Toolpath for a layout produced by build_layout().
+
+    Canvas Y (down) is converted to machine Y (up) here, in one place:
+    machine_y = material_height - canvas_y. Nothing is mirrored — TextPath
+    geometry is already Y-up, same as the machine. progress(done, total) is
+    called before each label, as in build_layout.
+    """
+    laser = settings["tool_mode"] == "Laser"
+    # Spindle jobs start at Safe Z (the program's first move); laser has no Z
+    tp = Toolpath(start=(0.0, 0.0, 0.0 if laser else settings["safe_z"]))
+    for part in iter_toolpaths(layout, settings, fill_text, progress):
+        tp.extend(part)
+    return tp
+
+
+def iter_toolpaths(layout, settings, fill_text, progress=None):
+    """build_toolpath one label at a time: yields each label's Toolpath
+    (engraving, then cutout), each starting where the last one ended."""
+    H = settings["material_height"]
+    laser = settings["tool_mode"] == "Laser"
+    safe_z = settings["safe_z"]
+    tp = Toolpath(start=(0.0, 0.0, 0.0 if laser else safe_z))
+
+    # Work-origin offset: shifts the whole job away from machine home
+    ox, oy = settings["offset_x"], settings["offset_y"]
+
+    # Strokes within each pass are reordered to cut rapid travel (labels and
+    # passes keep their order: a label is engraved, then cut out). Ordering
+    # starts from the job origin so it doesn't depend on the work offset.
+    optimize = settings.get("optimize_travel", True)
+    link_distance = settings.get("link_distance", 0.0)
+    simplify = settings.get("simplify_tolerance", 0.0)
+    arc_tolerance = settings.get("arc_tolerance", 0.0)
+    pos = (0.0, 0.0)
+    travel = [0.0, 0.0]  # rapid distance as generated, as cut
+    links = 0
+    # Cutting moves (and their G-code bytes) before / after simplification
+    fitted = {"moves": [0, 0], "bytes": [0, 0]}
+
+    def move_bytes(points):
+        return sum(len(f"G1 X{px + ox:.3f} Y{py + oy:.3f}\n") for px, py in points)
+
+    def cut(strokes, depth, reverse=True, region=None):
+        nonlocal pos, links
+        if not strokes:
+            return
+        if simplify > 0 or arc_tolerance > 0:
+            fitted["moves"][0] += sum(len(points) - 1 for points in strokes)
+            fitted["bytes"][0] += sum(move_bytes(points[1:]) for points in strokes)
+        if simplify > 0:
+            strokes = simplify_strokes(strokes, simplify)
+        ordered = order_strokes(strokes, pos, reverse) if optimize else strokes
+        travel[0] += rapid_length(strokes, pos)
+        travel[1] += rapid_length(ordered, pos)
+        linked = link_moves(ordered, region, link_distance) + [False]
+        links += sum(linked)
+        tp.set_depth(depth)
+        for k, points in enumerate(ordered):
+            polyline(points, depth, linked[k], linked[k + 1])
+        pos = tuple(ordered[-1][-1])
+
+    def polyline(points, depth, link_in=False, link_out=False):
+        sx, sy = points[0]
+        if link_in:
+            # Still at depth from the previous stroke: feed straight across
+            tp.move(MOVE_FEED, sx + ox, sy + oy)
+        else:
+            tp.move(MOVE_RAPID, sx + ox, sy + oy)
+            if not laser:
+                tp.move(MOVE_PLUNGE, z=-depth)
+        if arc_tolerance > 0 and len(points) > 2:
+            px, py = sx, sy
+            for qx, qy, arc in fit_arcs(points, arc_tolerance):
+                if arc is None:
+                    tp.move(MOVE_FEED, qx + ox, qy + oy)
+                    fitted["bytes"][1] += len(f"G1 X{qx + ox:.3f} Y{qy + oy:.3f}\n")
+                else:
+                    cx, cy, clockwise = arc
+                    tp.move(MOVE_ARC_CW if clockwise else MOVE_ARC_CCW, qx + ox, qy + oy,
+                            cx=cx + ox, cy=cy + oy)
+                    fitted["bytes"][1] += len(f"G2 X{qx + ox:.3f} Y{qy + oy:.3f} "
+                                              f"I{cx - px:.3f} J{cy - py:.3f}\n")
+                fitted["moves"][1] += 1
+                px, py = qx, qy
+        else:
+            for px, py in points[1:]:
+                tp.move(MOVE_FEED, px + ox, py + oy)
+            if simplify > 0 or arc_tolerance > 0:
+                fitted["moves"][1] += len(points) - 1
+                fitted["bytes"][1] += move_bytes(points[1:])
+        if not laser and not link_out:
+            tp.move(MOVE_RETRACT, z=safe_z)
+
+    for n, item in enumerate(layout):
+        if progress:
+            progress(n, len(layout))
+        if n:
+            tp = Toolpath(start=tp.pos)
+        x, y_top, height = item["x"], item["y_top"], item["height"]
+        # geom origin (text bbox bottom-left) in machine coordinates
+        geom = shapely.affinity.translate(
+            item["geom"], xoff=x, yoff=H - (y_top + height)
+        )
+
+        # A stroke font is cut once along each centreline, filled or not
+        centrelines = [[tuple(pt) for pt in line] for line in geom_lines(geom)]
+
+        # Filled text is engraved edge to edge, so the spindle may stay down
+        # between hatch lines as long as it crosses only the text itself.
+        # Outlines (and laser, which has no Z to save) always lift.
+        region = None
+        if fill_text and not centrelines and not laser and link_distance > 0:
+            region = geom.buffer(LINK_TOLERANCE)
+            shapely.prepare(region)
+
+        tp.begin(item["label"], KIND_CODES["engrave"])
+        for depth in pass_depths(settings["text_cut_depth"], settings["pass_depth"]):
+            if centrelines:
+                strokes = centrelines
+            elif fill_text:
+                strokes = [[start, end] for start, end in
+                           hatch_fill(geom, settings["tool_diameter"] * 0.8)]
+            else:
+                strokes = [[tuple(pt) for pt in ring] for ring in geom_rings(geom)]
+            cut(strokes, depth, region=region)
+
+        # Cutout rectangle in machine coordinates, with the toolpath offset
+        # outward by half the tool/kerf width so the finished label comes out
+        # at the drawn size (the drawn rectangle is the label edge, not the
+        # tool centre).
+        r = kerf_radius(settings)
+        cx0, cy0, cx1, cy1 = item["cutout"]
+        mx0, my0 = cx0 - r, H - cy1 - r
+        mx1, my1 = cx1 + r, H - cy0 + r
+        tp.begin(item["label"], KIND_CODES["cutout"])
+        total = settings["label_cutout_depth"]
+        tab_h, tab_w = settings["tab_height"], settings["tab_width"]
+        for depth in pass_depths(total, settings["pass_depth"]):
+            # On the passes below tab height, leave gaps so the label stays
+            # attached until snapped out (spindle only — tabs don't apply to laser).
+            if not laser and tab_h > 0 and tab_w > 0 and depth > total - tab_h:
+                cut(rect_segments_with_tabs(mx0, my0, mx1, my1, tab_w), depth,
+                    reverse=False)
+            else:
+                cut([[(mx0, my0), (mx1, my0), (mx1, my1), (mx0, my1), (mx0, my0)]],
+                    depth, reverse=False)
+        yield tp
+
+    if optimize:
+        app_log(f"Travel optimisation: rapids {travel[0]:.0f} mm -> {travel[1]:.0f} mm")
+    if links:
+        app_log(f"Link moves: {links} retracts skipped (tool stays at depth)")
+    if simplify > 0 or arc_tolerance > 0:
+        (moves, fewer), (size, smaller) = fitted["moves"], fitted["bytes"]
+        app_log(f"Simplify/arc fit: {moves} -> {fewer} cutting moves "
+                f"(-{100 * (moves - fewer) / max(moves, 1):.0f}%), "
+                f"{size / 1024:.0f} KB -> {smaller / 1024:.0f} KB of cut G-code")
+
+
+def render_gcode(toolpath, settings):
+    """G-code text for a Toolpath: program header, one line per move, the
+    label / cutout block comments, and the program end.
+
+    F is modal: plunges carry the plunge rate, and a feed (G1 XY, G2, G3)
+    carries the feed rate only when the move before it wasn't one."""
+    return list(iter_gcode(toolpath, settings))
+
+
+def iter_gcode(toolpath, settings):
+    """render_gcode as a generator: lines are formatted as they're consumed."""
+    return _gcode_program(settings, [toolpath])
+
+
+def sendable_line_count(toolpath, settings):
+    """How many lines iter_gcode(toolpath, settings) sends once comments are
+    stripped (see machine.iter_sendable_lines) — one per move, plus the
+    program's header and footer — without rendering any of it."""
+    return len(_program_header(settings)) + len(toolpath) + len(PROGRAM_FOOTER)
+
+
+def iter_gcode_lines(layout, settings, fill_text, progress=None):
+    """generate_gcode_lines as a generator. Each label's toolpath is built,
+    rendered and dropped before the next, so memory stays flat however big
+    the job — pair it with write_gcode or stream_gcode."""
+    return _gcode_program(settings, iter_toolpaths(layout, settings, fill_text, progress))
+
+
+def generate_gcode_lines(layout, settings, fill_text, progress=None):
+    """G-code for a layout produced by build_layout(), as a list of lines."""
+    return list(iter_gcode_lines(layout, settings, fill_text, progress))
+
+
+PROGRAM_FOOTER = ("M5 ; stop spindle/laser", "M2 ; end program")
+
+
+def _program_header(settings):
+    if settings["tool_mode"] == "Laser":
+        # GRBL dynamic laser mode: power only applies during G1 moves, so
+        # travels (G0) don't burn. No Z motion needed.
+        start = [f"M4 S{settings['laser_power']:.0f} ; laser on (dynamic power)"]
+    else:
+        start = [f"G0 Z{settings['safe_z']:.3f}",
+                 f"M3 S{settings['spindle_rpm']:.0f} ; spindle on",
+                 f"G4 P{SPINDLE_SPINUP_S} ; wait for spindle to reach speed"]
+    return ["G21 ; units: mm", "G90 ; absolute positioning"] + start
+
+
+def _gcode_program(settings, toolpaths):
+    yield from _program_header(settings)
+
+    f_feed = f" F{settings['feed_rate']:.0f}"
+    f_plunge = f" F{settings['plunge_rate']:.0f}"
+    cutout = KIND_CODES["cutout"]
+    prev = None
+    px = py = None
+    for tp in toolpaths:
+        sections = tp.sections + [(len(tp), None, None)]
+        s = 0
+        if px is None:
+            px, py = tp.start[0], tp.start[1]
+        for i, (op, x, y, z) in enumerate(zip(tp.op, tp.x, tp.y, tp.z)):
+            while sections[s][0] == i:
+                _, index, kind = sections[s]
+                label = tp.labels[index]
+                yield f"(Cutout for label: {label})" if kind == cutout else f"(Label: {label})"
+                s += 1
+            if op == MOVE_FEED:
+                yield f"G1 X{x:.3f} Y{y:.3f}{'' if prev in CUTTING_MOVES else f_feed}"
+            elif op == MOVE_RAPID:
+                yield f"G0 X{x:.3f} Y{y:.3f}"
+            elif op == MOVE_PLUNGE:
+                yield f"G1 Z{z:.3f}{f_plunge}"
+            elif op == MOVE_RETRACT:
+                yield f"G0 Z{z:.3f}"
+            else:
+                # I/J: arc centre relative to the start of the move
+                yield (f"G{2 if op == MOVE_ARC_CW else 3} X{x:.3f} Y{y:.3f} "
+                       f"I{tp.cx[i] - px:.3f} J{tp.cy[i] - py:.3f}"
+                       f"{'' if prev in CUTTING_MOVES else f_feed}")
+            prev = op
+            px, py = x, y
+        for _, index, kind in sections[s:-1]:
+            label = tp.labels[index]
+            yield f"(Cutout for label: {label})" if kind == cutout else f"(Label: {label})"
+
+    yield from PROGRAM_FOOTER
+
+
+WRITE_CHUNK_LINES = 4096
+
+
+def write_gcode(dest, lines):
+    """Write G-code lines to a path or an open text file, WRITE_CHUNK_LINES
+    at a time, without ever holding the whole program. Same bytes as
+    "\n".join(lines). Returns the number of lines written."""
+    if isinstance(dest, (str, os.PathLike)):
+        with open(dest, "w") as f:
+            return write_gcode(f, lines)
+    count = 0
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == WRITE_CHUNK_LINES:
+            dest.write(("\n" if count else "") + "\n".join(chunk))
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        dest.write(("\n" if count else "") + "\n".join(chunk))
+        count += len(chunk)
+    return count
+
+
+ARC_PREVIEW_TOLERANCE = 0.01  # mm: chord error of arcs drawn in the preview
+
+
+def flat_columns(toolpath, tolerance):
+    """toolpath.columns() with every arc replaced by its chords (see
+    arc_points), as MOVE_FEED rows of the same label, kind and depth."""
+    col = toolpath.columns()
+    arcs = np.flatnonzero(col["op"] >= MOVE_ARC_CW).tolist()
+    if not arcs:
+        return col
+    x = np.concatenate(([toolpath.start[0]], col["x"])).tolist()
+    y = np.concatenate(([toolpath.start[1]], col["y"])).tolist()
+    pieces = {name: [] for name in col}
+    last = 0
+    for i in arcs:
+        points = arc_points(x[i], y[i], x[i + 1], y[i + 1], float(col["cx"][i]),
+                            float(col["cy"][i]), col["op"][i] == MOVE_ARC_CW, tolerance)
+        for name, values in col.items():
+            pieces[name].append(values[last:i])
+            pieces[name].append(np.repeat(values[i:i + 1], len(points)))
+        pieces["x"][-1], pieces["y"][-1] = (np.array(c) for c in zip(*points))
+        pieces["op"][-1] = np.full(len(points), MOVE_FEED, dtype=np.int8)
+        last = i + 1
+    return {name: np.concatenate(parts + [col[name][last:]])
+            for name, parts in pieces.items()}
+
+
+def toolpath_segments(toolpath, as_array=False, tolerance=ARC_PREVIEW_TOLERANCE):
+    """The XY moves of a Toolpath in simulate_gcode()'s form — (x0, y0, x1,
+    y1, kind, z), kind 'rapid' for G0 moves — read straight from the IR
+    instead of parsing rendered text. Arcs come out as chords within
+    tolerance."""
+    col = flat_columns(toolpath, tolerance)
+    x = np.concatenate(([toolpath.start[0]], col["x"]))
+    y = np.concatenate(([toolpath.start[1]], col["y"]))
+    moved = (x[1:] != x[:-1]) | (y[1:] != y[:-1])
+    seg = np.empty(int(moved.sum()), dtype=SEGMENT_DTYPE)
+    seg["x0"], seg["y0"] = x[:-1][moved], y[:-1][moved]
+    seg["x1"], seg["y1"] = x[1:][moved], y[1:][moved]
+    seg["kind"] = np.where(col["op"][moved] == MOVE_RAPID, KIND_CODES["rapid"],
+                           col["kind"][moved])
+    seg["z"] = col["z"][moved]
+    if as_array:
+        return seg
+    return [(x0, y0, x1, y1, SEGMENT_KINDS[k], z) for x0, y0, x1, y1, k, z in seg.tolist()]
+
+
+# G-code tokenizer: a line is parsed once into (letter, value) words, with
+# comments — "(...)" and "; ..." — stripped first
+_GCODE_COMMENT_RE = re.compile(r"\([^)]*\)|;.*")
+_GCODE_WORD_RE = re.compile(r"([A-Za-z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+
+def gcode_words(line):
+    """"G1 X2 Y-3.5 F300 ; cut" -> [("G", 1.0), ("X", 2.0), ("Y", -3.5), ("F", 300.0)]"""
+    if "(" in line or ";" in line:
+        line = _GCODE_COMMENT_RE.sub(" ", line)
+    try:
+        # Fast path: space-separated words, as this generator writes them
+        return [(word[0].upper(), float(word[1:])) for word in line.split()]
+    except ValueError:
+        # "G1X2Y3", "X 2", ...: let the regex split the words
+        return [(letter.upper(), float(value))
+                for letter, value in _GCODE_WORD_RE.findall(line)]
+
+
+def simulate_gcode(lines, as_array=False):
+    """Replay generated G-code into XY segments for the toolpath preview.
+
+    Returns a list of (x0, y0, x1, y1, kind, z) in machine coordinates, where
+    kind is 'rapid', 'engrave' or 'cutout' (from the block comments the
+    generator emits) and z is the modal Z of the move (0 in laser mode).
+    Simulating the real G-code means the preview shows exactly what the
+    machine will receive — including passes, tabs and kerf offsets.
+
+    as_array=True returns the same segments as a NumPy structured array
+    (SEGMENT_DTYPE) with kind as a KIND_CODES number, for callers that work
+    on whole columns at once. G2/G3 arcs (I/J form) come out as chords
+    within ARC_PREVIEW_TOLERANCE.
+    """
+    rapid, engrave, cutout = (KIND_CODES[k] for k in SEGMENT_KINDS)
+    motion = {"G0": rapid, "G00": rapid, "G1": None, "G01": None,
+              "G2": None, "G02": None, "G3": None, "G03": None}
+    clockwise = {"G2": True, "G02": True, "G3": False, "G03": False}
+    segments = []
+    append = segments.append
+    x = y = z = 0.0
+    kind = engrave
+    for line in lines:
+        if not line.startswith("G"):
+            if line.startswith("(Label:"):
+                kind = engrave
+            elif line.startswith("(Cutout"):
+                kind = cutout
+            continue
+        # Fast path for the generator's own "G1 X.. Y.. F.." lines; anything
+        # else (comments, "G1X2Y3", "X 2") goes through gcode_words()
+        words = line.split()
+        move = motion.get(words[0], False)
+        arc = clockwise.get(words[0])
+        nx, ny, nz = x, y, z
+        i = j = 0.0
+        try:
+            if move is False or ";" in line or "(" in line:
+                raise ValueError
+            for word in words[1:]:
+                letter = word[0]
+                if letter == "X":
+                    nx = float(word[1:])
+                elif letter == "Y":
+                    ny = float(word[1:])
+                elif letter == "Z":
+                    nz = float(word[1:])
+                elif letter == "I":
+                    i = float(word[1:])
+                elif letter == "J":
+                    j = float(word[1:])
+        except ValueError:
+            parsed = gcode_words(line)
+            if not parsed or parsed[0][0] != "G" or parsed[0][1] not in (0, 1, 2, 3):
+                continue
+            move = rapid if parsed[0][1] == 0.0 else None
+            arc = {2.0: True, 3.0: False}.get(parsed[0][1])
+            nx, ny, nz = x, y, z
+            i = j = 0.0
+            for letter, value in parsed[1:]:
+                if letter == "X":
+                    nx = value
+                elif letter == "Y":
+                    ny = value
+                elif letter == "Z":
+                    nz = value
+                elif letter == "I":
+                    i = value
+                elif letter == "J":
+                    j = value
+        if arc is not None:
+            px, py = x, y
+            for qx, qy in arc_points(x, y, nx, ny, x + i, y + j, arc,
+                                     ARC_PREVIEW_TOLERANCE):
+                append((px, py, qx, qy, kind, nz))
+                px, py = qx, qy
+        elif nx != x or ny != y:
+            append((x, y, nx, ny, kind if move is None else move, nz))
+        x, y, z = nx, ny, nz
+    if as_array:
+        return np.array(segments, dtype=SEGMENT_DTYPE)
+    return [(x0, y0, x1, y1, SEGMENT_KINDS[k], sz) for x0, y0, x1, y1, k, sz in segments]
+
+
+def toolpath_runs(segments):
+    """Join simulate_gcode() segments into polylines for drawing: a run
+    continues while the moves stay the same kind, at the same Z, and each
+    starts where the last ended. Takes either form of segments.
+    Yields (kind, z, [x0, y0, x1, y1, ...])."""
+    if isinstance(segments, np.ndarray):
+        segments = [(x0, y0, x1, y1, SEGMENT_KINDS[k], z)
+                    for x0, y0, x1, y1, k, z in segments.tolist()]
+    run = None
+    for x0, y0, x1, y1, kind, z in segments:
+        if run is not None and run[0] == kind and run[1] == z \
+                and run[2][-2] == x0 and run[2][-1] == y0:
+            run[2].extend((x1, y1))
+            continue
+        if run is not None:
+            yield run
+        run = (kind, z, [x0, y0, x1, y1])
+    if run is not None:
+        yield run
+
+
+# ---------------------------------------------------------------------------
+# Run-time estimate — replays a Toolpath through a model of GRBL's planner:
+# trapezoidal acceleration per move, junction speeds from the junction
+# deviation ($11), axis limits from $110-$112 / $120-$122.
+# ---------------------------------------------------------------------------
+
+# GRBL 1.1's defaults, for any setting not yet read from the machine
+GRBL_MOTION_DEFAULTS = {
+    11: 0.010, 12: 0.002,
+    110: 500.0, 111: 500.0, 112: 500.0,
+    120: 10.0, 121: 10.0, 122: 10.0,
+}
+SPINDLE_SPINUP_S = 2  # the G4 dwell after M3
+ESTIMATE_PARTS = ("rapid", "cut", "plunge", "dwell")
+
+
+def grbl_motion(settings):
+    """{setting: float} for $11, $12 and $110-$122: the machine's own values where
+    settings["grbl_motion"] has them (saved when $$ is read), GRBL's defaults
+    otherwise. Keys may be ints or, after a JSON round trip, strings."""
+    motion = dict(GRBL_MOTION_DEFAULTS)
+    for key, value in settings.get("grbl_motion", {}).items():
+        if int(key) in motion:
+            motion[int(key)] = float(value)
+    return motion
+
+
+def _axis_limit(unit, limits):
+    """GRBL's limit_value_by_axis_maximum: the largest rate/acceleration
+    along each unit vector that keeps every axis within its own limit."""
+    comp = np.abs(unit)
+    with np.errstate(divide="ignore"):
+        return np.where(comp > 0, limits / comp, np.inf).min(axis=1)
+
+
+def estimate_time(toolpath, settings, motion=None):
+    """Predicted run time of a Toolpath on the machine, in seconds.
+
+    Rapids run at the axes' max rates, plunges and cuts at the programmed
+    F (capped the same way); every move accelerates and decelerates at
+    the axes' acceleration. As in GRBL, the tool only slows at a corner as
+    far as the junction deviation demands, and starts and ends the
+    program at rest. Returns
+
+      {"total": s,
+       "time": {"rapid": s, "cut": s, "plunge": s, "dwell": s},
+       "distance": {"rapid": mm, "cut": mm, "plunge": mm},
+       "labels": [s for each of toolpath.labels]}
+
+    Retracts count as rapids, arcs (split into chords per $12) as cuts;
+    dwell is the spindle spin-up.
+    """
+    motion = motion or grbl_motion(settings)
+    col = flat_columns(toolpath, motion[12])  # GRBL cuts arcs into chords too
+    start = np.array(toolpath.start, dtype=float)[:, None]
+    pos = np.vstack((col["x"], col["y"], col["z"]))
+    delta = np.diff(np.hstack((start, pos)), axis=1).T
+    length = np.sqrt((delta * delta).sum(axis=1))
+    moving = length > 1e-9  # GRBL drops zero-length blocks
+    delta, length = delta[moving], length[moving]
+    op, label = col["op"][moving], col["label"][moving]
+    unit = delta / length[:, None]
+
+    # Nominal speed and acceleration of each move, mm/s and mm/s²
+    max_rate = np.array([motion[110], motion[111], motion[112]]) / 60.0
+    max_accel = np.array([motion[120], motion[121], motion[122]])
+    feed = np.full(len(op), np.inf)
+    feed[op == MOVE_FEED] = settings["feed_rate"] / 60.0
+    feed[op == MOVE_PLUNGE] = settings["plunge_rate"] / 60.0
+    nominal = np.minimum(feed, _axis_limit(unit, max_rate))
+    accel = _axis_limit(unit, max_accel)
+
+    # Max entry speed² of each move from its junction with the one before
+    junction = np.zeros(len(op))
+    if len(op) > 1:
+        prev, cur = unit[:-1], unit[1:]
+        cos_theta = -(prev * cur).sum(axis=1)
+        turn = cur - prev
+        norm = np.sqrt((turn * turn).sum(axis=1))
+        turn /= np.where(norm > 0, norm, 1.0)[:, None]
+        sin_half = np.sqrt(np.clip(0.5 * (1.0 - cos_theta), 0.0, 1.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            v2 = _axis_limit(turn, max_accel) * motion[11] * sin_half / (1.0 - sin_half)
+        v2[cos_theta < -0.999999] = np.inf  # straight on: no slowdown
+        v2[cos_theta > 0.999999] = 0.0  # full reversal: stop
+        junction[1:] = np.minimum(v2, np.minimum(nominal[:-1], nominal[1:]) ** 2)
+
+    # Backward then forward pass: entry speeds reachable from the next
+    # move's entry / the previous move's entry within each move's length
+    reach = 2.0 * accel * length
+    entry, gain = junction.tolist() + [0.0], reach.tolist()
+    for i in range(len(gain) - 1, -1, -1):
+        entry[i] = min(entry[i], entry[i + 1] + gain[i])
+    for i in range(len(gain)):
+        entry[i + 1] = min(entry[i + 1], entry[i] + gain[i])
+
+    # Trapezoid (or triangle) per move: peak speed, then time
+    v0_2, v1_2 = np.array(entry[:-1]), np.array(entry[1:])
+    peak_2 = np.minimum(nominal ** 2, (reach + v0_2 + v1_2) / 2.0)
+    peak = np.sqrt(peak_2)
+    cruise = np.clip(length - (2.0 * peak_2 - v0_2 - v1_2) / (2.0 * accel), 0.0, None)
+    seconds = (2.0 * peak - np.sqrt(v0_2) - np.sqrt(v1_2)) / accel + cruise / peak
+
+    rapid = (op == MOVE_RAPID) | (op == MOVE_RETRACT)
+    parts = {"rapid": rapid, "cut": op == MOVE_FEED, "plunge": op == MOVE_PLUNGE}
+    time = {part: float(seconds[mask].sum()) for part, mask in parts.items()}
+    time["dwell"] = 0.0 if settings["tool_mode"] == "Laser" else float(SPINDLE_SPINUP_S)
+    owned = label >= 0
+    labels = np.bincount(label[owned], weights=seconds[owned],
+                         minlength=len(toolpath.labels))
+    return {
+        "total": sum(time.values()),
+        "time": time,
+        "distance": {part: float(length[mask].sum()) for part, mask in parts.items()},
+        "labels": labels.tolist(),
+    }
+
+
+def sum_estimates(estimates):
+    """Several estimate_time() results (e.g. one per sheet) as one job."""
+    total = {"total": 0.0, "time": dict.fromkeys(ESTIMATE_PARTS, 0.0),
+             "distance": dict.fromkeys(ESTIMATE_PARTS[:3], 0.0), "labels": []}
+    for est in estimates:
+        total["total"] += est["total"]
+        for part, value in est["time"].items():
+            total["time"][part] += value
+        for part, value in est["distance"].items():
+            total["distance"][part] += value
+        total["labels"].extend(est["labels"])
+    return total
+
+
+def format_duration(seconds):
+    """1h 02m / 4m 05s / 12s"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def describe_estimate(est):
+    """One-line summary, e.g. "~12m 04s (rapids 1m 10s, cuts 9m 30s,
+    plunges 1m 22s)"."""
+    t = est["time"]
+    return (f"~{format_duration(est['total'])} (rapids {format_duration(t['rapid'])}, "
+            f"cuts {format_duration(t['cut'])}, plunges {format_duration(t['plunge'])})")
+
+
+def generate_dry_run_lines(layout, settings):
+    """Trace the job's outer boundary with the tool completely OFF.
+
+    No M3/M4 is ever emitted — a dry run must not fire a spindle or laser.
+    Spindle mode additionally lifts to Safe Z first; laser mode stays put in
+    Z as usual. Watch the machine trace the outline to check placement and
+    clamp clearance."""
+    if not layout:
+        return []
+    H = settings["material_height"]
+    laser = settings["tool_mode"] == "Laser"
+    r = kerf_radius(settings)
+    ox, oy = settings["offset_x"], settings["offset_y"]
+
+    # Outer bounds of all cutout toolpaths (kerf offset included), machine coords
+    x0 = min(i["cutout"][0] for i in layout) - r + ox
+    x1 = max(i["cutout"][2] for i in layout) + r + ox
+    y0 = H - max(i["cutout"][3] for i in layout) - r + oy
+    y1 = H - min(i["cutout"][1] for i in layout) + r + oy
+    app_log(f"Dry run boundary: X{x0:.1f}..{x1:.1f} Y{y0:.1f}..{y1:.1f} (work coords)")
+
+    g = [
+        "G21 ; units: mm",
+        "G90 ; absolute positioning",
+        "(Dry run: job boundary trace only - no cutting, no tool power)",
+        "M5 ; make sure spindle/laser is off",
+    ]
+    if not laser:
+        g.append(f"G0 Z{settings['safe_z']:.3f} ; stay at safe height")
+    g.append(f"G0 X{x0:.3f} Y{y0:.3f}")
+    for px, py in [(x1, y0), (x1, y1), (x0, y1), (x0, y0)]:
+        g.append(f"G1 X{px:.3f} Y{py:.3f} F{settings['feed_rate']:.0f}")
+    g.append("M2 ; end program")
+    return g
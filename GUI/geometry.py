@@ -0,0 +1,1092 @@
+# Author: Paul Wyers
+# Copyright (C) 2025 Paul Wyers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Label geometry: fonts, glyph outlines and their disk cache, label layout,
+hatch fill and the system font index.
+
+Besides TrueType fonts, a label can be set in one of the single-line stroke
+fonts in fonts/ (see strokefont.py): its geometry is then the centrelines
+of the strokes, engraved in one pass.
+
+Needs numpy and shapely. matplotlib (a quarter of a second to import) is
+only imported once a TrueType label is laid out, so importing this module,
+or setting labels in a stroke font, never loads it."""
+
+import atexit
+import hashlib
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from shapely.geometry import MultiPolygon, Polygon
+import shapely
+
+import strokefont
+
+
+# ---------------------------------------------------------------------------
+# Geometry — no GUI dependencies, shared by the preview and the G-code export
+# so the two can never drift apart.
+# ---------------------------------------------------------------------------
+
+# Fonts are rendered at a fixed size, then scaled so that capital letters come
+# out at the requested height in mm. (FontProperties size is a point size for
+# the em box — it is NOT the printed glyph height, so it can't be used as mm.)
+FONT_RENDER_SIZE = 100.0
+
+
+# Glyph outlines also persist on disk between runs (GUI and batch CLI
+# alike), one store per font file — see GlyphStore.
+DISK_CACHE_FORMAT = 2
+DISK_CACHE_MAX_BYTES = 64 * 1024 * 1024  # all fonts together; least recently used go first
+_RECORD = struct.Struct("<II")  # crc32 of the key, payload length
+INDEX_FILE = "index.jsonl"
+
+
+def cache_dir():
+    """Where on-disk caches live: $CNC_LABEL_CACHE_DIR if set (empty turns
+    disk caching off), else the platform's per-user cache directory."""
+    path = os.environ.get("CNC_LABEL_CACHE_DIR")
+    if path is not None:
+        return path or None
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "cnc-label")
+
+
+def _append(path, data):
+    """Append data to a file in a single write and return the offset it
+    ends at. The file is opened O_APPEND, so writers in other processes
+    can't land on top of it."""
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0),
+                 0o666)
+    try:
+        if os.write(fd, data) != len(data):
+            raise OSError("short write")
+        return os.lseek(fd, 0, os.SEEK_CUR)
+    finally:
+        os.close(fd)
+
+
+def _glyph_record(glyph_id, payload):
+    return _RECORD.pack(zlib.crc32(f"glyphs:{glyph_id}".encode()), len(payload)) + payload
+
+
+class GlyphStore:
+    """On-disk cache for one font at FONT_RENDER_SIZE: glyph outlines (WKB)
+    and the cap height. Label layouts are not kept — most labels (serial
+    numbers, a half-typed preview) never come round again, and laying one
+    out from cached outlines is cheap.
+
+    Both files only ever grow. data.bin holds records of (crc32 of the key,
+    length, payload); index.jsonl has one line per flush mapping the glyphs
+    it added to their (offset, length). A flush is a single append to each,
+    so several processes can share a store without dropping each other's
+    entries, and every record is checked against its key and length on the
+    way out: a torn or stale write is a cache miss, never a wrong outline.
+    The data file is memory-mapped and a record is only decoded when asked
+    for. New entries are buffered until flush(); compact() rewrites a store
+    that has outgrown its cap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index = self._load_index()
+        self.pending = {}  # glyph_id: payload, not yet on disk
+        self.dirty = False
+        self._map = None
+
+    def _load_index(self):
+        index = {"cap_height": None, "glyphs": {}}
+        try:
+            with open(os.path.join(self.path, INDEX_FILE), "rb") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return index
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                index["glyphs"].update(entry["glyphs"])
+            except (ValueError, KeyError, TypeError):
+                continue  # torn by a crash mid-write
+            index["cap_height"] = entry.get("cap_height") or index["cap_height"]
+        return index
+
+    def _read(self, glyph_id):
+        entry = self.index["glyphs"].get(glyph_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        end = offset + _RECORD.size + length
+        if self._map is None or len(self._map) < end:
+            self._map = None
+            try:
+                with open(os.path.join(self.path, "data.bin"), "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):  # missing / empty file
+                return None
+            if len(self._map) < end:
+                return None
+        crc, size = _RECORD.unpack_from(self._map, offset)
+        if crc != zlib.crc32(f"glyphs:{glyph_id}".encode()) or size != length:
+            return None
+        return self._map[offset + _RECORD.size:end]
+
+    @property
+    def cap_height(self):
+        return self.index["cap_height"]
+
+    def set_cap_height(self, height):
+        with self.lock:
+            self.index["cap_height"] = height
+            self.dirty = True
+
+    def has_glyph(self, glyph_id):
+        return glyph_id in self.index["glyphs"]
+
+    def glyph(self, glyph_id):
+        """(hit, outline) — outline None for a glyph with nothing to cut."""
+        with self.lock:
+            data = self._read(glyph_id)
+        if data is None:
+            return False, None
+        try:
+            return True, shapely.from_wkb(data) if data else None
+        except shapely.errors.GEOSException:
+            return False, None
+
+    def put_glyph(self, glyph_id, outline):
+        payload = b"" if outline is None else shapely.to_wkb(outline)
+        with self.lock:
+            self.pending[glyph_id] = payload
+
+    def take_new(self):
+        """{glyph_id: WKB} of the outlines buffered since the last flush,
+        which this store then forgets: a pool worker hands them back to the
+        main process to write (see merge_new) rather than writing them."""
+        with self.lock:
+            new, self.pending, self.dirty = self.pending, {}, False
+        return new
+
+    def merge_new(self, new):
+        """Buffer outlines another process's store took with take_new()."""
+        with self.lock:
+            for glyph_id, payload in new.items():
+                if glyph_id not in self.index["glyphs"]:
+                    self.pending.setdefault(glyph_id, payload)
+
+    def flush(self):
+        """Append the buffered outlines to data.bin and a line for them to
+        the index."""
+        with self.lock:
+            if not self.pending and not self.dirty:
+                return
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                records, added, size = [], {}, 0
+                for glyph_id, payload in self.pending.items():
+                    records.append(_glyph_record(glyph_id, payload))
+                    added[glyph_id] = [size, len(payload)]
+                    size += len(records[-1])
+                if records:
+                    start = _append(os.path.join(self.path, "data.bin"), b"".join(records)) - size
+                    added = {k: [start + offset, n] for k, (offset, n) in added.items()}
+                line = {"glyphs": added, "cap_height": self.index["cap_height"]}
+                _append(os.path.join(self.path, INDEX_FILE), json.dumps(line).encode() + b"\n")
+                self.index["glyphs"].update(added)
+            except OSError:
+                pass  # read-only or full disk: stay an in-memory cache
+            self.pending = {}
+            self.dirty = False
+
+    def compact(self, max_bytes):
+        """Rewrite the store with one record per glyph — the index's latest —
+        dropping the longest-stored outlines until it fits in max_bytes.
+        Whatever another process appends meanwhile is lost, which only
+        costs it a miss."""
+        with self.lock:
+            self.index = self._load_index()
+            self._map = None
+            kept, size = [], 0
+            for glyph_id in reversed(list(self.index["glyphs"])):
+                data = self._read(glyph_id)
+                if data is None:
+                    continue
+                record = _glyph_record(glyph_id, data)
+                if size + len(record) > max_bytes:
+                    break
+                kept.append((glyph_id, record))
+                size += len(record)
+            glyphs, offset = {}, 0
+            for glyph_id, record in reversed(kept):
+                glyphs[glyph_id] = [offset, len(record) - _RECORD.size]
+                offset += len(record)
+            self._map = None  # let go of the old file before it's replaced
+            data_path = os.path.join(self.path, "data.bin")
+            index_path = os.path.join(self.path, INDEX_FILE)
+            tmp = f".{os.getpid()}.tmp"
+            try:
+                with open(data_path + tmp, "wb") as f:
+                    f.writelines(record for _, record in reversed(kept))
+                with open(index_path + tmp, "w") as f:
+                    json.dump({"glyphs": glyphs, "cap_height": self.index["cap_height"]}, f)
+                    f.write("\n")
+                os.replace(data_path + tmp, data_path)
+                os.replace(index_path + tmp, index_path)
+            except OSError:
+                return  # in use (Windows) or read-only: try again next time
+            self.index["glyphs"] = glyphs
+
+
+_glyph_stores = {}
+# True in a pool worker (see _init_pool_worker): its stores are only read —
+# the main process compacts, prunes and writes them
+_stores_read_only = False
+
+
+def _store_size(path):
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    except OSError:
+        return 0
+
+
+def _prune_glyph_stores(root, keep):
+    """Delete the least recently used font stores (by index mtime)
+    until they all fit in DISK_CACHE_MAX_BYTES; keep is never deleted."""
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    stores = []
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            used = os.stat(os.path.join(path, INDEX_FILE)).st_mtime
+        except OSError:
+            used = 0.0
+        stores.append((used, path, _store_size(path)))
+    total = sum(size for _, _, size in stores)
+    for _, path, size in sorted(stores):
+        if total <= DISK_CACHE_MAX_BYTES:
+            break
+        if path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def _matplotlib_version():
+    # From the package metadata, which is much cheaper than importing it
+    import importlib.metadata
+    try:
+        return importlib.metadata.version("matplotlib")
+    except importlib.metadata.PackageNotFoundError:
+        import matplotlib
+        return matplotlib.__version__
+
+
+def glyph_store(font_path):
+    """The GlyphStore for a font file, or None with disk caching off.
+
+    Stores are keyed by a hash of the font file's contents (plus the render
+    size, matplotlib version and store format), so a renamed or copied font
+    still hits and an updated one starts afresh."""
+    try:
+        st = os.stat(font_path)
+    except OSError:
+        return None
+    key = (font_path, st.st_size, st.st_mtime_ns)
+    if key in _glyph_stores:
+        return _glyph_stores[key]
+    store = None
+    root = cache_dir()
+    if root:
+        digest = hashlib.sha256(
+            f"{FONT_RENDER_SIZE}:{_matplotlib_version()}:{DISK_CACHE_FORMAT}:".encode())
+        with open(font_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        glyph_root = os.path.join(root, "glyphs")
+        path = os.path.join(glyph_root, digest.hexdigest()[:32])
+        store = GlyphStore(path)
+        if not _stores_read_only:
+            if _store_size(path) > DISK_CACHE_MAX_BYTES:
+                store.compact(DISK_CACHE_MAX_BYTES // 2)  # headroom, so it isn't redone every run
+            _prune_glyph_stores(glyph_root, keep=path)
+            try:
+                os.utime(os.path.join(path, INDEX_FILE))  # mark as recently used
+            except OSError:
+                pass
+    _glyph_stores[key] = store
+    return store
+
+
+def flush_glyph_stores():
+    """Write out every store's new entries. The batch CLI and the GUI's
+    export call this once they're done; atexit catches the rest, so a
+    preview never waits on the disk. Does nothing in a pool worker."""
+    if _stores_read_only:
+        return
+    for store in list(_glyph_stores.values()):
+        if store is not None:
+            store.flush()
+
+
+atexit.register(flush_glyph_stores)
+
+
+_cap_height_cache = {}
+
+
+def cap_height(font_path):
+    if font_path not in _cap_height_cache:
+        store = glyph_store(font_path)
+        h = store.cap_height if store else None
+        if h is None:
+            from matplotlib.font_manager import FontProperties
+            from matplotlib.textpath import TextPath
+            tp = TextPath((0, 0), "X",
+                          prop=FontProperties(fname=font_path, size=FONT_RENDER_SIZE))
+            h = tp.get_extents().height
+            h = h if h > 0 else FONT_RENDER_SIZE
+            if store:
+                store.set_cap_height(h)
+        _cap_height_cache[font_path] = h
+    return _cap_height_cache[font_path]
+
+
+# Glyph outlines are cached per (font, glyph) at the render size, so a label
+# is assembled from cached polygons instead of re-rasterising the whole
+# string: a batch of asset tags costs one outline per distinct character.
+# Both caches evict least-recently-used entries once full.
+GLYPH_CACHE_SIZE = 4096
+TEXT_GEOM_CACHE_SIZE = 256
+
+_glyph_cache = OrderedDict()
+_text_geom_cache = OrderedDict()
+
+
+def _cache_get(cache, key):
+    if key in cache:
+        cache.move_to_end(key)
+        return True, cache[key]
+    return False, None
+
+
+def _cache_put(cache, key, value, limit):
+    cache[key] = value
+    if len(cache) > limit:
+        cache.popitem(last=False)
+    return value
+
+
+def rings_to_geometry(rings):
+    """Rebuild glyph shapes from TextPath contours.
+
+    TextPath returns every contour as a plain ring — outer shapes and holes
+    alike. XOR-ing them together (even-odd rule) rebuilds the true glyph
+    shapes with their holes. Returns None if nothing printable is left."""
+    geom = None
+    for ring in rings:
+        if len(ring) < 3:
+            continue
+        p = Polygon(ring)
+        if not p.is_valid:
+            p = p.buffer(0)
+        if p.is_empty:
+            continue
+        geom = p if geom is None else geom.symmetric_difference(p)
+    if geom is None or geom.is_empty:
+        return None
+    return geom
+
+
+class _CachedGlyphs:
+    """Tells TextToPath which glyph outlines are already cached for a font
+    (in memory, or on disk when a store is given), so it only extracts the
+    new ones."""
+
+    def __init__(self, font_path, store=None):
+        self.font_path = font_path
+        self.store = store
+
+    def __contains__(self, glyph_id):
+        return ((self.font_path, glyph_id) in _glyph_cache
+                or (self.store is not None and self.store.has_glyph(glyph_id)))
+
+
+def _cached_outlines(placed, font_path, store):
+    """{glyph_id: outline} for placed glyphs from the memory cache, then the
+    disk store; None if any is in neither."""
+    outlines = {}
+    for glyph_id, _, _ in placed:  # touch cached glyphs before any eviction
+        if glyph_id in outlines:
+            continue
+        hit, outline = _cache_get(_glyph_cache, (font_path, glyph_id))
+        if not hit and store is not None:
+            hit, outline = store.glyph(glyph_id)
+            if hit:
+                _cache_put(_glyph_cache, (font_path, glyph_id), outline, GLYPH_CACHE_SIZE)
+        if not hit:
+            return None
+        outlines[glyph_id] = outline
+    return outlines
+
+
+def _glyph_paths(font, label, glyph_map):
+    """TextToPath's layout of label: [(glyph_id, x, y), ...] and the
+    (verts, codes) of the glyphs not in glyph_map."""
+    from matplotlib.textpath import text_to_path
+    glyphs, new_paths, _ = text_to_path.get_glyphs_with_font(
+        font, label, glyph_map=glyph_map, return_new_glyphs_only=True
+    )
+    return [(glyph_id, x, y) for glyph_id, x, y, _ in glyphs], new_paths
+
+
+def glyph_layout(label, font_path):
+    """Lay out a label exactly as TextPath does (advances and kerning) and
+    return ([(glyph_id, x, y), ...], {glyph_id: outline}).
+
+    Outlines are at FONT_RENDER_SIZE with the pen origin at (0, 0), Y up;
+    None for glyphs with nothing to cut (space). Only outlines missing from
+    both the memory cache and the disk store are extracted from the font."""
+    store = glyph_store(font_path)
+    from matplotlib.font_manager import get_font
+    from matplotlib.path import Path
+    from matplotlib.textpath import text_to_path
+    font = get_font(font_path)
+    font.set_size(FONT_RENDER_SIZE, text_to_path.DPI)
+    placed, new_paths = _glyph_paths(font, label, _CachedGlyphs(font_path, store))
+    outlines = _cached_outlines([p for p in placed if p[0] not in new_paths], font_path, store)
+    if outlines is None:
+        # Listed on disk but unreadable (another process mid-write): extract
+        # whatever memory doesn't hold
+        placed, new_paths = _glyph_paths(font, label, _CachedGlyphs(font_path))
+        outlines = _cached_outlines([p for p in placed if p[0] not in new_paths],
+                                    font_path, None)
+    for glyph_id, (verts, codes) in new_paths.items():
+        outline = None
+        if len(verts):
+            outline = rings_to_geometry(Path(verts, codes).to_polygons())
+        outlines[glyph_id] = _cache_put(
+            _glyph_cache, (font_path, glyph_id), outline, GLYPH_CACHE_SIZE
+        )
+        if store is not None:
+            store.put_glyph(glyph_id, outline)
+    return placed, outlines
+
+
+def _boxes_overlap(boxes):
+    """True if any two (minx, miny, maxx, maxy) boxes overlap."""
+    boxes = sorted(boxes)
+    for i, (x0, y0, x1, y1) in enumerate(boxes):
+        for bx0, by0, _, by1 in boxes[i + 1:]:
+            if bx0 >= x1:
+                break
+            if by0 < y1 and y0 < by1:
+                return True
+    return False
+
+
+def text_geometry(label, font_path, font_height_mm):
+    """Shapely geometry for a label with letter counters (the hole in O, A, e…)
+    as real holes, scaled so capitals are font_height_mm tall.
+
+    Origin is the bottom-left of the text bounding box, Y up (machine-style).
+    Returns None for labels with no printable outline. For a stroke font the
+    geometry is a MultiLineString (see stroke_text_geometry).
+    """
+    key = (label, font_path, font_height_mm)
+    hit, geom = _cache_get(_text_geom_cache, key)
+    if hit:
+        return geom
+    if is_stroke_font(font_path):
+        geom = stroke_text_geometry(label, font_path, font_height_mm)
+        return _cache_put(_text_geom_cache, key, geom, TEXT_GEOM_CACHE_SIZE)
+    placed, outlines = glyph_layout(label, font_path)
+    placed = [(outlines[glyph_id], x, y) for glyph_id, x, y in placed
+              if outlines[glyph_id] is not None]
+    if not placed:
+        return None
+    glyphs = np.empty(len(placed), dtype=object)
+    glyphs[:] = [g for g, _, _ in placed]
+    pen = np.array([(x, y) for _, x, y in placed], dtype=float)
+    boxes = shapely.bounds(glyphs) + np.hstack((pen, pen))
+    minx, miny = boxes[:, 0].min(), boxes[:, 1].min()
+    scale = font_height_mm / cap_height(font_path)
+    # Scale and move every glyph straight to its final spot in one vectorised
+    # transform: capitals font_height_mm tall, text bbox bottom-left at the
+    # origin
+    shift = np.repeat((pen - (minx, miny)) * scale, shapely.get_num_coordinates(glyphs),
+                      axis=0)
+    parts = shapely.transform(glyphs, lambda coords: coords * scale + shift)
+    # Glyphs normally sit side by side and can be combined as they are; only
+    # merge when their boxes overlap (tight kerning, italics)
+    if len(parts) == 1:
+        geom = parts[0]
+    elif _boxes_overlap(boxes.tolist()):
+        geom = shapely.union_all(parts)
+    else:
+        geom = MultiPolygon([poly for part in parts for poly in geom_polygons(part)])
+    return _cache_put(_text_geom_cache, key, geom, TEXT_GEOM_CACHE_SIZE)
+
+
+# ---------------------------------------------------------------------------
+# Single-line stroke fonts: the Hershey-style fonts in fonts/, cut once along
+# each stroke's centreline instead of round an outline or hatched.
+# ---------------------------------------------------------------------------
+
+STROKE_GAP = 0.2    # between one glyph's strokes and the next, in cap heights
+STROKE_SPACE = 0.6  # width of a space, in cap heights
+
+_stroke_layouts = {}
+
+
+def is_stroke_font(font_path):
+    return font_path.lower().endswith((".json", strokefont.PACKED_EXT))
+
+
+def stroke_font_choices():
+    """{menu name: path} for the stroke fonts shipped in fonts/, e.g.
+    "simplex (single line)" for fonts/font_simplex.json."""
+    return {f"{name[5:] if name.startswith('font_') else name} (single line)": path
+            for name, path in strokefont.stroke_fonts().items()}
+
+
+def stroke_text_geometry(label, font_path, font_height_mm):
+    """A label's strokes as a MultiLineString, laid out proportionally (see
+    strokefont.TextLayout) and scaled so capitals are font_height_mm tall.
+    Origin and orientation as text_geometry; None if nothing is drawn."""
+    font = strokefont.open_font(font_path)
+    layout = _stroke_layouts.get(font_path)
+    if layout is None:
+        cap = font.cap_height()
+        layout = _stroke_layouts[font_path] = strokefont.TextLayout(
+            font, STROKE_GAP * cap, STROKE_SPACE * cap)
+    offsets, _ = layout.place(label)
+    points, sizes, shifts = [], [], []
+    for char, dx in zip(label, offsets):
+        glyph = font.glyph(char)
+        if glyph is not None and glyph.sizes:
+            points.append(glyph.points)
+            sizes.extend(glyph.sizes)
+            shifts.append(dx)
+    if not points:
+        return None
+    xy = np.concatenate(points)
+    xy[:, 0] += np.repeat(shifts, [len(p) for p in points])
+    xy = (xy - xy.min(axis=0)) * (font_height_mm / font.cap_height())
+    lines = shapely.linestrings(xy, indices=np.repeat(np.arange(len(sizes)), sizes))
+    return shapely.multilinestrings(lines)
+
+
+def geom_lines(geom):
+    """The LineString parts of a geometry (a stroke font's centrelines), as
+    coordinate arrays. Polygons have none."""
+    for part in getattr(geom, "geoms", [geom]):
+        if part.geom_type == "LineString":
+            yield np.asarray(part.coords)
+        elif hasattr(part, "geoms"):
+            yield from geom_lines(part)
+
+
+def geom_polygons(geom):
+    """Iterate the Polygon parts of a Polygon/MultiPolygon/GeometryCollection."""
+    for part in getattr(geom, "geoms", [geom]):
+        if part.geom_type == "Polygon":
+            yield part
+        elif hasattr(part, "geoms"):
+            yield from geom_polygons(part)
+
+
+def geom_rings(geom):
+    """All rings (exteriors and holes) of a geometry, as coordinate arrays."""
+    for poly in geom_polygons(geom):
+        yield np.asarray(poly.exterior.coords)
+        for interior in poly.interiors:
+            yield np.asarray(interior.coords)
+
+
+def hatch_fill(geom, spacing):
+    """Horizontal fill lines clipped to the geometry (holes are skipped).
+
+    Scanline fill: every ring edge's crossings with every scanline are
+    found in one NumPy pass, then paired left to right along each scanline
+    (even-odd rule, so holes fall out between pairs). Scanlines run from
+    miny + spacing/2 upward; segments come out bottom to top, left to right.
+    """
+    minx, miny, maxx, maxy = geom.bounds
+    ys = []
+    y = miny + spacing / 2
+    while y < maxy:
+        ys.append(y)
+        y += spacing
+    if not ys:
+        return []
+    ys = np.asarray(ys)
+
+    edges = [np.column_stack((r[:-1], r[1:])) for r in geom_rings(geom) if len(r) > 1]
+    if not edges:
+        return []
+    x0, y0, x1, y1 = np.concatenate(edges).T
+    lo, hi = np.minimum(y0, y1), np.maximum(y0, y1)
+    # Half-open [lo, hi) so a scanline through a vertex counts it once;
+    # horizontal edges cross nothing
+    first = np.searchsorted(ys, lo, side="left")
+    count = np.searchsorted(ys, hi, side="left") - first
+    edge = np.repeat(np.arange(len(x0)), count)
+    row = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count) + first[edge]
+    sy = ys[row]
+    t = (sy - y0[edge]) / (y1[edge] - y0[edge])
+    sx = x0[edge] + t * (x1[edge] - x0[edge])
+
+    order = np.lexsort((sx, row))
+    row, sx = row[order], sx[order]
+    # Crossings on a scanline pair up (enter, leave) — every closed ring
+    # crosses a line an even number of times
+    starts, ends, rows = sx[0::2], sx[1::2], row[0::2]
+    keep = ends - starts > 1e-9
+    return [((a, y), (b, y)) for a, b, y in zip(
+        starts[keep].tolist(), ends[keep].tolist(), ys[rows[keep]].tolist()
+    )]
+
+
+def parse_label_size(raw):
+    """'Auto' -> None, '60x20' -> (60.0, 20.0); raises ValueError otherwise."""
+    raw = raw.strip().lower().replace("×", "x")
+    if raw in ("", "auto"):
+        return None
+    w, h = (float(p) for p in raw.split("x"))
+    if w <= 0 or h <= 0:
+        raise ValueError(raw)
+    return (w, h)
+
+
+def kerf_radius(settings):
+    """How far the cutout toolpath sits outside the drawn label edge: the
+    tool radius (spindle) or half the beam kerf (laser)."""
+    laser = settings["tool_mode"] == "Laser"
+    return (settings["laser_kerf"] if laser else settings["tool_diameter"]) / 2
+
+
+def pack_labels(sizes, material_width, material_height, gap, margin=0.0,
+                snap_grid=None):
+    """Place (width, height) boxes on as few material sheets as possible.
+
+    First-fit decreasing-height shelf packing: boxes go tallest first, left
+    to right along shelves that build upward from the sheet's bottom-left
+    corner (inset by margin). Each box takes the first shelf with room on
+    the first sheet that has one, else opens a new shelf above the last,
+    else a new sheet. Boxes are at least gap apart. A box too big for an
+    empty sheet gets a sheet of its own (and overflows it).
+
+    Returns (sheet, x, y) per box, in input order: x from the left edge, y
+    of the box bottom up from the bottom edge — machine-style coordinates.
+    """
+    def snap_up(v):
+        if not snap_grid:
+            return v
+        s = round(v / snap_grid) * snap_grid
+        return s if s >= v - 1e-9 else s + snap_grid
+
+    right, top = material_width - margin, material_height - margin
+    x0 = snap_up(margin)
+    # Boxes come tallest first, so every shelf already open is tall enough
+    # for the box in hand: it fits on a shelf whose free x plus its width is
+    # within the sheet. A min-tree over the sheets — of their shelves' free x
+    # and of where their next shelf would start — finds the first sheet with
+    # room without visiting the full ones, so packing stays near linear
+    # however many sheets a batch fills.
+    size = 1
+    while size < len(sizes):
+        size *= 2
+    free_x = [math.inf] * (2 * size)
+    next_y = [math.inf] * (2 * size)
+
+    def fits(node, w, h):
+        return (free_x[node] + w <= right + 1e-9
+                or (next_y[node] + h <= top + 1e-9 and x0 + w <= right + 1e-9))
+
+    def update(sheet):
+        shelves = sheets[sheet]
+        node = size + sheet
+        free_x[node] = min(snap_up(shelf[2]) for shelf in shelves)
+        next_y[node] = snap_up(shelves[-1][0] + shelves[-1][1] + gap)
+        while node > 1:
+            node //= 2
+            free_x[node] = min(free_x[2 * node], free_x[2 * node + 1])
+            next_y[node] = min(next_y[2 * node], next_y[2 * node + 1])
+
+    sheets = []  # per sheet: shelves as [y, height, next free x]
+    placed = [None] * len(sizes)
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        w, h = sizes[i]
+        if fits(1, w, h):
+            node = 1
+            while node < size:  # down to the first sheet with room
+                node = 2 * node if fits(2 * node, w, h) else 2 * node + 1
+            sheet = node - size
+            shelves = sheets[sheet]
+            for shelf in shelves:
+                x = snap_up(shelf[2])
+                if x + w <= right + 1e-9:
+                    break
+            else:
+                shelf = [snap_up(shelves[-1][0] + shelves[-1][1] + gap), h, x0]
+                shelves.append(shelf)
+                x = x0
+        else:
+            sheet, shelf, x = len(sheets), [x0, h, x0], x0
+            sheets.append([shelf])
+        placed[i] = (sheet, x, shelf[0])
+        shelf[2] = x + w + gap
+        update(sheet)
+    return placed
+
+
+# ---------------------------------------------------------------------------
+# Batch geometry — the distinct labels of a big batch are rendered across a
+# process pool and come back as WKB; packing them stays here, in order.
+# ---------------------------------------------------------------------------
+
+# Below this many labels to render, starting on the pool costs more than it
+# saves (a label takes about a millisecond)
+PARALLEL_MIN_LABELS = 256
+# Labels per pool task: enough to amortise the round trip, few enough that
+# the work spreads evenly and progress keeps moving
+PARALLEL_CHUNK_LABELS = 64
+
+_pool = None  # (workers, ProcessPoolExecutor), started on first use and kept
+# Set once a pool has failed to start or lost a worker — e.g. an interactive
+# or embedded host whose __main__ the spawned workers can't import; from
+# then on this process renders everything itself
+_pool_failed = False
+
+
+def default_workers():
+    """The number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on Windows or macOS
+        return os.cpu_count() or 1
+
+
+def _geometry_pool(workers):
+    global _pool
+    if _pool is None or _pool[0] != workers:
+        shutdown_geometry_pool()
+        # Only a big batch needs these (~50 ms to import)
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn, not fork: the GUI lays out on a worker thread, and forking a
+        # threaded process can leave the child stuck on a lock
+        _pool = (workers, ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_pool_worker))
+    return _pool[1]
+
+
+def shutdown_geometry_pool():
+    global _pool
+    if _pool is not None:
+        _pool[1].shutdown(cancel_futures=True)
+        _pool = None
+
+
+atexit.register(shutdown_geometry_pool)
+
+
+def _init_pool_worker():
+    global _stores_read_only
+    _stores_read_only = True
+
+
+def _render_chunk(labels, font_path, font_height_mm):
+    """Pool task: (the WKB of each label's geometry, None where there is
+    none; the glyph outlines extracted for them as {glyph_id: WKB}). Runs
+    in a worker process, whose caches last from task to task. The worker
+    only reads the disk store (see _init_pool_worker): the outlines go back
+    to the main process, which writes them."""
+    geoms = np.empty(len(labels), dtype=object)
+    geoms[:] = [text_geometry(label, font_path, font_height_mm) for label in labels]
+    store = glyph_store(font_path)
+    return shapely.to_wkb(geoms).tolist(), store.take_new() if store is not None else {}
+
+
+def _render_in_pool(todo, font_path, font_height_mm, workers, geoms, progress, total):
+    """Render the labels in todo across the pool into geoms. Returns the
+    labels still to render: none, or — if the pool can't be started or a
+    worker dies — whatever it didn't finish."""
+    global _pool_failed
+    from concurrent.futures import as_completed
+    from concurrent.futures.process import BrokenProcessPool
+    size = max(1, min(PARALLEL_CHUNK_LABELS, -(-len(todo) // (4 * workers))))
+    store = glyph_store(font_path)
+    futures = {}
+    try:
+        pool = _geometry_pool(workers)
+        for i in range(0, len(todo), size):
+            chunk = todo[i:i + size]
+            futures[pool.submit(_render_chunk, chunk, font_path, font_height_mm)] = chunk
+        for future in as_completed(futures):
+            chunk = futures[future]
+            wkbs, outlines = future.result()
+            for label, geom in zip(chunk, shapely.from_wkb(wkbs)):
+                geoms[label] = _cache_put(_text_geom_cache, (label, font_path, font_height_mm),
+                                          geom, TEXT_GEOM_CACHE_SIZE)
+            if store is not None:
+                store.merge_new(outlines)
+            if progress:
+                progress(len(geoms), total)
+    except (OSError, BrokenProcessPool):
+        _pool_failed = True
+        shutdown_geometry_pool()
+        return [label for label in todo if label not in geoms]
+    finally:
+        for future in futures:
+            future.cancel()  # abandoned by progress: drop the chunks not yet started
+    return []
+
+
+def batch_text_geometry(labels, font_path, font_height_mm, workers=None, progress=None):
+    """{label: geometry} for every distinct label (see text_geometry), in
+    the order they first appear, each rendered once however often it
+    repeats.
+
+    When at least PARALLEL_MIN_LABELS of them aren't cached yet they are
+    rendered across a pool of `workers` processes (default: every CPU
+    available; 1 renders here). Stroke fonts always render here, as laying
+    one out is cheaper than shipping it back, and so does everything once a
+    pool has failed in this process. progress(done, total) counts
+    distinct labels and may raise to abandon the batch."""
+    distinct = list(dict.fromkeys(labels))
+    geoms, todo = {}, []
+    for label in distinct:
+        hit, geom = _cache_get(_text_geom_cache, (label, font_path, font_height_mm))
+        if hit:
+            geoms[label] = geom
+        else:
+            todo.append(label)
+    total = len(geoms) + len(todo)
+    workers = default_workers() if workers is None else workers
+    rest = distinct
+    if (workers > 1 and len(todo) >= PARALLEL_MIN_LABELS and not _pool_failed
+            and not is_stroke_font(font_path)):
+        # Work the cap height out once, here, and write it so the workers
+        # read it off the disk store (without one, each works it out again)
+        height = cap_height(font_path)
+        store = glyph_store(font_path)
+        if store is not None:
+            if store.cap_height is None:
+                store.set_cap_height(height)
+            store.flush()
+        rest = _render_in_pool(todo, font_path, font_height_mm, workers, geoms, progress,
+                               total)
+    for done, label in enumerate(rest, total - len(rest)):
+        if progress:
+            progress(done, total)
+        if label not in geoms:
+            geoms[label] = text_geometry(label, font_path, font_height_mm)
+    return {label: geoms[label] for label in distinct}
+
+
+def build_layout(labels, font_path, font_height_mm, spacing, padding,
+                 material_width, material_height, snap_grid=None,
+                 label_size=None, margin=0.0, progress=None, workers=None):
+    """Pack labels onto material sheets, starting at the work origin
+    (bottom-left of material) — see pack_labels.
+
+    Coordinates are "canvas" mm: origin top-left, Y increases downward (what
+    the preview shows). Labels fill rows left to right from the material's
+    bottom-left corner, inset by margin on both axes — callers pass the
+    kerf/tool radius as margin so the first cutout toolpath starts exactly
+    at X0 Y0. Labels are at least spacing apart, and never closer than two
+    margins so neighbouring cutout toolpaths can't cut into each other.
+    Labels that don't fit spill onto further sheets: each item's "sheet"
+    says which, and every sheet has the same coordinates (use
+    sheet_layouts). Items come out in cut order — sheet by sheet, rows
+    bottom to top, left to right. Each item's geom keeps its own origin
+    (text bbox bottom-left, Y up); x/y_top place that box on the material.
+
+    label_size: (width, height) in mm for fixed-size labels, or None to size
+    each label from its text (bbox + padding). A fixed-size label whose text
+    (plus padding clearance) doesn't fit is flagged fits=False — the caller
+    decides whether to warn or refuse.
+
+    The geometry of each distinct label is made once, across `workers`
+    processes for a big batch (see batch_text_geometry); repeats share it.
+    progress(done, total) is called as it's made; it may raise to abandon
+    the job (see ComputeWorker).
+    """
+    geoms = batch_text_geometry(labels, font_path, font_height_mm, workers, progress)
+    boxes = []
+    for label in labels:
+        geom = geoms[label]
+        if geom is None:
+            continue
+        _, _, width, height = geom.bounds
+        if label_size:
+            label_w, label_h = label_size
+            fits = (width + 2 * padding <= label_w + 1e-6
+                    and height + 2 * padding <= label_h + 1e-6)
+        else:
+            label_w, label_h = width + 2 * padding, height + 2 * padding
+            fits = True
+        boxes.append((label, geom, width, height, label_w, label_h, fits))
+
+    placed = pack_labels(
+        [(b[4], b[5]) for b in boxes], material_width, material_height,
+        max(spacing, 2 * margin), margin=margin, snap_grid=snap_grid,
+    )
+    items = []
+    for (label, geom, width, height, label_w, label_h, fits), (sheet, bx0, y) in zip(
+        boxes, placed
+    ):
+        by0 = material_height - y - label_h  # machine y (up) -> canvas y (down)
+        items.append({
+            "label": label, "geom": geom,
+            "x": bx0 + (label_w - width) / 2,
+            "y_top": by0 + (label_h - height) / 2,
+            "width": width, "height": height,
+            "cutout": (bx0, by0, bx0 + label_w, by0 + label_h),
+            "fits": fits,
+            "sheet": sheet,
+        })
+    items.sort(key=lambda item: (item["sheet"], -item["cutout"][3], item["cutout"][0]))
+    return items
+
+
+def sheet_layouts(layout):
+    """Split a layout from build_layout into one layout per material sheet
+    (each becomes its own G-code program)."""
+    sheets = {}
+    for item in layout:
+        sheets.setdefault(item["sheet"], []).append(item)
+    return [sheets[k] for k in sorted(sheets)]
+
+# ---------------------------------------------------------------------------
+# System font index — the family name of every installed TTF, saved in the
+# cache directory by path, mtime and size, so startup only opens fonts that
+# are new or changed since the last run.
+# ---------------------------------------------------------------------------
+
+FONT_INDEX_FORMAT = 1
+
+
+def font_index_file():
+    root = cache_dir()
+    return os.path.join(root, "fonts.json") if root else None
+
+
+def load_font_index(path=None):
+    """{font path: [mtime_ns, size, family, regular]} as last saved; {} if
+    there is none (or disk caching is off)."""
+    path = path or font_index_file()
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("format") == FONT_INDEX_FORMAT:
+            return data["fonts"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+
+def save_font_index(index, path=None):
+    path = path or font_index_file()
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"format": FONT_INDEX_FORMAT, "fonts": index}, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # unwritable cache: next start just scans again
+
+
+def probe_font(path):
+    """(family name, regular?) read from the font file, or None if it
+    can't be opened."""
+    from matplotlib.font_manager import get_font, ttfFontProperty
+    try:
+        entry = ttfFontProperty(get_font(path))
+    except Exception:
+        return None
+    regular = entry.style == "normal" and entry.weight in (400, "normal", "regular")
+    return entry.name, regular
+
+
+def refresh_font_index(index, paths=None, progress=None):
+    """The index brought up to date with the fonts installed now (paths, or
+    findSystemFonts()). Files whose mtime and size are unchanged keep their
+    entry; only new or modified ones are opened; removed ones are dropped.
+    Returns (index, changed). progress(done, total) is called per probe."""
+    if paths is None:
+        from matplotlib.font_manager import findSystemFonts
+        paths = findSystemFonts(fontpaths=None, fontext="ttf")
+    fresh, stale = {}, []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entry = index.get(path)
+        if entry and entry[:2] == [st.st_mtime_ns, st.st_size]:
+            fresh[path] = entry
+        else:
+            stale.append((path, [st.st_mtime_ns, st.st_size]))
+    for n, (path, stamp) in enumerate(stale):
+        if progress:
+            progress(n, len(stale))
+        probed = probe_font(path)
+        fresh[path] = stamp + (list(probed) if probed else [None, False])
+    return fresh, bool(stale) or len(fresh) != len(index)
+
+
+def index_fonts(index):
+    """{family name: path} sorted by name. Where a family has several files
+    the regular style wins (else the first by path)."""
+    fonts = {}
+    for path, (_, _, name, _) in sorted(index.items(),
+                                        key=lambda item: (not item[1][3], item[0])):
+        if name:
+            fonts.setdefault(name, path)
+    return dict(sorted(fonts.items()))
+
+
+def get_system_fonts():
+    """{family name: path} for the installed TTFs, through the on-disk font
+    index: a full scan opens only the fonts that are new or changed."""
+    index, changed = refresh_font_index(load_font_index())
+    if changed:
+        save_font_index(index)
+    return index_fonts(index)
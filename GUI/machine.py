@@ -0,0 +1,513 @@
+# Author: Paul Wyers
+# Copyright (C) 2025 Paul Wyers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""The machine link: GRBL over USB serial, websocket or ESP3D HTTP, the
+streamers that feed it G-code lines, and the app log they report through.
+
+Standard library only (pyserial and websocket-client are imported when a
+link is opened), so a host that just streams existing G-code starts
+without the numpy / shapely / matplotlib stack."""
+
+import re
+import time
+from collections import deque
+
+
+# ---------------------------------------------------------------------------
+# Machine link — GRBL over USB serial (a stock CNC 3018 is GRBL 1.1 on a
+# COM port; the $$ dump and <Idle|WPos:...> reports come over that link)
+# ---------------------------------------------------------------------------
+
+# Bytes of GRBL 1.1's serial receive buffer — how much G-code the
+# character-counting streamer keeps in flight
+GRBL_RX_BUFFER = 128
+
+_log_sink = [None]
+
+
+def set_log_sink(fn):
+    """Route app_log() messages somewhere (the GUI console). None = discard."""
+    _log_sink[0] = fn
+
+
+def app_log(message):
+    sink = _log_sink[0]
+    if sink:
+        sink(str(message))
+
+
+GRBL_SETTING_DESCRIPTIONS = {
+    0: "Step pulse (µs)", 1: "Step idle delay (ms)", 2: "Step polarity mask",
+    3: "Direction polarity mask", 4: "Invert step enable", 5: "Invert limit pins",
+    6: "Invert probe pin", 10: "Status report mask", 11: "Junction deviation (mm)",
+    12: "Arc tolerance (mm)", 13: "Report in inches", 20: "Soft limits enable",
+    21: "Hard limits enable", 22: "Homing cycle enable", 23: "Homing direction mask",
+    24: "Homing feed (mm/min)", 25: "Homing seek (mm/min)", 26: "Homing debounce (ms)",
+    27: "Homing pull-off (mm)", 30: "Max spindle speed (RPM)",
+    31: "Min spindle speed (RPM)", 32: "Laser mode enable",
+    100: "X steps/mm", 101: "Y steps/mm", 102: "Z steps/mm",
+    110: "X max rate (mm/min)", 111: "Y max rate (mm/min)", 112: "Z max rate (mm/min)",
+    120: "X acceleration (mm/s²)", 121: "Y acceleration (mm/s²)",
+    122: "Z acceleration (mm/s²)",
+    130: "X max travel (mm)", 131: "Y max travel (mm)", 132: "Z max travel (mm)",
+}
+
+
+def iter_sendable_lines(lines):
+    """G-code lines worth transmitting: comments and blanks stripped."""
+    for line in lines:
+        cmd = line.split(";", 1)[0].strip()
+        if cmd and not cmd.startswith("("):
+            yield cmd
+
+
+def sendable_lines(lines):
+    return list(iter_sendable_lines(lines))
+
+
+def parse_grbl_settings(lines):
+    """$$ dump lines -> {setting_number: value_string}. Ignores everything
+    else (status reports, ok, banners)."""
+    out = {}
+    for line in lines:
+        m = re.match(r"\$(\d+)=(-?\d+\.?\d*)", line.strip())
+        if m:
+            out[int(m.group(1))] = m.group(2)
+    return out
+
+
+def await_ok(ser, context="", timeout_s=120, abort=None):
+    """Read GRBL responses until ok (returns None) or error/ALARM (returns
+    the message). Status chatter like <Idle|WPos:...> is ignored.
+
+    Quiet reads are tolerated until timeout_s: synchronising commands (M5,
+    coolant, etc.) only answer ok after all buffered motion finishes, which
+    can take tens of seconds mid-job. Returns 'aborted' if the abort event
+    is set while waiting."""
+    end = time.time() + timeout_s
+    while time.time() < end:
+        if abort is not None and abort.is_set():
+            return "aborted"
+        resp = ser.readline().decode(errors="ignore").strip()
+        if resp == "ok":
+            return None
+        if resp.startswith(("error", "ALARM")):
+            app_log(f"RX {resp}")
+            return resp
+        if not resp:
+            continue  # machine still executing buffered motion — keep waiting
+        app_log(f"RX {resp}")  # <status> reports, [MSG:...], banner: keep reading
+    raise TimeoutError(f"no response from GRBL {context}".strip())
+
+
+class WebSocketLink:
+    """GRBL over a websocket (ESP32/FluidNC/vendor wifi boards speak the same
+    line protocol as serial, typically on ws://<ip>:81). Exposes the same
+    write/readline interface as pyserial so the rest of the code is
+    transport-agnostic."""
+
+    def __init__(self, url, timeout=5):
+        try:
+            import websocket  # websocket-client; imported here so the GUI runs without it
+        except ImportError:
+            raise RuntimeError(
+                "wifi connections need the websocket-client package — "
+                "run: pip install websocket-client"
+            ) from None
+
+        self.timeout = timeout
+        try:
+            self.ws = websocket.create_connection(url, timeout=timeout)
+        except websocket.WebSocketBadStatusException as exc:
+            # A 200/HTML answer means we hit a web server, not a websocket —
+            # typically ws://<ip> without :81, which lands on the web UI port
+            raise RuntimeError(
+                f"{url} answered as a web page, not a GRBL websocket. "
+                "For ESP3D wifi boards enter just the IP address; for raw "
+                "websocket GRBL include the port, e.g. ws://host:81 "
+                f"(status {exc.status_code})"
+            ) from None
+        self.buffer = b""
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode("latin-1")
+        self.ws.send(data)
+
+    # ESP3D keepalive/control frames arrive as standalone text frames with no
+    # trailing newline; gluing them into the line buffer corrupts adjacent
+    # GRBL responses (seen live: 'PING:0' + 'ok\r\n' became 'PING:0ok')
+    CONTROL_FRAME = re.compile(r"^(PING|CURRENT_ID|ACTIVE_ID):\S*$")
+
+    def readline(self):
+        while b"\n" not in self.buffer:
+            try:
+                frame = self.ws.recv()
+            except Exception:  # timeout / closed: report like a serial timeout
+                return b""
+            if isinstance(frame, str):
+                if self.CONTROL_FRAME.match(frame.strip()):
+                    continue
+                frame = frame.encode("latin-1", errors="replace")
+            self.buffer += frame
+        line, _, self.buffer = self.buffer.partition(b"\n")
+        return line + b"\n"
+
+    def reset_input_buffer(self):
+        self.buffer = b""
+        self.ws.settimeout(0.2)
+        try:
+            while True:
+                self.ws.recv()  # drain pending frames
+        except Exception:
+            pass
+        self.ws.settimeout(self.timeout)
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ESP3DLink(WebSocketLink):
+    """GRBL via an ESP3D-style wifi board (the usual 3018 wifi module).
+
+    These boards take commands as HTTP GET /command?plain=<cmd> and push
+    GRBL's serial output to websocket clients on port 81 — the websocket
+    itself ignores incoming data. Confirmed against a live 3018: connecting
+    ws://host:81 yields CURRENT_ID/ACTIVE_ID/PING control frames, and $$ via
+    HTTP returns the settings dump as websocket frames ending in 'ok'.
+
+    The web server listens one port below the websocket (80 and 81 unless
+    the board was configured otherwise), so 'host:8081' sends commands to
+    host:8080."""
+
+    def __init__(self, host, timeout=8):
+        host = re.sub(r"^https?://", "", host).strip("/")
+        host, _, ws_port = host.partition(":")
+        ws_port = int(ws_port or 81)
+        super().__init__(f"ws://{host}:{ws_port}", timeout=timeout)
+        self.host = host if ws_port == 81 else f"{host}:{ws_port - 1}"
+
+    def write(self, data):
+        # urllib.request pulls in http.client and email: only ESP3D needs it
+        import urllib.parse
+        import urllib.request
+        if isinstance(data, bytes):
+            data = data.decode("latin-1")
+        for cmd in data.replace("\r", "\n").split("\n"):
+            if not cmd:
+                continue
+            url = (f"http://{self.host}/command?plain="
+                   f"{urllib.parse.quote(cmd, safe='')}")
+            urllib.request.urlopen(url, timeout=self.timeout).read()
+
+
+def normalize_target(target):
+    """Forgive sloppy URLs: 'ws:host:81' or 'ws:/host' -> 'ws://host:81'."""
+    t = target.strip()
+    m = re.match(r"^(wss?|https?):/{0,2}(.+)$", t, re.IGNORECASE)
+    if m:
+        return f"{m.group(1).lower()}://{m.group(2)}"
+    return t
+
+
+def link_kind(target):
+    """'serial' (COM3, /dev/ttyUSB0), 'ws' (ws://host:81, raw bidirectional
+    websocket GRBL like FluidNC), or 'esp3d' (bare IP / http:// address)."""
+    if target.startswith(("ws://", "wss://")):
+        return "ws"
+    if target.startswith(("http://", "https://")) or ("." in target and "/" not in target):
+        return "esp3d"
+    return "serial"
+
+
+def open_grbl(target, baud):
+    """Open a GRBL link — see link_kind for accepted target forms."""
+    target = normalize_target(target)
+    kind = link_kind(target)
+    if kind == "ws":
+        app_log(f"Opening websocket {target}")
+        link = WebSocketLink(target)
+        # ESP3D-style boards ignore websocket input entirely; they announce
+        # themselves with CURRENT_ID/ACTIVE_ID frames on connect. Detect that
+        # and switch to HTTP command mode instead of timing out on $$.
+        link.ws.settimeout(1.5)
+        seen = []
+        try:
+            while len(seen) < 4:
+                seen.append(link.ws.recv())
+        except Exception:
+            pass
+        link.ws.settimeout(link.timeout)
+        if any(str(f).startswith(("CURRENT_ID", "ACTIVE_ID")) for f in seen):
+            host = re.sub(r"^wss?://", "", target).split("/", 1)[0]
+            app_log(f"ESP3D board detected on {target} — "
+                    f"switching to HTTP command mode ({host})")
+            link.close()
+            link = ESP3DLink(host)
+        else:
+            for f in seen:  # keep any real data we swallowed while probing
+                if isinstance(f, str):
+                    f = f.encode("latin-1", "replace")
+                link.buffer += f
+    elif kind == "esp3d":
+        app_log(f"Opening ESP3D wifi link to {target}")
+        link = ESP3DLink(target)
+    else:
+        try:
+            import serial  # pyserial; imported here so the GUI runs without it
+        except ImportError:
+            raise RuntimeError(
+                "serial connections need the pyserial package — "
+                "run: pip install pyserial"
+            ) from None
+
+        app_log(f"Opening {target} at {baud} baud (serial)")
+        link = serial.Serial(target, baud, timeout=5)
+        link.write(b"\r\n\r\n")  # wake GRBL
+        time.sleep(2)
+    link.reset_input_buffer()
+    return link
+
+
+def home_machine(ser, timeout_s=90):
+    """Run GRBL's homing cycle ($H) and wait for it to finish. Homing can
+    take a long time, so empty reads are tolerated until timeout_s. Returns
+    None on success or the GRBL error/ALARM message."""
+    app_log("TX $H (homing…)")
+    ser.write(b"$H\n")
+    end = time.time() + timeout_s
+    while time.time() < end:
+        resp = ser.readline().decode(errors="ignore").strip()
+        if resp == "ok":
+            app_log("Homing complete")
+            return None
+        if resp.startswith(("error", "ALARM")):
+            app_log(f"RX {resp}")
+            return resp
+        if resp:
+            app_log(f"RX {resp}")
+    raise TimeoutError(f"homing did not complete within {timeout_s}s")
+
+
+def _abort_stream(ser, message):
+    """Feed-hold then soft-reset the controller, abandoning the job."""
+    app_log(message)
+    ser.write(b"!")        # feed hold
+    time.sleep(0.2)
+    ser.write(b"\x18")     # soft reset: abandon the job
+
+
+def stream_gcode(ser, lines, on_progress=None, abort=None, home=False,
+                 rx_buffer=0, total=None):
+    """Stream a job to GRBL over an already-open link. Returns (sent, errors).
+
+    rx_buffer=0 streams call-and-response style (send a line, wait for ok).
+    A positive rx_buffer (GRBL_RX_BUFFER for stock GRBL) streams by
+    character counting instead — see _stream_char_counting. Setting the
+    abort event feed-holds then soft-resets the controller. With home=True,
+    a $H homing cycle runs first — nothing is streamed unless it succeeds.
+
+    lines may be a list or any iterable (e.g. iter_gcode_lines): an
+    iterable is consumed as it streams, so the program is never held in
+    memory. on_progress(sent, total) gets total=None for an iterable unless
+    the caller passes the sendable line count as total."""
+    if isinstance(lines, (list, tuple)):
+        cmds = sendable_lines(lines)
+        total = len(cmds)
+    else:
+        cmds = iter_sendable_lines(lines)
+    if home:
+        err = home_machine(ser)
+        if err:
+            raise RuntimeError(f"homing failed ({err}) — nothing was sent")
+    count = f"{total} lines" if total is not None else "G-code"
+    if rx_buffer:
+        app_log(f"Streaming {count} (character counting, {rx_buffer}-byte buffer)")
+        return _stream_char_counting(ser, cmds, rx_buffer, on_progress, abort,
+                                     total=total)
+    app_log(f"Streaming {count}")
+    errors = sent = 0
+    for i, cmd in enumerate(cmds, 1):
+        if abort is not None and abort.is_set():
+            _abort_stream(ser, "ABORT: feed hold + soft reset")
+            return i - 1, errors
+        app_log(f"TX {cmd}")
+        ser.write((cmd + "\n").encode("ascii"))
+        result = await_ok(ser, f"at line {i} ({cmd!r})", abort=abort)
+        if result == "aborted":
+            _abort_stream(ser, "ABORT while waiting: feed hold + soft reset")
+            return i - 1, errors
+        if result:
+            errors += 1
+        sent = i
+        if on_progress:
+            on_progress(i, total)
+    return sent, errors
+
+
+def _stream_char_counting(ser, cmds, rx_buffer, on_progress=None, abort=None,
+                          timeout_s=120, total=None):
+    """GRBL's character-counting stream protocol.
+
+    Lines are sent for as long as the bytes still awaiting an ok/error fit
+    in the controller's rx_buffer, so GRBL always has the next moves queued
+    and its planner never drains between short G1 segments. GRBL answers
+    every line in order, so each ok/error is matched to the oldest line in
+    flight — errors are reported against the line that caused them. An
+    ALARM locks GRBL out (every further line would be rejected), so the
+    stream stops there. cmds may be any iterable; it is read only as buffer
+    space frees up. Returns (acknowledged lines, errors)."""
+    if total is None and isinstance(cmds, (list, tuple)):
+        total = len(cmds)
+    cmds = iter(cmds)
+    pending = next(cmds, None)  # the next line to send
+    in_flight = deque()  # (line number, cmd, bytes) sent but not yet answered
+    used = acked = errors = sent = 0
+    last_rx = time.time()
+    while pending is not None or in_flight:
+        if abort is not None and abort.is_set():
+            _abort_stream(ser, "ABORT: feed hold + soft reset")
+            return acked, errors
+        while pending is not None:
+            size = len(pending) + 1  # the newline counts against GRBL's buffer
+            # A line longer than the whole buffer still goes out on its own
+            if in_flight and used + size > rx_buffer:
+                break
+            app_log(f"TX {pending}")
+            ser.write((pending + "\n").encode("ascii"))
+            sent += 1
+            in_flight.append((sent, pending, size))
+            used += size
+            pending = next(cmds, None)
+        resp = ser.readline().decode(errors="ignore").strip()
+        if not resp:
+            # quiet while buffered motion executes (e.g. M5's planner sync)
+            if time.time() - last_rx > timeout_s:
+                line_no, cmd, _ = in_flight[0]
+                raise TimeoutError(f"no response from GRBL at line {line_no} ({cmd!r})")
+            continue
+        last_rx = time.time()
+        if resp == "ok" or resp.startswith("error"):
+            if not in_flight:
+                app_log(f"RX {resp} (no line awaiting a response — ignored)")
+                continue
+            line_no, cmd, size = in_flight.popleft()
+            used -= size
+            acked += 1
+            if resp != "ok":
+                errors += 1
+                app_log(f"RX {resp} at line {line_no} ({cmd!r})")
+            if on_progress:
+                on_progress(acked, total)
+        elif resp.startswith("ALARM"):
+            where = f" at line {in_flight[0][0]}" if in_flight else ""
+            app_log(f"RX {resp}{where} — stopping the stream")
+            return acked, errors + 1
+        else:
+            app_log(f"RX {resp}")  # <status> reports, [MSG:...]: keep reading
+    return acked, errors
+
+
+def read_grbl_settings(ser):
+    """Query $$ over an open link and return {number: value_string}."""
+    app_log("TX $$")
+    ser.write(b"$$\n")
+    lines = []
+    while True:
+        resp = ser.readline().decode(errors="ignore").strip()
+        if resp == "ok":
+            break
+        if not resp:
+            raise TimeoutError("no response to $$")
+        app_log(f"RX {resp}")
+        lines.append(resp)
+    return parse_grbl_settings(lines)
+
+
+def write_grbl_settings(ser, changes):
+    """Write {number: value_string} as $n=value commands over an open link.
+    Returns a list of GRBL error strings (empty = all accepted)."""
+    problems = []
+    for num, val in sorted(changes.items()):
+        app_log(f"TX ${num}={val}")
+        ser.write(f"${num}={val}\n".encode("ascii"))
+        err = await_ok(ser, f"writing ${num}")
+        if err:
+            problems.append(f"${num}={val}: {err}")
+    return problems
+
+
+def jog(ser, dx=0, dy=0, dz=0, feed=1500):
+    """Relative jog via GRBL's $J interface. Returns None or the GRBL error
+    (e.g. error:15 when a soft limit would be exceeded)."""
+    parts = "".join(f" {axis}{val:g}" for axis, val in
+                    (("X", dx), ("Y", dy), ("Z", dz)) if val)
+    if not parts:
+        return None
+    cmd = f"$J=G91 G21 F{feed:g}{parts}"
+    app_log(f"TX {cmd}")
+    ser.write((cmd + "\n").encode("ascii"))
+    return await_ok(ser, "jogging")
+
+
+def set_work_zero(ser, axes="XY"):
+    """Make the current position the work zero for the given axes
+    (G10 L20 P1 — sets the G54 offset, survives reset)."""
+    cmd = "G10 L20 P1 " + " ".join(f"{a}0" for a in axes)
+    app_log(f"TX {cmd}")
+    ser.write((cmd + "\n").encode("ascii"))
+    return await_ok(ser, "setting work zero")
+
+
+def query_status(ser):
+    """Ask for a realtime status report and return the raw '<...>' string,
+    or None if none arrives in time."""
+    ser.write(b"?")
+    end = time.time() + 3
+    while time.time() < end:
+        resp = ser.readline().decode(errors="ignore").strip()
+        if resp.startswith("<"):
+            app_log(f"RX {resp}")
+            return resp
+        if not resp:
+            break
+    return None
+
+
+# Back-compat wrappers that manage their own connection
+def stream_gcode_serial(port, baud, lines, **kwargs):
+    with open_grbl(port, baud) as ser:
+        return stream_gcode(ser, lines, **kwargs)
+
+
+def grbl_read_settings(port, baud):
+    with open_grbl(port, baud) as ser:
+        return read_grbl_settings(ser)
+
+
+def grbl_write_settings(port, baud, changes):
+    with open_grbl(port, baud) as ser:
+        return write_grbl_settings(ser, changes)
@@ -0,0 +1,361 @@
+# Author: Paul Wyers
+# Copyright (C) 2025 Paul Wyers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Single-line stroke fonts (the glyph tables in fonts/), compiled to NumPy
+polylines.
+
+A glyph in the JSON is a list of line segments [[x1, y1], [x2, y2]].
+Compiling chains the segments that share an endpoint into one polyline,
+so the tool follows a whole stroke of the letter without lifting at
+every joint.
+
+The JSON stays the source you edit; `python strokefont.py ../fonts/*.json`
+packs each font into a .sfont beside it:
+
+    header   magic, SHA-1 of the JSON it was built from, and the number of
+             glyphs, polylines and points (HEADER)
+    glyphs   code point, first polyline, polyline count — one row per
+             glyph, sorted by code point (GLYPH_ROW)
+    starts   uint32 index of the first point of every polyline, plus the
+             total point count
+    coords   float32 x, y of every point, polyline after polyline
+
+A packed font is memory-mapped and a glyph is only decoded when it is first
+drawn, so opening one costs the same however many fonts there are.
+Needs numpy only."""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+FONT_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fonts"))
+
+PACKED_EXT = ".sfont"
+MAGIC = b"CNCSTRK1"
+HEADER = struct.Struct("<8s20sIII")  # magic, SHA-1 of the JSON, glyphs, polylines, points
+GLYPH_ROW = np.dtype([("char", "<u4"), ("first", "<u4"), ("count", "<u4")])
+
+# Endpoints closer than this (font units) are the same point
+JOIN_TOLERANCE = 1e-6
+
+# points: (n, 2) float64, every polyline's points one after another
+# sizes:  the number of points in each polyline (each is at least 2)
+Glyph = namedtuple("Glyph", "points sizes")
+
+
+def chain_segments(segments, tolerance=JOIN_TOLERANCE):
+    """Join line segments that share an endpoint into polylines: a list of
+    point lists. Walks start at odd-degree points (the ends of open
+    strokes) first, so a connected stroke comes out as few polylines as a
+    greedy walk allows; every segment is drawn exactly once."""
+    def key(p):
+        return round(p[0] / tolerance), round(p[1] / tolerance)
+
+    edges = [((float(a[0]), float(a[1])), (float(b[0]), float(b[1]))) for a, b in segments]
+    at = defaultdict(list)  # point key -> indices of the edges touching it
+    point = {}
+    for i, (a, b) in enumerate(edges):
+        for p in (a, b):
+            at[key(p)].append(i)
+            point.setdefault(key(p), p)
+    used = [False] * len(edges)
+
+    # Odd-degree points first, otherwise in the order the font lists them
+    starts = sorted(at, key=lambda k: len(at[k]) % 2 == 0)
+    polylines = []
+    for start in starts:
+        while True:
+            line, here = [point[start]], start
+            while True:
+                i = next((i for i in at[here] if not used[i]), None)
+                if i is None:
+                    break
+                used[i] = True
+                a, b = edges[i]
+                nxt = b if key(a) == here else a
+                line.append(nxt)
+                here = key(nxt)
+            if len(line) == 1:
+                break
+            polylines.append(line)
+    return polylines
+
+
+def compile_glyph(segments):
+    """Glyph(points, sizes) for a glyph's segment list."""
+    polylines = chain_segments(segments)
+    if not polylines:
+        return Glyph(np.empty((0, 2)), ())
+    return Glyph(np.array([p for line in polylines for p in line], dtype=np.float64),
+                 tuple(len(line) for line in polylines))
+
+
+class _Font:
+    """What every stroke font provides on top of glyph(): glyph extents and
+    the cap height, each worked out once per font."""
+
+    def __init__(self, name):
+        self.name = name
+        self._compiled = {}
+        self._bounds = {}
+        self._cap_height = None
+
+    def bounds(self, char):
+        """(xmin, xmax, ymin, ymax) of char's strokes; None for a character
+        the font lacks or that draws nothing."""
+        try:
+            return self._bounds[char]
+        except KeyError:
+            pass
+        glyph = self.glyph(char)
+        box = None
+        if glyph is not None and len(glyph.points):
+            (xmin, ymin), (xmax, ymax) = glyph.points.min(axis=0), glyph.points.max(axis=0)
+            box = (float(xmin), float(xmax), float(ymin), float(ymax))
+        self._bounds[char] = box
+        return box
+
+    def cap_height(self):
+        """Height of a capital (the "H"), in font units — the size the text
+        height is scaled to. Fonts without an H use their tallest glyph."""
+        if self._cap_height is None:
+            box = self.bounds("H")
+            if box is None:
+                boxes = [b for b in map(self.bounds, self.chars()) if b]
+                box = (0, 0, min(b[2] for b in boxes), max(b[3] for b in boxes)) if boxes \
+                    else (0, 0, 0, 1)
+            self._cap_height = box[3] - box[2]
+        return self._cap_height
+
+
+class StrokeFont(_Font):
+    """A stroke font parsed from JSON: glyphs by character, each compiled on
+    first use."""
+
+    def __init__(self, glyphs, name=None):
+        super().__init__(name)
+        self._source = glyphs  # char -> list of segments
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), font_name(path))
+
+    def __contains__(self, char):
+        return char in self._source
+
+    def chars(self):
+        return list(self._source)
+
+    def glyph(self, char):
+        """The compiled Glyph for char, or None if the font lacks it."""
+        glyph = self._compiled.get(char)
+        if glyph is None:
+            segments = self._source.get(char)
+            if segments is None:
+                return None
+            glyph = self._compiled[char] = compile_glyph(segments)
+        return glyph
+
+
+class PackedStrokeFont(_Font):
+    """A .sfont, memory-mapped. Only the glyph table is read on opening;
+    a glyph's points are copied out of the map the first time it's asked
+    for."""
+
+    def __init__(self, path):
+        super().__init__(font_name(path))
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.source_sha1, n_glyphs, n_lines, n_points = HEADER.unpack_from(self._map)
+            if magic != MAGIC:
+                raise ValueError("bad magic")
+            offset = HEADER.size
+            rows = np.frombuffer(self._map, GLYPH_ROW, n_glyphs, offset)
+            offset += rows.nbytes
+            self._starts = np.frombuffer(self._map, "<u4", n_lines + 1, offset)
+            offset += self._starts.nbytes
+            self._coords = np.frombuffer(self._map, "<f4", 2 * n_points, offset).reshape(-1, 2)
+        except (struct.error, ValueError) as e:
+            raise ValueError(f"{path}: not a packed stroke font ({e})") from None
+        self._rows = {chr(c): (first, count) for c, first, count in rows.tolist()}
+
+    def __contains__(self, char):
+        return char in self._rows
+
+    def chars(self):
+        return list(self._rows)
+
+    def glyph(self, char):
+        """The Glyph for char, or None if the font lacks it."""
+        glyph = self._compiled.get(char)
+        if glyph is None:
+            row = self._rows.get(char)
+            if row is None:
+                return None
+            first, count = row
+            starts = self._starts[first:first + count + 1].astype(np.int64)
+            points = self._coords[starts[0]:starts[-1]].astype(np.float64)
+            glyph = self._compiled[char] = Glyph(points, tuple(np.diff(starts).tolist()))
+        return glyph
+
+
+class TextLayout:
+    """Proportional layout in one stroke font. Each glyph takes the width of
+    its own strokes, then `gap`; a space (or a character the font lacks)
+    takes `space`; `kerning` maps character pairs such as "AV" to an extra
+    advance between them (negative tucks them together). All in font
+    units. Glyph widths come from the font, so they are measured once per
+    font however many layouts share it."""
+
+    def __init__(self, font, gap, space=None, kerning=None):
+        self.font = font
+        self.gap = gap
+        self.space = font.cap_height() / 2 if space is None else space
+        self.kerning = dict(kerning or {})
+        self._advance = {}  # char -> (shift to its left edge, width)
+
+    def _metrics(self, char):
+        box = self.font.bounds(char)
+        metrics = (-box[0], box[1] - box[0]) if box else (0.0, self.space)
+        self._advance[char] = metrics
+        return metrics
+
+    def place(self, text):
+        """(offsets, width): the x offset to draw each character's glyph at,
+        so the text starts at 0, and the width of the whole text."""
+        offsets, pen, prev = [], 0.0, None
+        kerning, advance = self.kerning, self._advance
+        for char in text:
+            if prev is not None:
+                pen += self.gap + (kerning.get(prev + char, 0.0) if kerning else 0.0)
+            shift, width = advance.get(char) or self._metrics(char)
+            offsets.append(pen + shift)
+            pen += width
+            prev = char
+        return offsets, pen
+
+    def width(self, text):
+        return self.place(text)[1]
+
+
+def font_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def pack_font(glyphs, source_sha1=bytes(20)):
+    """The .sfont bytes for a {char: segments} table."""
+    rows, starts, coords = [], [0], []
+    for char in sorted(glyphs, key=ord):
+        glyph = compile_glyph(glyphs[char])
+        rows.append((ord(char), len(starts) - 1, len(glyph.sizes)))
+        for n in glyph.sizes:
+            starts.append(starts[-1] + n)
+        coords.append(glyph.points)
+    points = np.concatenate(coords) if coords else np.empty((0, 2))
+    return b"".join([
+        HEADER.pack(MAGIC, source_sha1, len(rows), len(starts) - 1, len(points)),
+        np.array(rows, GLYPH_ROW).tobytes(),
+        np.array(starts, "<u4").tobytes(),
+        points.astype("<f4").tobytes(),
+    ])
+
+
+def pack_json(path, out=None):
+    """Convert a JSON stroke font to a .sfont (beside it by default).
+    Returns the path written."""
+    with open(path, "rb") as f:
+        data = f.read()
+    out = out or os.path.splitext(path)[0] + PACKED_EXT
+    packed = pack_font(json.loads(data), hashlib.sha1(data).digest())
+    tmp = f"{out}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(packed)
+    os.replace(tmp, out)
+    return out
+
+
+# realpath -> open font; a font is opened once however often it's asked for
+_fonts = {}
+
+
+def open_font(path):
+    """The stroke font at path (.sfont or .json), opened once. A JSON font
+    is served from the .sfont beside it when that was packed from this very
+    JSON; if there is none, or the JSON has changed since, it is parsed and
+    compiled here instead."""
+    key = os.path.realpath(path)
+    font = _fonts.get(key)
+    if font is None:
+        if path.endswith(PACKED_EXT):
+            font = PackedStrokeFont(path)
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+            font = _packed_sibling(path, hashlib.sha1(data).digest())
+            if font is None:
+                font = StrokeFont(json.loads(data), font_name(path))
+        _fonts[key] = font
+    return font
+
+
+def _packed_sibling(path, sha1):
+    packed = os.path.splitext(path)[0] + PACKED_EXT
+    try:
+        font = PackedStrokeFont(packed)
+    except (OSError, ValueError):
+        return None
+    return font if font.source_sha1 == sha1 else None
+
+
+def stroke_fonts(directory=FONT_DIR):
+    """{name: path} of the stroke fonts in directory, from the file names
+    alone — nothing is opened. A font's JSON is listed, as open_font()
+    prefers its .sfont by itself."""
+    fonts = {}
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return fonts
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext == ".json" or (ext == PACKED_EXT and stem not in fonts):
+            fonts[stem] = os.path.join(directory, name)
+    return fonts
+
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print("usage: python strokefont.py FONT.json [FONT.json ...]", file=sys.stderr)
+        return 2
+    for path in paths:
+        out = pack_json(path)
+        print(f"{path} -> {out} ({os.path.getsize(out)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
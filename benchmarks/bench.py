@@ -0,0 +1,324 @@
+# Author: Paul Wyers
+# Copyright (C) 2025 Paul Wyers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Timing benchmarks for the label pipeline's hot paths.
+
+Runs text_geometry, build_layout, hatch_fill, generate_gcode_lines,
+simulate_gcode and stream_gcode (into an in-process fake GRBL) over fixed
+corpora — 10 / 100 / 5,000 labels, short and long strings, outline and
+fill, several fonts — and saves the timings as JSON to compare between
+commits. For example:
+
+    python benchmarks/bench.py -o base.json
+    python benchmarks/bench.py --sizes 10 100 --only stream -o head.json
+    python benchmarks/bench.py --compare base.json head.json
+
+Memory caches are emptied before every text_geometry / build_layout run and
+the on-disk glyph cache is off, so those time a cold start in one process.
+build_layout_pool (batches of PARALLEL_MIN_LABELS or more) times the same
+layout across a process pool on every CPU, started afresh for each run."""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import deque
+
+# Timings must not depend on what the user's own glyph cache holds
+os.environ["CNC_LABEL_CACHE_DIR"] = ""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "GUI"))
+
+import gcode  # noqa: E402  (these need the path above)
+import geometry  # noqa: E402
+import machine  # noqa: E402
+
+SIZES = (10, 100, 5000)
+TEXTS = {
+    "short": "T-{:04d}",
+    "long": "BOILER FEED PUMP {:04d} - ISOLATE BEFORE SERVICE",
+}
+MODES = ("outline", "fill")
+FONT_HEIGHT_MM = 8.0
+SPACING_MM = 5.0
+SETTINGS = dict(gcode.DEFAULT_SETTINGS, material_width=300, material_height=200)
+LONG_CASE_S = 10.0  # cases slower than this are not repeated
+
+# Fields that identify a case; results from two runs are matched on them
+CASE_FIELDS = ("name", "font", "text", "labels", "mode")
+
+
+def corpus(text, count):
+    return [TEXTS[text].format(i) for i in range(count)]
+
+
+def pick_fonts(count, paths=None):
+    """[(family name, path), ...]: the given font files, else the first
+    `count` installed families (regular style preferred)."""
+    if paths:
+        return [((geometry.probe_font(p) or (os.path.basename(p),))[0], p) for p in paths]
+    index, _ = geometry.refresh_font_index({})
+    return list(geometry.index_fonts(index).items())[:count]
+
+
+def cold_caches():
+    for cache in (geometry._glyph_cache, geometry._text_geom_cache,
+                  geometry._cap_height_cache):
+        cache.clear()
+
+
+def timed(fn, repeat, setup=None):
+    """(seconds of each run, fn's last result) for up to `repeat` calls to
+    fn, with the collector off while each runs (as timeit does). A case
+    slower than LONG_CASE_S is timed once."""
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        gc.disable()
+        try:
+            t = time.perf_counter()
+            value = fn()
+            runs.append(time.perf_counter() - t)
+        finally:
+            gc.enable()
+        if runs[-1] > LONG_CASE_S:
+            break
+    return runs, value
+
+
+class FakeGrbl:
+    """In-process GRBL stand-in: answers ok to the oldest line on every
+    read, and fails loudly if the sender overruns its receive buffer."""
+
+    def __init__(self, rx_buffer=machine.GRBL_RX_BUFFER):
+        self.rx_buffer = rx_buffer
+        self.rx = deque()
+        self.used = 0
+
+    def write(self, data):
+        if self.rx and self.used + len(data) > self.rx_buffer:
+            raise OverflowError("GRBL receive buffer overrun")
+        self.rx.append(len(data))
+        self.used += len(data)
+
+    def readline(self):
+        if not self.rx:
+            return b""
+        self.used -= self.rx.popleft()
+        return b"ok\n"
+
+
+def program_lines(layout, fill):
+    """The G-code for every sheet of the layout, one program after another."""
+    return [line for sheet in geometry.sheet_layouts(layout)
+            for line in gcode.generate_gcode_lines(sheet, SETTINGS, fill)]
+
+
+def layout_of(labels, font_path, workers=1):
+    """build_layout for the corpus. In this process by default: a pool
+    kept between repeats would serve them from its workers' warm caches."""
+    return geometry.build_layout(
+        labels, font_path, FONT_HEIGHT_MM, SPACING_MM, SETTINGS["cutout_padding"],
+        SETTINGS["material_width"], SETTINGS["material_height"],
+        margin=geometry.kerf_radius(SETTINGS), workers=workers,
+    )
+
+
+def cold_pool():
+    """cold_caches(), and no pool: the next pooled layout starts its
+    workers afresh."""
+    cold_caches()
+    geometry.shutdown_geometry_pool()
+
+
+def case_key(result):
+    return "/".join(str(result[k]) for k in CASE_FIELDS if k in result)
+
+
+def run_suite(fonts, sizes, repeat, only=(), report=None):
+    """Time every case whose key contains one of `only` (all of them if
+    empty). Inputs are built outside the clock, and only for the cases
+    that run; the G-code timed by generate_gcode_lines is what the
+    simulate and stream cases then consume. report(result) is called as
+    each case finishes."""
+    results = []
+
+    def wanted(case):
+        return not only or any(part in case_key(case) for part in only)
+
+    def bench(case, fn, setup=None):
+        runs, value = timed(fn, repeat, setup)
+        result = dict(case, best=min(runs), median=statistics.median(runs), runs=runs)
+        results.append(result)
+        if report:
+            report(result)
+        return value
+
+    for font, path in fonts:
+        for text in TEXTS:
+            for count in sizes:
+                labels = corpus(text, count)
+                case = {"font": font, "text": text, "labels": count}
+                if wanted(dict(case, name="text_geometry")):
+                    bench(dict(case, name="text_geometry"),
+                          lambda: [geometry.text_geometry(lbl, path, FONT_HEIGHT_MM)
+                                   for lbl in labels],
+                          cold_caches)
+                layout = None
+                if wanted(dict(case, name="build_layout")):
+                    layout = bench(dict(case, name="build_layout"),
+                                   lambda: layout_of(labels, path), cold_caches)
+                if (count >= geometry.PARALLEL_MIN_LABELS
+                        and wanted(dict(case, name="build_layout_pool"))):
+                    bench(dict(case, name="build_layout_pool"),
+                          lambda: layout_of(labels, path, workers=None), cold_pool)
+                for mode in MODES:
+                    fill = mode == "fill"
+                    named = {name: dict(case, mode=mode, name=name) for name in (
+                        "hatch_fill", "generate_gcode_lines", "simulate_gcode", "stream_gcode")}
+                    if not fill:
+                        del named["hatch_fill"]
+                    if not any(wanted(c) for c in named.values()):
+                        continue
+                    layout = layout or layout_of(labels, path)
+                    if fill and wanted(named["hatch_fill"]):
+                        spacing = SETTINGS["tool_diameter"] * 0.8
+                        bench(named["hatch_fill"],
+                              lambda: [geometry.hatch_fill(item["geom"], spacing)
+                                       for item in layout])
+                    if wanted(named["generate_gcode_lines"]):
+                        lines = bench(named["generate_gcode_lines"],
+                                      lambda: program_lines(layout, fill))
+                    elif wanted(named["simulate_gcode"]) or wanted(named["stream_gcode"]):
+                        lines = program_lines(layout, fill)
+                    if wanted(named["simulate_gcode"]):
+                        bench(named["simulate_gcode"],
+                              lambda: gcode.simulate_gcode(lines, as_array=True))
+                    if wanted(named["stream_gcode"]):
+                        bench(named["stream_gcode"],
+                              lambda: machine.stream_gcode(
+                                  FakeGrbl(), lines, rx_buffer=machine.GRBL_RX_BUFFER))
+    return results
+
+
+def environment():
+    """Commit, interpreter and library versions the timings were taken with."""
+    import matplotlib
+    import numpy
+    import shapely
+    try:
+        commit = subprocess.run(
+            ["git", "-C", ROOT, "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": numpy.__version__,
+        "shapely": shapely.__version__,
+        "matplotlib": matplotlib.__version__,
+    }
+
+
+def compare(base, head, threshold):
+    """Table of head vs base best times, matched by case. Returns the keys
+    of the cases more than `threshold` times slower in head."""
+    before = {case_key(r): r for r in base["results"]}
+    slower = []
+    print(f"{'case':<64} {'base':>9} {'head':>9} {'ratio':>6}")
+    for r in head["results"]:
+        key = case_key(r)
+        if key not in before:
+            continue
+        ratio = r["best"] / before[key]["best"] if before[key]["best"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            slower.append(key)
+            flag = "  slower"
+        print(f"{key:<64} {before[key]['best'] * 1e3:>7.1f}ms "
+              f"{r['best'] * 1e3:>7.1f}ms {ratio:>6.2f}{flag}")
+    return slower
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description="Benchmark the label pipeline's hot paths.")
+    p.add_argument("-o", "--output", help="results JSON (default: bench-<commit>.json)")
+    p.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), metavar="N",
+                   help="label counts to run (default: 10 100 5000)")
+    p.add_argument("--fonts", type=int, default=3, metavar="N",
+                   help="how many installed font families to run (default: 3)")
+    p.add_argument("--font", action="append", metavar="TTF",
+                   help="run this font file instead (repeatable)")
+    p.add_argument("--repeat", type=int, default=3,
+                   help="timed runs per case; the best one is compared (default: 3)")
+    p.add_argument("--only", nargs="+", default=[], metavar="TEXT",
+                   help="run only the cases whose key contains one of these, "
+                        "e.g. stream_gcode or /5000/")
+    p.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"),
+                   help="compare two results files instead of running")
+    p.add_argument("--threshold", type=float, default=1.2,
+                   help="with --compare: exit 1 if a case is this many times "
+                        "slower (default: 1.2)")
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path, encoding="utf-8") as f:
+                runs.append(json.load(f))
+        slower = compare(*runs, args.threshold)
+        if slower:
+            print(f"{len(slower)} case(s) over {args.threshold}x slower", file=sys.stderr)
+        return 1 if slower else 0
+
+    fonts = pick_fonts(args.fonts, args.font)
+    if not fonts:
+        print("no TrueType fonts found", file=sys.stderr)
+        return 2
+    env = environment()
+    results = run_suite(
+        fonts, args.sizes, args.repeat, args.only,
+        report=lambda r: print(f"{case_key(r):<64} {r['best'] * 1e3:>9.1f}ms",
+                               file=sys.stderr),
+    )
+    output = args.output or f"bench-{env['commit'] or 'local'}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": env, "settings": {
+            "sizes": args.sizes, "repeat": args.repeat, "font_height_mm": FONT_HEIGHT_MM,
+            "spacing_mm": SPACING_MM,
+        }, "results": results}, f, indent=1)
+    print(f"{len(results)} cases written to {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
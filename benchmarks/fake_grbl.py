@@ -0,0 +1,654 @@
+# Author: Paul Wyers
+# Copyright (C) 2025 Paul Wyers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""A stand-in GRBL 1.1 controller, for exercising the machine link with no
+machine attached.
+
+GrblSimulator models what a streamer runs into on a real board: the
+serial receive buffer (bytes arriving when it is full are dropped and
+counted, as on the real thing), the planner's motion blocks (a full
+planner stops GRBL reading the next line, so its ok is held back), a
+per-line processing delay, the realtime ? / ! / ~ / Ctrl-X commands, and
+injected error:N and ALARM:N responses. A move takes its distance / feed
+times time_scale seconds; the default 0 executes instantly, leaving the
+link as the only bottleneck.
+
+It is reachable the three ways open_grbl() connects:
+
+    python benchmarks/fake_grbl.py --pty           # prints /dev/pts/N
+    python benchmarks/fake_grbl.py --ws 8081       # ws://127.0.0.1:8081
+    python benchmarks/fake_grbl.py --esp3d 8080    # 127.0.0.1:8081, HTTP on 8080
+
+and --stream job.gcode times a job through each of them. Standard library
+only; the pty needs a Unix host."""
+
+import argparse
+import base64
+import hashlib
+import math
+import os
+import queue
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BANNER = "Grbl 1.1h ['$' for help]"
+
+# $$ of a stock CNC 3018
+GRBL_SETTINGS = {
+    0: "10", 1: "25", 2: "0", 3: "5", 4: "0", 5: "0", 6: "0", 10: "1",
+    11: "0.010", 12: "0.002", 13: "0", 20: "0", 21: "0", 22: "0", 23: "0",
+    24: "25.000", 25: "500.000", 26: "250", 27: "1.000", 30: "10000", 31: "0",
+    32: "0", 100: "800.000", 101: "800.000", 102: "800.000", 110: "500.000",
+    111: "500.000", 112: "500.000", 120: "10.000", 121: "10.000", 122: "10.000",
+    130: "300.000", 131: "180.000", 132: "45.000",
+}
+
+# G-code GRBL only executes once the planner has emptied
+_SYNC_RE = re.compile(r"M\d|G4(?!\d)|G10|G28|G30|G92")
+_WORD_RE = re.compile(r"([A-Z])([-+]?(?:\d+\.?\d*|\.\d+))")
+
+
+class GrblSimulator:
+    """GRBL's protocol loop and planner, fed bytes by a transport.
+
+    feed(data) is the transport's write side; every response goes to
+    output(bytes) — set by the transport — one line at a time, in order.
+    errors maps a line number (counting non-blank lines received) to the
+    error code that line gets instead of ok; alarm = (line number, code)
+    raises ALARM:code on that line, after which G-code is refused with
+    error:9 until $X or $H. status_interval > 0 also pushes unsolicited
+    status reports, as a wifi board's web UI polling '?' does.
+
+    stats counts lines, oks, errors, alarms, dropped (overrun) bytes, the
+    receive buffer's and planner's peak use, and starved — how often the
+    planner ran dry mid-job (only meaningful with time_scale > 0)."""
+
+    def __init__(self, rx_buffer=128, planner_blocks=15, line_time=0.0, time_scale=0.0,
+                 status_interval=0.0, errors=None, alarm=None, homing_time=0.0):
+        self.rx_buffer = rx_buffer
+        self.planner_blocks = planner_blocks
+        self.line_time = line_time
+        self.time_scale = time_scale
+        self.status_interval = status_interval
+        self.errors = dict(errors or {})
+        self.alarm = alarm
+        self.homing_time = homing_time
+        self.settings = dict(GRBL_SETTINGS)
+        self.output = None
+        self.stats = dict(lines=0, ok=0, errors=0, alarms=0, overruns=0,
+                          rx_peak=0, planner_peak=0, starved=0)
+        self.state = "Idle"
+        self.position = [0.0, 0.0, 0.0]
+        self._cond = threading.Condition()
+        self._rx = bytearray()
+        self._planner = deque()  # seconds each queued block takes
+        self._executed = 0
+        self._hold = False
+        self._generation = 0  # bumped by a soft reset: abandons waits in progress
+        self._modal = {"motion": 0, "absolute": True, "feed": 0.0}
+        self._out = queue.Queue()
+        self._running = False
+
+    # -- transport side ------------------------------------------------------
+
+    def start(self):
+        self._running = True
+        for fn in (self._protocol_loop, self._motion_loop, self._output_loop):
+            threading.Thread(target=fn, daemon=True).start()
+        if self.status_interval > 0:
+            threading.Thread(target=self._status_loop, daemon=True).start()
+        self._send(BANNER)
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._out.put(None)
+
+    def feed(self, data):
+        """Bytes from the host. Realtime commands act at once; everything
+        else queues in the receive buffer, or is lost if that is full."""
+        with self._cond:
+            for byte in data:
+                if byte == ord("?"):
+                    self._send(self._status())
+                elif byte == ord("!"):
+                    self._hold = True
+                elif byte == ord("~"):
+                    self._hold = False
+                elif byte == 0x18:
+                    self._reset()
+                elif len(self._rx) >= self.rx_buffer:
+                    self.stats["overruns"] += 1
+                else:
+                    self._rx.append(byte)
+            self.stats["rx_peak"] = max(self.stats["rx_peak"], len(self._rx))
+            self._cond.notify_all()
+
+    # -- GRBL side -----------------------------------------------------------
+
+    def _send(self, line):
+        self._out.put((line + "\r\n").encode("ascii"))
+
+    def _output_loop(self):
+        while True:
+            data = self._out.get()
+            if data is None:
+                return
+            if self.output:
+                try:
+                    self.output(data)
+                except OSError:
+                    pass  # the host went away mid-reply
+
+    def _status(self):
+        state = "Hold:0" if self._hold and self._planner else self.state
+        x, y, z = self.position
+        return (f"<{state}|MPos:{x:.3f},{y:.3f},{z:.3f}"
+                f"|Bf:{self.planner_blocks - len(self._planner)},"
+                f"{self.rx_buffer - len(self._rx)}|FS:{self._modal['feed']:.0f},0>")
+
+    def _status_loop(self):
+        while self._running:
+            time.sleep(self.status_interval)
+            with self._cond:
+                self._send(self._status())
+
+    def _reset(self):
+        # Called with the lock held. Motion cut short loses position: GRBL
+        # locks out with ALARM:3 until it is unlocked or homed
+        if self._planner and self.state != "Alarm":
+            self.state = "Alarm"
+            self.stats["alarms"] += 1
+            self._send("ALARM:3")
+        self._rx.clear()
+        self._planner.clear()
+        self._hold = False
+        self._generation += 1
+        self._cond.notify_all()
+        self._send("")
+        self._send(BANNER)
+
+    def _protocol_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not re.search(rb"[\r\n]", self._rx):
+                    self._cond.wait()
+                if not self._running:
+                    return
+                end = re.search(rb"[\r\n]", self._rx).start()
+                line = self._rx[:end].decode("latin-1")
+                del self._rx[:end + 1]
+                generation = self._generation
+                self._cond.notify_all()
+            if self.line_time:
+                time.sleep(self.line_time)
+            reply = self._execute(line, generation)
+            if reply is not None:
+                with self._cond:
+                    if generation == self._generation:
+                        self._reply(reply)
+
+    def _reply(self, reply):
+        if reply == "ok":
+            self.stats["ok"] += 1
+        else:
+            self.stats["errors"] += 1
+        self._send(reply)
+
+    def _execute(self, line, generation):
+        """Run one line; returns its response (None: no response owed)."""
+        cmd = re.sub(r"\([^)]*\)|;.*", "", line).replace(" ", "").upper()
+        if not cmd:
+            return "ok"
+        with self._cond:
+            self.stats["lines"] += 1
+            number = self.stats["lines"]
+            if self.alarm and number == self.alarm[0]:
+                self.state = "Alarm"
+                self.stats["alarms"] += 1
+                self._planner.clear()
+                self._send(f"ALARM:{self.alarm[1]}")
+                return None
+        if number in self.errors:
+            return f"error:{self.errors[number]}"
+        if cmd.startswith("$"):
+            return self._system(cmd, generation)
+        if self.state == "Alarm":
+            return "error:9"
+        return self._gcode(cmd, generation)
+
+    def _system(self, cmd, generation):
+        if cmd == "$$":
+            for number, value in sorted(self.settings.items()):
+                self._send(f"${number}={value}")
+            return "ok"
+        if cmd == "$X":
+            self.state = "Idle"
+            self._send("[MSG:Caution: Unlocked]")
+            return "ok"
+        if cmd == "$H":
+            time.sleep(self.homing_time)
+            self.position = [0.0, 0.0, 0.0]
+            self.state = "Idle"
+            return "ok"
+        if cmd == "$I":
+            self._send("[VER:1.1h.20190825:]")
+            self._send(f"[OPT:V,{self.planner_blocks},{self.rx_buffer}]")
+            return "ok"
+        if cmd == "$G":
+            self._send("[GC:G0 G54 G17 G21 G90 G94 M5 M9 T0 F0 S0]")
+            return "ok"
+        if cmd.startswith("$J="):
+            if self.state == "Alarm":
+                return "error:9"
+            return self._gcode(cmd[3:], generation)
+        m = re.fullmatch(r"\$(\d+)=(-?\d+\.?\d*)", cmd)
+        if m:
+            if int(m.group(1)) not in self.settings:
+                return "error:3"
+            self.settings[int(m.group(1))] = m.group(2)
+            return "ok"
+        return "error:3"
+
+    def _gcode(self, cmd, generation):
+        words = _WORD_RE.findall(cmd)
+        if "".join(letter + value for letter, value in words) != cmd:
+            return "error:1"
+        if _SYNC_RE.search(cmd) and not self._wait(lambda: not self._planner, generation):
+            return None
+        modal, target, moved, dwell = self._modal, list(self.position), False, None
+        for letter, value in words:
+            value = float(value)
+            if letter == "G" and value in (0, 1, 2, 3):
+                modal["motion"] = int(value)
+            elif letter == "G" and value in (90, 91):
+                modal["absolute"] = value == 90
+            elif letter == "G" and value == 4:
+                dwell = 0.0
+            elif letter == "F":
+                modal["feed"] = value
+            elif letter == "P" and dwell is not None:
+                dwell = value
+            elif letter in "XYZ":
+                axis = "XYZ".index(letter)
+                target[axis] = value if modal["absolute"] else target[axis] + value
+                moved = True
+        if dwell is not None:
+            time.sleep(dwell * self.time_scale)
+        elif moved:
+            # Arcs are timed by their chord: close enough for a link benchmark
+            rate = float(self.settings[110]) if modal["motion"] == 0 else modal["feed"]
+            if modal["motion"] and rate <= 0:
+                return "error:22"  # undefined feed rate
+            seconds = math.dist(self.position, target) / rate * 60 * self.time_scale
+            if not self._wait(lambda: len(self._planner) < self.planner_blocks, generation):
+                return None
+            with self._cond:
+                if self.time_scale and self._executed and not self._planner:
+                    self.stats["starved"] += 1
+                self._planner.append(seconds)
+                self.stats["planner_peak"] = max(self.stats["planner_peak"], len(self._planner))
+                self.position = target
+                self._cond.notify_all()
+        return "ok"
+
+    def _wait(self, ready, generation):
+        """Block until ready() (planner space, or an empty planner for a
+        synchronising command); False if a soft reset abandoned the line."""
+        with self._cond:
+            while self._running and generation == self._generation and not ready():
+                self._cond.wait()
+            return self._running and generation == self._generation
+
+    def _motion_loop(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._planner or self._hold):
+                    self._cond.wait()
+                if not self._running:
+                    return
+                seconds = self._planner[0]
+                generation = self._generation
+                if self.state != "Alarm":
+                    self.state = "Run"
+            if seconds:
+                time.sleep(seconds)
+            with self._cond:
+                if generation == self._generation and self._planner:
+                    self._planner.popleft()
+                    self._executed += 1
+                if not self._planner and self.state == "Run":
+                    self.state = "Idle"
+                self._cond.notify_all()
+
+
+# ---------------------------------------------------------------------------
+# Transports
+# ---------------------------------------------------------------------------
+
+class PtyPort:
+    """The simulator behind a pseudo-terminal: open `path` as a serial port
+    (pyserial, or open_grbl(path, 115200)). Unix only."""
+
+    def __init__(self, sim):
+        import pty
+        import tty
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)  # no echo or line editing before the host sets it up
+        self.path = os.ttyname(self.slave)
+        self.sim = sim
+        sim.output = self._write
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def _write(self, data):
+        while data:
+            data = data[os.write(self.master, data):]
+
+    def _read_loop(self):
+        while True:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not data:
+                return
+            self.sim.feed(data)
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _ws_frame(payload, opcode=0x1):
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 1 << 16:
+        header += bytes([126]) + struct.pack(">H", len(payload))
+    else:
+        header += bytes([127]) + struct.pack(">Q", len(payload))
+    return header + payload
+
+
+def _recv_exact(sock, n):
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("websocket closed")
+        data += chunk
+    return data
+
+
+class WebSocketServer:
+    """ws://127.0.0.1:port carrying GRBL's line protocol both ways, as
+    FluidNC and similar wifi firmware do. With esp3d=True it behaves like
+    an ESP3D board's port 81 instead: clients are greeted with
+    CURRENT_ID / ACTIVE_ID frames, sent PING frames every ping_interval
+    seconds, and anything they send is ignored."""
+
+    def __init__(self, sim, port=0, esp3d=False, ping_interval=0.0):
+        self.sim = sim
+        self.esp3d = esp3d
+        self.ping_interval = ping_interval
+        self.sock = socket.create_server(("127.0.0.1", port))
+        self.port = self.sock.getsockname()[1]
+        self.url = f"ws://127.0.0.1:{self.port}"
+        self.clients = []
+        self.lock = threading.Lock()
+        sim.output = self.broadcast
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        if esp3d and ping_interval > 0:
+            threading.Thread(target=self._ping_loop, daemon=True).start()
+
+    def broadcast(self, data, opcode=0x1):
+        frame = _ws_frame(data, opcode)
+        with self.lock:
+            for client in list(self.clients):
+                try:
+                    client.sendall(frame)
+                except OSError:
+                    self.clients.remove(client)
+
+    def _ping_loop(self):
+        while self.sock.fileno() != -1:
+            time.sleep(self.ping_interval)
+            self.broadcast(f"PING:{int(self.ping_interval * 1000)}".encode())
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            # One small frame per reply line: without this, Nagle holds each
+            # ok back until the previous one is acknowledged
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        try:
+            request = b""
+            while b"\r\n\r\n" not in request:
+                chunk = client.recv(4096)
+                if not chunk:
+                    return
+                request += chunk
+            key = re.search(rb"Sec-WebSocket-Key:\s*(\S+)", request, re.IGNORECASE)
+            if not key:
+                client.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                return
+            accept = base64.b64encode(
+                hashlib.sha1(key.group(1) + _WS_GUID.encode()).digest()).decode()
+            client.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                            "Connection: Upgrade\r\n"
+                            f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+            with self.lock:
+                if self.esp3d:
+                    client.sendall(_ws_frame(b"CURRENT_ID:0") + _ws_frame(b"ACTIVE_ID:0"))
+                self.clients.append(client)
+            while True:
+                opcode, payload = self._read_frame(client)
+                if opcode == 0x8:  # close
+                    client.sendall(_ws_frame(payload[:2], 0x8))
+                    return
+                if opcode == 0x9:  # ping
+                    with self.lock:
+                        client.sendall(_ws_frame(payload, 0xA))
+                elif opcode in (0x0, 0x1, 0x2) and not self.esp3d:
+                    self.sim.feed(payload)
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            with self.lock:
+                if client in self.clients:
+                    self.clients.remove(client)
+            client.close()
+
+    @staticmethod
+    def _read_frame(client):
+        first, second = _recv_exact(client, 2)
+        length = second & 0x7F
+        if length == 126:
+            (length,) = struct.unpack(">H", _recv_exact(client, 2))
+        elif length == 127:
+            (length,) = struct.unpack(">Q", _recv_exact(client, 8))
+        mask = _recv_exact(client, 4) if second & 0x80 else b"\0\0\0\0"
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(_recv_exact(client, length)))
+        return first & 0x0F, payload
+
+    def close(self):
+        self.sock.close()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients.clear()
+
+
+class ESP3DServer:
+    """An ESP3D-style wifi board: GET /command?plain=<cmd> on the HTTP port
+    feeds the simulator, and GRBL's output goes to websocket clients on the
+    next port up (80 and 81 on a real board). Connect with the websocket
+    address, e.g. open_grbl("127.0.0.1:8081", 115200)."""
+
+    def __init__(self, sim, port=0, ping_interval=10.0):
+        sim_feed = sim.feed
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                plain = urllib.parse.parse_qs(url.query).get("plain")
+                if url.path != "/command" or not plain:
+                    self.send_error(404)
+                    return
+                sim_feed(plain[0].encode("latin-1") + b"\n")
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        while True:
+            self.http = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+            self.port = self.http.server_address[1]
+            try:
+                self.ws = WebSocketServer(sim, self.port + 1, esp3d=True,
+                                          ping_interval=ping_interval)
+                break
+            except OSError:
+                self.http.server_close()
+                if port:
+                    raise
+        self.target = f"127.0.0.1:{self.ws.port}"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.http.shutdown()
+        self.http.server_close()
+        self.ws.close()
+
+
+# ---------------------------------------------------------------------------
+# Throughput
+# ---------------------------------------------------------------------------
+
+def stream_throughput(target, lines, rx_buffer=128, baud=115200):
+    """Stream lines to target through open_grbl/stream_gcode and return
+    (seconds, sent, errors); seconds excludes opening the link."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "GUI"))
+    import machine
+    with machine.open_grbl(target, baud) as link:
+        t = time.perf_counter()
+        sent, errors = machine.stream_gcode(link, lines, rx_buffer=rx_buffer)
+        return time.perf_counter() - t, sent, errors
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description="Run a fake GRBL 1.1 controller.")
+    where = p.add_mutually_exclusive_group()
+    where.add_argument("--pty", action="store_true", help="serve on a pseudo-terminal")
+    where.add_argument("--ws", type=int, metavar="PORT", help="serve a GRBL websocket")
+    where.add_argument("--esp3d", type=int, metavar="PORT",
+                       help="serve ESP3D-style: HTTP commands on PORT, output on PORT+1")
+    p.add_argument("--stream", metavar="GCODE",
+                   help="time streaming this file through each transport, then exit")
+    p.add_argument("--rx-buffer", type=int, default=128,
+                   help="receive buffer bytes (default: 128, as GRBL 1.1)")
+    p.add_argument("--planner", type=int, default=15,
+                   help="planner blocks (default: 15, as GRBL 1.1 on an ATmega328)")
+    p.add_argument("--line-time", type=float, default=0.0, metavar="S",
+                   help="seconds GRBL spends parsing each line (default: 0)")
+    p.add_argument("--time-scale", type=float, default=0.0,
+                   help="motion runs at this fraction of real time (default: 0, instant)")
+    p.add_argument("--status", type=float, default=0.0, metavar="S",
+                   help="push a status report every S seconds (default: never)")
+    p.add_argument("--error", action="append", default=[], metavar="LINE:CODE",
+                   help="answer line LINE with error:CODE (repeatable)")
+    p.add_argument("--alarm", metavar="LINE:CODE", help="raise ALARM:CODE at line LINE")
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    def simulator():
+        errors = dict(map(int, e.split(":")) for e in args.error)
+        alarm = tuple(map(int, args.alarm.split(":"))) if args.alarm else None
+        return GrblSimulator(rx_buffer=args.rx_buffer, planner_blocks=args.planner,
+                             line_time=args.line_time, time_scale=args.time_scale,
+                             status_interval=args.status, errors=errors,
+                             alarm=alarm).start()
+
+    if args.stream:
+        with open(args.stream, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        for name, serve in (("pty", lambda sim: PtyPort(sim)),
+                            ("websocket", lambda sim: WebSocketServer(sim)),
+                            ("esp3d", lambda sim: ESP3DServer(sim))):
+            for rx_buffer in (args.rx_buffer, 0):
+                sim = simulator()
+                server = serve(sim)
+                target = getattr(server, "path", None) or getattr(server, "target", None) \
+                    or server.url
+                seconds, sent, errors = stream_throughput(target, lines, rx_buffer)
+                mode = f"{rx_buffer}-byte buffer" if rx_buffer else "send-and-wait"
+                print(f"{name:<10} {mode:<16} {sent} lines in {seconds:.2f}s "
+                      f"({sent / seconds:.0f} lines/s), {errors} errors, "
+                      f"{sim.stats['overruns']} bytes dropped")
+                server.close()
+                sim.stop()
+        return 0
+
+    sim = simulator()
+    if args.ws is not None:
+        server = WebSocketServer(sim, args.ws)
+        print(f"fake GRBL on {server.url}")
+    elif args.esp3d is not None:
+        server = ESP3DServer(sim, args.esp3d)
+        print(f"fake ESP3D board: connect to {server.target} (HTTP on {server.port})")
+    else:
+        server = PtyPort(sim)
+        print(f"fake GRBL on {server.path}")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        sim.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
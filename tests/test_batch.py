@@ -0,0 +1,114 @@
+# Tests for the headless batch CLI (Console/batch.py).
+# Run with:  python -m unittest discover tests   (from the repo root)
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Console"))
+
+from matplotlib.font_manager import findSystemFonts
+import batch
+
+# No on-disk glyph cache unless a test sets one up: keep out of the user's own
+os.environ.setdefault("CNC_LABEL_CACHE_DIR", "")
+
+FONT = sorted(findSystemFonts(fontext="ttf"))[0]
+
+
+class ParseLabelsTests(unittest.TestCase):
+    def test_csv_uses_named_column_or_first(self):
+        text = 'qty,label\n2,PUMP 1\n1,"FAN, 3"\n1,\n'
+        self.assertEqual(batch.parse_labels(text, "csv"), ["PUMP 1", "FAN, 3"])
+        self.assertEqual(batch.parse_labels("A1\nB2\n", "csv"), ["A1", "B2"])
+
+    def test_json_strings_objects_and_wrapper(self):
+        self.assertEqual(batch.parse_labels('["A", " B ", ""]', "json"), ["A", "B"])
+        self.assertEqual(
+            batch.parse_labels('{"labels": [{"label": "X1"}, {"label": "X2"}]}', "json"),
+            ["X1", "X2"],
+        )
+
+    def test_stroke_fonts_by_name(self):
+        self.assertEqual(os.path.basename(batch.resolve_font("simplex")), "font_simplex.json")
+        self.assertEqual(batch.resolve_font("font_simplex"), batch.resolve_font("simplex"))
+
+    def test_format_guess(self):
+        self.assertEqual(batch.guess_format("tags.CSV", ""), "csv")
+        self.assertEqual(batch.guess_format("-", ' [ "A" ]'), "json")
+        self.assertEqual(batch.guess_format("-", "A\nB"), "txt")
+
+
+class BatchRunTests(unittest.TestCase):
+    def run_cli(self, *argv):
+        with contextlib.redirect_stderr(io.StringIO()):
+            return batch.main(list(argv))
+
+    def test_per_file_split_writes_numbered_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "tags.txt")
+            with open(src, "w") as f:
+                f.write("T1\nT2\nT3\n")
+            out = os.path.join(tmp, "out", "tags.gcode")
+            self.assertEqual(self.run_cli(src, "--font", FONT, "-o", out, "--per-file", "2"), 0)
+            self.assertEqual(sorted(os.listdir(os.path.dirname(out))),
+                             ["tags_001.gcode", "tags_002.gcode"])
+            with open(os.path.join(tmp, "out", "tags_002.gcode")) as f:
+                text = f.read()
+            self.assertIn("(Label: T3)", text)
+            self.assertNotIn("(Label: T1)", text)
+            self.assertTrue(text.rstrip().endswith("M2 ; end program"))
+
+    def test_empty_input_fails(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "empty.txt")
+            open(src, "w").close()
+            self.assertEqual(self.run_cli(src, "--font", FONT, "-o", os.path.join(tmp, "x")), 1)
+
+    def test_named_settings_file_must_exist_and_parse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "tags.txt")
+            with open(src, "w") as f:
+                f.write("T1\n")
+            corrupt = os.path.join(tmp, "corrupt.json")
+            with open(corrupt, "w") as f:
+                f.write("{\"cut_depth\": ")
+            out = os.path.join(tmp, "tags.gcode")
+            for settings in (os.path.join(tmp, "mistyped.json"), corrupt):
+                with self.subTest(settings=os.path.basename(settings)):
+                    with contextlib.redirect_stderr(io.StringIO()) as err:
+                        code = batch.main([src, "--font", FONT, "-o", out, "--settings", settings])
+                    self.assertEqual(code, 2)
+                    self.assertIn(f"cannot read settings {settings}", err.getvalue())
+                    self.assertFalse(os.path.exists(out))
+
+    def test_unknown_font_fails(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "tags.txt")
+            with open(src, "w") as f:
+                f.write("T1\n")
+            out = os.path.join(tmp, "tags.gcode")
+            with contextlib.redirect_stderr(io.StringIO()) as err:
+                code = batch.main([src, "--font", "No Such Font 123", "-o", out])
+            self.assertEqual(code, 2)
+            self.assertIn("font not found: 'No Such Font 123'", err.getvalue())
+            self.assertFalse(os.path.exists(out))
+
+    def test_per_file_must_not_be_negative(self):
+        for value in ("-1", "two"):
+            with self.subTest(value=value):
+                with contextlib.redirect_stderr(io.StringIO()) as err:
+                    with self.assertRaises(SystemExit) as cm:
+                        batch.build_parser().parse_args(["tags.txt", "--font", FONT,
+                                                         "--per-file", value])
+                self.assertEqual(cm.exception.code, 2)
+                self.assertIn("--per-file", err.getvalue())
+        self.assertEqual(batch.build_parser().parse_args(
+            ["tags.txt", "--font", FONT, "--per-file", "0"]).per_file, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
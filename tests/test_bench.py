@@ -0,0 +1,51 @@
+# Smoke test for the benchmark runner (benchmarks/bench.py) on a tiny corpus.
+# Run with:  python -m unittest discover tests   (from the repo root)
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+import bench
+
+
+class BenchTests(unittest.TestCase):
+    def test_results_round_trip_and_compare(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "bench.json")
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(bench.main(["--sizes", "2", "--fonts", "1", "--repeat", "1",
+                                             "--only", "/short/", "-o", out]), 0)
+            with open(out) as f:
+                run = json.load(f)
+            names = {r["name"] for r in run["results"]}
+            self.assertEqual(names, {"text_geometry", "build_layout", "hatch_fill",
+                                     "generate_gcode_lines", "simulate_gcode", "stream_gcode"})
+            self.assertEqual({r["text"] for r in run["results"]}, {"short"})
+            self.assertTrue(all(r["best"] > 0 for r in run["results"]))
+
+            slower = dict(run, results=[dict(r, best=r["best"] * 2) for r in run["results"]])
+            with open(os.path.join(tmp, "slower.json"), "w") as f:
+                json.dump(slower, f)
+            with contextlib.redirect_stdout(io.StringIO()) as table, \
+                    contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(bench.main(["--compare", out, out]), 0)
+                self.assertEqual(bench.main(["--compare", out, f.name]), 1)
+            self.assertIn("slower", table.getvalue())
+
+    def test_fake_grbl_catches_buffer_overruns(self):
+        grbl = bench.FakeGrbl(rx_buffer=16)
+        grbl.write(b"G1 X1.000 Y2\n")
+        with self.assertRaises(OverflowError):
+            grbl.write(b"G1 X3.000\n")
+        self.assertEqual(grbl.readline(), b"ok\n")
+        grbl.write(b"G1 X3.000 Y4.000 Z5.000\n")  # alone, a long line still goes
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+# The machine link against the fake GRBL controller (benchmarks/fake_grbl.py)
+# over each transport open_grbl() supports.
+# Run with:  python -m unittest discover tests   (from the repo root)
+
+import os
+import sys
+import threading
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "GUI"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fake_grbl
+import machine
+
+try:
+    import serial  # noqa: F401  (pyserial: the pty is opened as a serial port)
+except ImportError:
+    serial = None
+try:
+    import websocket  # noqa: F401
+except ImportError:
+    websocket = None
+
+
+class SimulatorTests(unittest.TestCase):
+    def test_a_full_receive_buffer_drops_bytes(self):
+        sim = fake_grbl.GrblSimulator(rx_buffer=128)
+        sim.feed(b"G1 X1" * 40)  # 200 bytes, no newline: nothing is consumed
+        self.assertEqual((sim.stats["rx_peak"], sim.stats["overruns"]), (128, 72))
+
+    def test_errors_alarms_and_unlock(self):
+        sim = fake_grbl.GrblSimulator(errors={2: 20}, alarm=(3, 1))
+        replies, count = [], threading.Semaphore(0)
+        sim.output = lambda data: (replies.append(data.decode().strip()), count.release())
+        sim.start()
+        self.addCleanup(sim.stop)
+
+        def answers(data, n):
+            sim.feed(data)
+            for _ in range(n):
+                self.assertTrue(count.acquire(timeout=5))
+            return replies[-n:]
+
+        self.assertEqual(answers(b"G0 X1\nM7\nG1 X2 F100\nG0 X3\n$X\nG0 X3\n", 8), [
+            "Grbl 1.1h ['$' for help]", "ok", "error:20", "ALARM:1", "error:9",
+            "[MSG:Caution: Unlocked]", "ok", "ok",
+        ])
+        self.assertRegex(answers(b"?", 1)[0], r"^<(Idle|Run)\|MPos:3\.000,0\.000,0\.000\|")
+
+
+@unittest.skipUnless(serial and hasattr(os, "openpty"), "needs pyserial and a pty")
+class PtyTests(unittest.TestCase):
+    def test_character_counting_keeps_buffer_and_planner_full(self):
+        sim = fake_grbl.GrblSimulator(time_scale=0.2, errors={57: 20}).start()
+        port = fake_grbl.PtyPort(sim)
+        self.addCleanup(sim.stop)
+        self.addCleanup(port.close)
+        lines = [f"G1 X{i % 2}.000 F6000" for i in range(300)]
+        with machine.open_grbl(port.path, 115200) as link:
+            self.assertEqual(machine.stream_gcode(link, lines, rx_buffer=128), (300, 1))
+            self.assertTrue(machine.query_status(link).startswith("<Run|"))
+        self.assertEqual(sim.stats["overruns"], 0)
+        # 16-byte lines: eight fill the buffer, but whether the controller
+        # has parsed one of them before the eighth lands is up to the scheduler
+        self.assertGreaterEqual(sim.stats["rx_peak"], 128 - 2 * 16)
+        self.assertEqual(sim.stats["planner_peak"], 15)
+
+
+@unittest.skipUnless(websocket, "needs websocket-client")
+class WebSocketTests(unittest.TestCase):
+    def test_stream_stops_at_an_alarm(self):
+        sim = fake_grbl.GrblSimulator(alarm=(40, 2)).start()
+        server = fake_grbl.WebSocketServer(sim)
+        self.addCleanup(sim.stop)
+        self.addCleanup(server.close)
+        lines = [f"G0 X{i}.000" for i in range(100)]
+        with machine.open_grbl(server.url, 115200) as link:
+            sent, errors = machine.stream_gcode(link, lines, rx_buffer=128)
+        self.assertEqual((sent, errors), (39, 1))
+        self.assertEqual(sim.state, "Alarm")
+
+    def test_esp3d_board_is_detected_and_reads_settings(self):
+        sim = fake_grbl.GrblSimulator().start()
+        board = fake_grbl.ESP3DServer(sim)
+        self.addCleanup(sim.stop)
+        self.addCleanup(board.close)
+        expected = dict(fake_grbl.GRBL_SETTINGS)
+        for target in (f"ws://{board.target}", board.target):
+            with machine.open_grbl(target, 115200) as link:
+                self.assertIsInstance(link, machine.ESP3DLink)
+                self.assertEqual(machine.read_grbl_settings(link), expected)
+                self.assertEqual(machine.stream_gcode(link, ["G0 X1", "G1 X2 F100"]), (2, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,40 @@
 # Golden/behaviour tests for the G-code generation core.
 # Run with:  python -m unittest discover tests   (from the repo root)
 
+import io
+import json
 import math
 import os
+import queue
+import random
 import re
 import sys
+import tempfile
+import threading
+import time
 import unittest
+import urllib.request
+from unittest import mock
 
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "GUI"))
 
-from matplotlib.font_manager import findSystemFonts
+from matplotlib.font_manager import FontProperties, findSystemFonts
+from matplotlib.textpath import TextPath
+from shapely.geometry import LineString, Polygon
+import shapely
+import shapely.affinity
+
 import create_gui as app
+import gcode
+import geometry
+import machine
+
+# No on-disk glyph cache unless a test sets one up: keep out of the user's own
+os.environ.setdefault("CNC_LABEL_CACHE_DIR", "")
 
 FONT = sorted(findSystemFonts(fontext="ttf"))[0]
 
-SETTINGS = dict(app.DEFAULT_SETTINGS)
+SETTINGS = dict(gcode.DEFAULT_SETTINGS)
 SETTINGS.update({"material_width": 300, "material_height": 200})
 
 
@@ -38,20 +58,40 @@ def z_values(lines):
 
 class TextGeometryTests(unittest.TestCase):
     def test_counters_become_holes(self):
-        geom = app.text_geometry("O", FONT, 10)
-        holes = sum(len(p.interiors) for p in app.geom_polygons(geom))
+        geom = geometry.text_geometry("O", FONT, 10)
+        holes = sum(len(p.interiors) for p in geometry.geom_polygons(geom))
         self.assertGreaterEqual(holes, 1, "the counter of 'O' must be a hole")
 
     def test_cap_height_scaling(self):
-        geom = app.text_geometry("X", FONT, 10)
+        geom = geometry.text_geometry("X", FONT, 10)
         _, _, _, maxy = geom.bounds
         self.assertAlmostEqual(maxy, 10.0, delta=0.1)
 
+    def test_glyph_assembly_matches_whole_string_textpath(self):
+        label = "AVATAR Wo 42"
+        tp = TextPath(
+            (0, 0), label, prop=FontProperties(fname=FONT, size=geometry.FONT_RENDER_SIZE)
+        )
+        ref = geometry.rings_to_geometry(tp.to_polygons())
+        scale = 10 / geometry.cap_height(FONT)
+        ref = shapely.affinity.scale(ref, scale, scale, origin=(0, 0))
+        minx, miny, _, _ = ref.bounds
+        ref = shapely.affinity.translate(ref, -minx, -miny)
+        geom = geometry.text_geometry(label, FONT, 10)
+        self.assertLess(geom.symmetric_difference(ref).area, 1e-9 * ref.area)
+
+    def test_repeated_characters_share_cached_glyphs(self):
+        geometry._glyph_cache.clear()
+        geometry.text_geometry("ABBA", FONT, 7)
+        self.assertEqual(len(geometry._glyph_cache), 2)
+        geometry.text_geometry("BAAB AB", FONT, 9)
+        self.assertEqual(len(geometry._glyph_cache), 3, "only the space is new")
+
     def test_hatch_skips_holes(self):
-        geom = app.text_geometry("O", FONT, 10)
+        geom = geometry.text_geometry("O", FONT, 10)
         _, miny, _, maxy = geom.bounds
         mid = (miny + maxy) / 2
-        lines = app.hatch_fill(geom, 0.24)
+        lines = geometry.hatch_fill(geom, 0.24)
         near_mid = [l for l in lines if abs(l[0][1] - mid) < 0.5]
         # At mid-height an 'O' is two strokes: left wall and right wall
         rows = {}
@@ -62,10 +102,179 @@ class TextGeometryTests(unittest.TestCase):
             "hatch at the middle of 'O' should split around the counter",
         )
 
+    def test_hatch_matches_shapely_clipping(self):
+        # Reference: clip each scanline with shapely, as hatch_fill used to
+        geom = geometry.text_geometry("Hello, 80%", FONT, 10)
+        minx, miny, maxx, maxy = geom.bounds
+        expected = []
+        y = miny + 0.37 / 2
+        while y < maxy:
+            seg = geom.intersection(LineString([(minx - 1, y), (maxx + 1, y)]))
+            for g in getattr(seg, "geoms", [seg]):
+                if g.geom_type == "LineString" and g.length > 1e-9:
+                    coords = list(g.coords)
+                    expected.append((coords[0], coords[-1]))
+            y += 0.37
+        lines = geometry.hatch_fill(geom, 0.37)
+        self.assertEqual(len(lines), len(expected))
+        for got, want in zip(lines, expected):
+            for (gx, gy), (wx, wy) in zip(got, want):
+                self.assertAlmostEqual(gx, wx, places=9)
+                self.assertEqual(gy, wy)
+
+
+class DiskCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = os.environ.get("CNC_LABEL_CACHE_DIR")
+        os.environ["CNC_LABEL_CACHE_DIR"] = self.tmp.name
+        self.new_run()
+
+    def tearDown(self):
+        if self.saved is None:
+            del os.environ["CNC_LABEL_CACHE_DIR"]
+        else:
+            os.environ["CNC_LABEL_CACHE_DIR"] = self.saved
+        self.new_run()
+        self.tmp.cleanup()
+
+    def new_run(self):
+        """Forget everything held in memory, as a fresh process would."""
+        for cache in (geometry._glyph_stores, geometry._glyph_cache, geometry._text_geom_cache,
+                      geometry._cap_height_cache):
+            cache.clear()
+
+    def test_second_run_starts_warm(self):
+        first = geometry.text_geometry("TAG-0042 ø", FONT, 8)
+        geometry.flush_glyph_stores()
+        self.new_run()
+        # Laid out again, but every outline comes off the disk
+        with mock.patch.object(geometry, "rings_to_geometry", side_effect=AssertionError), \
+                mock.patch("matplotlib.textpath.TextPath", side_effect=AssertionError):
+            self.assertTrue(geometry.text_geometry("TAG-0042 ø", FONT, 8).equals_exact(first, 0))
+            self.assertIsNotNone(geometry.text_geometry("GAT-2400", FONT, 8))
+
+    def store_path(self):
+        (store,) = os.listdir(os.path.join(self.tmp.name, "glyphs"))
+        return os.path.join(self.tmp.name, "glyphs", store)
+
+    def test_layout_writes_nothing_until_flushed_and_then_only_glyphs(self):
+        geometry.build_layout(["SN-0001", "SN-0002"], FONT, 8, 10, 2, 300, 200)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "glyphs")))
+        geometry.flush_glyph_stores()
+        geometry.build_layout(["SN-0012", "XY"], FONT, 8, 10, 2, 300, 200)
+        geometry.flush_glyph_stores()
+        with open(os.path.join(self.store_path(), geometry.INDEX_FILE)) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 2)  # one appended per flush, never rewritten
+        self.assertEqual([sorted(line) for line in lines], [["cap_height", "glyphs"]] * 2)
+        self.assertEqual(len(lines[1]["glyphs"]), 2)  # just X and Y were new
+
+    def test_writers_sharing_a_store_keep_each_others_glyphs(self):
+        path = os.path.join(self.tmp.name, "shared")
+        a, b = geometry.GlyphStore(path), geometry.GlyphStore(path)
+        a.put_glyph("a", Polygon([(0, 0), (1, 0), (0, 1)]))
+        b.put_glyph("b", Polygon([(0, 0), (2, 0), (0, 2)]))
+        a.flush()
+        b.flush()
+        store = geometry.GlyphStore(path)
+        self.assertEqual(store.glyph("a")[1].area, 0.5)
+        self.assertEqual(store.glyph("b")[1].area, 2.0)
+
+    def test_live_store_over_its_cap_is_compacted_not_deleted(self):
+        geometry.text_geometry("ABCDEFGH", FONT, 8)
+        geometry.flush_glyph_stores()
+        path = self.store_path()
+        size = os.path.getsize(os.path.join(path, "data.bin"))
+        self.new_run()
+        with mock.patch.object(geometry, "DISK_CACHE_MAX_BYTES", size * 3 // 4):
+            store = geometry.glyph_store(FONT)
+        self.assertLessEqual(os.path.getsize(os.path.join(path, "data.bin")), size * 3 // 8)
+        kept = list(store.index["glyphs"])
+        self.assertTrue(0 < len(kept) < 8)
+        self.assertTrue(all(store.glyph(glyph_id)[0] for glyph_id in kept))
+        self.assertEqual(geometry.GlyphStore(path).index["glyphs"], store.index["glyphs"])
+
+    def test_pool_worker_stores_only_read(self):
+        geometry.text_geometry("AB", FONT, 8)
+        geometry.flush_glyph_stores()
+        index = os.path.join(self.store_path(), geometry.INDEX_FILE)
+        before = os.stat(index)
+        other = os.path.join(self.tmp.name, "glyphs", "other")
+        os.makedirs(other)
+        with open(os.path.join(other, "data.bin"), "wb") as f:
+            f.write(b"\0" * 64)
+        self.new_run()
+        self.addCleanup(setattr, geometry, "_stores_read_only", False)
+        geometry._init_pool_worker()
+        with mock.patch.object(geometry, "DISK_CACHE_MAX_BYTES", 1), \
+                mock.patch.object(geometry.GlyphStore, "compact", side_effect=AssertionError):
+            self.assertIsNotNone(geometry.text_geometry("ABC", FONT, 8))
+            geometry.flush_glyph_stores()
+        self.assertTrue(os.path.exists(other))
+        after = os.stat(index)
+        self.assertEqual((after.st_size, after.st_mtime_ns), (before.st_size, before.st_mtime_ns))
+
+    def test_damaged_records_are_misses(self):
+        first = geometry.text_geometry("O8", FONT, 8)
+        geometry.flush_glyph_stores()
+        data = os.path.join(self.store_path(), "data.bin")
+        size = os.path.getsize(data)
+        with open(data, "wb") as f:
+            f.write(b"\0" * size)
+        self.new_run()
+        self.assertTrue(geometry.text_geometry("O8", FONT, 8).equals_exact(first, 0))
+
+    def test_stores_are_bounded_least_recently_used_first(self):
+        other = sorted(findSystemFonts(fontext="ttf"))[1]
+        geometry.text_geometry("AB", FONT, 8)
+        geometry.flush_glyph_stores()
+        root = os.path.join(self.tmp.name, "glyphs")
+        (first,) = os.listdir(root)
+        with mock.patch.object(geometry, "DISK_CACHE_MAX_BYTES", 1):
+            geometry.text_geometry("AB", other, 8)
+            geometry.flush_glyph_stores()
+        self.assertEqual(len(os.listdir(root)), 1)
+        self.assertNotIn(first, os.listdir(root))
+
+
+class FontIndexTests(unittest.TestCase):
+    PATHS = sorted(findSystemFonts(fontext="ttf"))
+
+    def test_only_new_or_changed_fonts_are_probed(self):
+        index, changed = geometry.refresh_font_index({}, self.PATHS)
+        self.assertTrue(changed)
+        self.assertEqual(sorted(index), self.PATHS)
+        with mock.patch.object(geometry, "probe_font", side_effect=AssertionError):
+            self.assertEqual(geometry.refresh_font_index(index, self.PATHS), (index, False))
+        stale = dict(index)
+        stale[self.PATHS[0]] = [0, 0, "Old Name", True]
+        stale["/gone/Removed.ttf"] = [0, 0, "Removed", True]
+        probed = []
+        real = geometry.probe_font
+        with mock.patch.object(geometry, "probe_font",
+                               side_effect=lambda p: probed.append(p) or real(p)):
+            fresh, changed = geometry.refresh_font_index(stale, self.PATHS)
+        self.assertTrue(changed)
+        self.assertEqual((probed, fresh), ([self.PATHS[0]], index))
+
+    def test_saved_index_round_trips_and_prefers_regular_style(self):
+        index, _ = geometry.refresh_font_index({}, self.PATHS)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fonts.json")
+            geometry.save_font_index(index, path)
+            self.assertEqual(geometry.load_font_index(path), index)
+        fonts = geometry.index_fonts({
+            "/f/Sans-Bold.ttf": [1, 1, "Sans", False],
+            "/f/Sans.ttf": [1, 1, "Sans", True],
+            "/f/broken.ttf": [1, 1, None, False],
+        })
+        self.assertEqual(fonts, {"Sans": "/f/Sans.ttf"})
+
 
 class LabelSizeTests(unittest.TestCase):
     def test_fixed_size_cutout_and_centering(self):
-        layout = app.build_layout(["AB"], FONT, 8, 10, 2, 300, 200, label_size=(60, 20))
+        layout = geometry.build_layout(["AB"], FONT, 8, 10, 2, 300, 200, label_size=(60, 20))
         item = layout[0]
         x0, y0, x1, y1 = item["cutout"]
         self.assertAlmostEqual(x1 - x0, 60)
@@ -76,11 +285,11 @@ class LabelSizeTests(unittest.TestCase):
         self.assertAlmostEqual(item["y_top"] - y0, y1 - (item["y_top"] + item["height"]), places=6)
 
     def test_too_small_label_flagged(self):
-        layout = app.build_layout(["MUCH TOO LONG"], FONT, 8, 10, 2, 300, 200, label_size=(20, 10))
+        layout = geometry.build_layout(["MUCH TOO LONG"], FONT, 8, 10, 2, 300, 200, label_size=(20, 10))
         self.assertFalse(layout[0]["fits"])
 
     def test_auto_size_still_fits_text(self):
-        layout = app.build_layout(["AB"], FONT, 8, 10, 2, 300, 200)
+        layout = geometry.build_layout(["AB"], FONT, 8, 10, 2, 300, 200)
         item = layout[0]
         x0, y0, x1, y1 = item["cutout"]
         self.assertAlmostEqual(x1 - x0, item["width"] + 4)
@@ -88,14 +297,202 @@ class LabelSizeTests(unittest.TestCase):
         self.assertTrue(item["fits"])
 
 
+class StrokeFontTests(unittest.TestCase):
+    STROKE = geometry.stroke_font_choices()["simplex (single line)"]
+
+    def layout(self, labels, **kw):
+        return geometry.build_layout(labels, self.STROKE, 8, 10, 2, 300, 200, **kw)
+
+    def test_geometry_is_centrelines_at_cap_height(self):
+        geom = geometry.text_geometry("HI", self.STROKE, 8)
+        self.assertEqual(geom.geom_type, "MultiLineString")
+        minx, miny, _, maxy = geom.bounds
+        self.assertEqual((minx, miny), (0, 0))
+        self.assertAlmostEqual(maxy, 8)
+        self.assertEqual(list(geometry.geom_rings(geom)), [])
+        self.assertIsNone(geometry.text_geometry("   ", self.STROKE, 8))
+
+    def test_label_size_and_cutout_as_for_truetype(self):
+        item = self.layout(["AB"], label_size=(60, 20))[0]
+        x0, y0, x1, y1 = item["cutout"]
+        self.assertEqual((x1 - x0, y1 - y0), (60, 20))
+        self.assertTrue(item["fits"])
+        self.assertAlmostEqual(item["x"] - x0, x1 - (item["x"] + item["width"]), places=6)
+        self.assertFalse(self.layout(["MUCH TOO LONG"], label_size=(20, 10))[0]["fits"])
+
+    def test_engraved_once_along_each_stroke_even_when_filled(self):
+        layout = self.layout(["TAG 7"])
+        settings = dict(SETTINGS, text_cut_depth=0.2, pass_depth=0.2)
+        outline = gcode.generate_gcode_lines(layout, settings, fill_text=False)
+        self.assertEqual(gcode.generate_gcode_lines(layout, settings, fill_text=True), outline)
+        start, end = outline.index("(Label: TAG 7)"), outline.index("(Cutout for label: TAG 7)")
+        engrave = outline[start:end]
+        strokes = list(geometry.geom_lines(layout[0]["geom"]))
+        self.assertEqual(sum(line.startswith("G1 Z") for line in engrave), len(strokes))
+        self.assertEqual(sum(line.startswith("G1 X") for line in engrave),
+                         sum(len(line) - 1 for line in strokes))
+
+
+class BatchGeometryTests(unittest.TestCase):
+    def setUp(self):
+        geometry._text_geom_cache.clear()
+        self.addCleanup(geometry._text_geom_cache.clear)
+
+    def test_pool_renders_each_distinct_label_as_serial_does(self):
+        labels = [f"Tag {i}" for i in range(40)] * 2 + ["", "O&A"]
+        serial = geometry.batch_text_geometry(labels, FONT, 8, workers=1)
+        geometry._text_geom_cache.clear()
+        self.addCleanup(geometry.shutdown_geometry_pool)
+        done = []
+        with mock.patch.object(geometry, "PARALLEL_MIN_LABELS", 1), \
+                mock.patch.object(geometry, "PARALLEL_CHUNK_LABELS", 8), \
+                mock.patch.object(geometry, "text_geometry", side_effect=AssertionError):
+            pooled = geometry.batch_text_geometry(
+                labels, FONT, 8, workers=2, progress=lambda n, total: done.append((n, total)))
+        self.assertEqual(list(pooled), list(serial))
+        self.assertIsNone(pooled[""])
+        for label, geom in serial.items():
+            if geom is not None:
+                self.assertEqual(shapely.to_wkb(pooled[label]), shapely.to_wkb(geom), label)
+        self.assertEqual(done[-1], (42, 42))
+
+    def test_workers_hand_new_outlines_back_instead_of_writing_the_store(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(os.environ, {"CNC_LABEL_CACHE_DIR": tmp}), \
+                mock.patch.object(geometry, "PARALLEL_MIN_LABELS", 1), \
+                mock.patch.object(geometry, "PARALLEL_CHUNK_LABELS", 4):
+            geometry.shutdown_geometry_pool()  # so the workers see this cache
+            self.addCleanup(geometry.shutdown_geometry_pool)
+            for cache in (geometry._glyph_stores, geometry._glyph_cache):
+                cache.clear()
+                self.addCleanup(cache.clear)
+            geometry.batch_text_geometry([f"AB{i}" for i in range(16)], FONT, 8, workers=2)
+            (store,) = os.listdir(os.path.join(tmp, "glyphs"))
+            index = os.path.join(tmp, "glyphs", store, geometry.INDEX_FILE)
+            with open(index) as f:
+                (before,) = [json.loads(line) for line in f]
+            # Only the cap height, written before the pool started: the
+            # workers' outlines wait for the main process's flush
+            self.assertEqual(before["glyphs"], {})
+            self.assertIsNotNone(before["cap_height"])
+            geometry.flush_glyph_stores()
+            with open(index) as f:
+                _, after = [json.loads(line) for line in f]
+            self.assertEqual(len(after["glyphs"]), 12)  # A, B and ten digits
+
+    def test_a_pool_that_failed_is_not_started_again(self):
+        self.addCleanup(setattr, geometry, "_pool_failed", False)
+        labels = [f"Tag {i}" for i in range(4)]
+        with mock.patch.object(geometry, "PARALLEL_MIN_LABELS", 1), \
+                mock.patch.object(geometry, "_geometry_pool", side_effect=OSError) as pool:
+            first = geometry.batch_text_geometry(labels, FONT, 8, workers=2)
+            geometry._text_geom_cache.clear()
+            second = geometry.batch_text_geometry(labels, FONT, 8, workers=2)
+        self.assertEqual(pool.call_count, 1)
+        self.assertEqual(list(first), labels)
+        self.assertEqual([shapely.to_wkb(g) for g in second.values()],
+                         [shapely.to_wkb(g) for g in first.values()])
+
+    def test_repeated_labels_are_rendered_once_and_share_geometry(self):
+        real = geometry.text_geometry
+        with mock.patch.object(geometry, "text_geometry", side_effect=real) as render:
+            layout = geometry.build_layout(["A1", "B2", "A1"], FONT, 8, 10, 2, 300, 200,
+                                           workers=1)
+        self.assertEqual(sorted(call.args[0] for call in render.call_args_list), ["A1", "B2"])
+        a, b = [item for item in layout if item["label"] == "A1"]
+        self.assertIs(a["geom"], b["geom"])
+        self.assertNotEqual(a["cutout"], b["cutout"])
+
+
+class PackingTests(unittest.TestCase):
+    def test_fills_rows_then_spills_onto_new_sheets(self):
+        # 300x200 sheet, 60x20 labels 10 mm apart: 4 per row, 6 rows = 24
+        labels = [f"T{i}" for i in range(30)]
+        r = 0.15
+        layout = geometry.build_layout(labels, FONT, 8, 10, 2, 300, 200,
+                                  label_size=(60, 20), margin=r)
+        self.assertEqual(len(layout), 30)
+        sheets = geometry.sheet_layouts(layout)
+        self.assertEqual([len(s) for s in sheets], [24, 6])
+        for sheet in sheets:
+            boxes = [item["cutout"] for item in sheet]
+            for x0, y0, x1, y1 in boxes:
+                self.assertGreaterEqual(x0, r - 1e-9)
+                self.assertLessEqual(x1, 300 - r + 1e-9)
+                self.assertGreaterEqual(y0, r - 1e-9)
+                self.assertLessEqual(y1, 200 - r + 1e-9)
+            for i, a in enumerate(boxes):
+                for b in boxes[i + 1:]:
+                    apart = (a[2] + 10 <= b[0] + 1e-9 or b[2] + 10 <= a[0] + 1e-9
+                             or a[3] + 10 <= b[1] + 1e-9 or b[3] + 10 <= a[1] + 1e-9)
+                    self.assertTrue(apart, f"{a} and {b} closer than the spacing")
+
+    def test_first_label_at_work_origin_and_cut_order(self):
+        layout = geometry.build_layout(["A", "B", "C"], FONT, 8, 10, 2, 300, 200,
+                                  label_size=(60, 20), margin=0.15)
+        self.assertEqual([item["sheet"] for item in layout], [0, 0, 0])
+        x0, _, _, y1 = layout[0]["cutout"]
+        self.assertAlmostEqual(x0, 0.15)
+        self.assertAlmostEqual(y1, 200 - 0.15)
+        xs = [item["cutout"][0] for item in layout]
+        self.assertEqual(xs, sorted(xs), "one row, cut left to right")
+
+    def test_spacing_never_below_two_kerf_radii(self):
+        layout = geometry.build_layout(["A", "B"], FONT, 8, 0, 2, 300, 200,
+                                  label_size=(60, 20), margin=0.5)
+        self.assertAlmostEqual(layout[1]["cutout"][0] - layout[0]["cutout"][2], 1.0)
+
+    def test_oversized_label_gets_own_sheet(self):
+        layout = geometry.build_layout(["A", "B"], FONT, 8, 10, 2, 50, 50,
+                                  label_size=(40, 60))
+        self.assertEqual(len(geometry.sheet_layouts(layout)), 2)
+
+    @staticmethod
+    def first_fit(sizes, width, height, gap):
+        """Plain first-fit shelf packing, every sheet and shelf scanned."""
+        sheets, placed = [], [None] * len(sizes)
+        for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+            w, h = sizes[i]
+            spot = None
+            for sheet, shelves in enumerate(sheets):
+                spot = next(((sheet, s) for s in shelves if s[2] + w <= width + 1e-9), None)
+                y = shelves[-1][0] + shelves[-1][1] + gap
+                if spot is None and y + h <= height + 1e-9 and w <= width + 1e-9:
+                    shelves.append([y, h, 0.0])
+                    spot = (sheet, shelves[-1])
+                if spot:
+                    break
+            if spot is None:
+                sheets.append([[0.0, h, 0.0]])
+                spot = (len(sheets) - 1, sheets[-1][0])
+            sheet, shelf = spot
+            placed[i] = (sheet, shelf[2], shelf[0])
+            shelf[2] = shelf[2] + w + gap
+        return placed
+
+    def test_same_places_as_scanning_every_sheet(self):
+        rnd = random.Random(5)
+        for _ in range(20):
+            sizes = [(rnd.uniform(5, 320), rnd.uniform(3, 220)) for _ in range(200)]
+            self.assertEqual(geometry.pack_labels(sizes, 300, 200, 4),
+                             self.first_fit(sizes, 300, 200, 4))
+
+    def test_ten_thousand_labels_pack_in_linear_time(self):
+        # Scanning every earlier sheet took 4.2 s here; the tree takes ~0.2 s
+        start = time.perf_counter()
+        placed = geometry.pack_labels([(60, 20)] * 10000, 300, 200, 10)
+        self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertEqual(max(sheet for sheet, _, _ in placed), 10000 // 28)  # 4 x 7 a sheet
+
+
 class KerfTests(unittest.TestCase):
     def test_spindle_toolpath_offset_by_tool_radius(self):
         s = dict(SETTINGS, tab_width=0.0, tab_height=0.0)
-        layout = app.build_layout(
+        layout = geometry.build_layout(
             ["AB"], FONT, 8, 10, s["cutout_padding"], s["material_width"],
             s["material_height"], label_size=(60, 20),
         )
-        g = app.generate_gcode_lines(layout, s, fill_text=False)
+        g = gcode.generate_gcode_lines(layout, s, fill_text=False)
         x0, _, x1, _ = layout[0]["cutout"]
         r = s["tool_diameter"] / 2
         xs = [x for x, _ in xy_moves(g)]
@@ -103,13 +500,13 @@ class KerfTests(unittest.TestCase):
         self.assertAlmostEqual(min(xs), x0 - r, places=3)
 
     def test_work_origin_offset_shifts_all_moves(self):
-        layout = app.build_layout(
+        layout = geometry.build_layout(
             ["AB"], FONT, 8, 10, SETTINGS["cutout_padding"], SETTINGS["material_width"],
             SETTINGS["material_height"],
         )
-        base = xy_moves(app.generate_gcode_lines(layout, SETTINGS, fill_text=False))
+        base = xy_moves(gcode.generate_gcode_lines(layout, SETTINGS, fill_text=False))
         s = dict(SETTINGS, offset_x=25.0, offset_y=-10.0)
-        shifted = xy_moves(app.generate_gcode_lines(layout, s, fill_text=False))
+        shifted = xy_moves(gcode.generate_gcode_lines(layout, s, fill_text=False))
         self.assertEqual(len(base), len(shifted))
         for (bx, by), (sx_, sy_) in zip(base, shifted):
             self.assertAlmostEqual(sx_ - bx, 25.0, places=3)
@@ -117,11 +514,11 @@ class KerfTests(unittest.TestCase):
 
     def test_laser_toolpath_offset_by_half_kerf(self):
         s = dict(SETTINGS, tool_mode="Laser", laser_kerf=0.2)
-        layout = app.build_layout(
+        layout = geometry.build_layout(
             ["AB"], FONT, 8, 10, s["cutout_padding"], s["material_width"],
             s["material_height"], label_size=(60, 20),
         )
-        g = app.generate_gcode_lines(layout, s, fill_text=False)
+        g = gcode.generate_gcode_lines(layout, s, fill_text=False)
         x0, _, x1, _ = layout[0]["cutout"]
         xs = [x for x, _ in xy_moves(g)]
         self.assertAlmostEqual(max(xs), x1 + 0.1, places=3)
@@ -130,21 +527,21 @@ class KerfTests(unittest.TestCase):
 
 class GcodeTests(unittest.TestCase):
     def layout(self, labels=("TEST",), font_height=10, margin=0.0):
-        return app.build_layout(
+        return geometry.build_layout(
             list(labels), FONT, font_height, 10,
             SETTINGS["cutout_padding"], SETTINGS["material_width"],
             SETTINGS["material_height"], margin=margin,
         )
 
     def test_spindle_on_and_off(self):
-        g = app.generate_gcode_lines(self.layout(), SETTINGS, fill_text=True)
+        g = gcode.generate_gcode_lines(self.layout(), SETTINGS, fill_text=True)
         text = "\n".join(g)
         self.assertIn("M3", text)
         self.assertIn("M5", text)
         self.assertLess(text.index("M3"), text.index("G1"), "spindle must start before cutting")
 
     def test_cutout_is_multipass_and_lands_on_depth(self):
-        g = app.generate_gcode_lines(self.layout(), SETTINGS, fill_text=False)
+        g = gcode.generate_gcode_lines(self.layout(), SETTINGS, fill_text=False)
         depths = sorted({z for z in z_values(g) if z < 0})
         self.assertEqual(min(depths), -SETTINGS["label_cutout_depth"])
         n_expected = math.ceil(SETTINGS["label_cutout_depth"] / SETTINGS["pass_depth"])
@@ -153,12 +550,12 @@ class GcodeTests(unittest.TestCase):
 
     def test_uneven_pass_depth_clamps_final(self):
         s = dict(SETTINGS, label_cutout_depth=0.9, pass_depth=0.2)
-        g = app.generate_gcode_lines(self.layout(), s, fill_text=False)
+        g = gcode.generate_gcode_lines(self.layout(), s, fill_text=False)
         self.assertEqual(min(z_values(g)), -0.9)
 
     def test_moves_inside_material(self):
         # margin = kerf radius, matching how the GUI builds its layout
-        g = app.generate_gcode_lines(
+        g = gcode.generate_gcode_lines(
             self.layout(margin=SETTINGS["tool_diameter"] / 2), SETTINGS, fill_text=True
         )
         for x, y in xy_moves(g):
@@ -175,29 +572,29 @@ class GcodeTests(unittest.TestCase):
         item = layout[0]
         geom = item["geom"]
         _, miny, maxx, maxy = geom.bounds
-        top = geom.intersection(app.LineString([(-1, maxy - 0.2), (maxx + 1, maxy - 0.2)]))
-        bottom = geom.intersection(app.LineString([(-1, miny + 0.2), (maxx + 1, miny + 0.2)]))
+        top = geom.intersection(LineString([(-1, maxy - 0.2), (maxx + 1, maxy - 0.2)]))
+        bottom = geom.intersection(LineString([(-1, miny + 0.2), (maxx + 1, miny + 0.2)]))
         self.assertLess(top.length, bottom.length, "L: top row must be narrower than bottom bar")
 
     def test_job_starts_at_work_origin(self):
         # Layout margin = kerf radius, so the cutout toolpath's lowest-left
         # point lands exactly on X0 Y0
         r = SETTINGS["tool_diameter"] / 2
-        g = app.generate_gcode_lines(self.layout(margin=r), SETTINGS, fill_text=False)
+        g = gcode.generate_gcode_lines(self.layout(margin=r), SETTINGS, fill_text=False)
         moves = xy_moves(g)
         self.assertAlmostEqual(min(x for x, _ in moves), 0.0, places=3)
         self.assertAlmostEqual(min(y for _, y in moves), 0.0, places=3)
 
     def test_laser_mode_has_no_z_moves(self):
         s = dict(SETTINGS, tool_mode="Laser")
-        g = app.generate_gcode_lines(self.layout(), s, fill_text=True)
+        g = gcode.generate_gcode_lines(self.layout(), s, fill_text=True)
         text = "\n".join(g)
         self.assertIn("M4", text)
         self.assertNotIn("M3 ", text)
         self.assertEqual([z for z in z_values(g)], [], "laser mode must not move Z")
 
     def test_tabs_leave_gaps_on_final_pass(self):
-        g = app.generate_gcode_lines(self.layout(), SETTINGS, fill_text=False)
+        g = gcode.generate_gcode_lines(self.layout(), SETTINGS, fill_text=False)
         # Final cutout pass with tabs: perimeter is 8 segments -> 8 plunges to
         # full depth instead of 1
         full_depth_plunges = [
@@ -207,23 +604,238 @@ class GcodeTests(unittest.TestCase):
 
     def test_no_tabs_when_disabled(self):
         s = dict(SETTINGS, tab_width=0.0, tab_height=0.0)
-        g = app.generate_gcode_lines(self.layout(), s, fill_text=False)
+        g = gcode.generate_gcode_lines(self.layout(), s, fill_text=False)
         full_depth_plunges = [
             l for l in g if l.startswith("G1 Z-") and f"Z-{s['label_cutout_depth']:.3f}" in l
         ]
         self.assertEqual(len(full_depth_plunges), 1)
 
 
+class TravelOrderTests(unittest.TestCase):
+    def test_hatch_lines_come_out_boustrophedon(self):
+        strokes = [[(0.0, y), (10.0, y)] for y in (0.0, 1.0, 2.0, 3.0)]
+        ordered = gcode.order_strokes(strokes, (0.0, 0.0))
+        self.assertEqual(gcode.rapid_length(ordered, (0.0, 0.0)), 3.0)
+        self.assertEqual(ordered[1], [(10.0, 1.0), (0.0, 1.0)])
+
+    def test_ring_starts_nearest_tool_and_keeps_direction_when_locked(self):
+        square = [(5, 5), (6, 5), (6, 6), (5, 6), (5, 5)]
+        (ring,) = gcode.order_strokes([square], (7, 7), reverse=False)
+        self.assertEqual(ring, [(6, 6), (5, 6), (5, 5), (6, 5), (6, 6)])
+
+    def test_same_strokes_less_travel(self):
+        layout = geometry.build_layout(["PUMP 7", "gqx&%"], FONT, 10, 10, 2, 300, 200)
+        s = dict(SETTINGS, link_distance=0)
+        plain = gcode.generate_gcode_lines(
+            layout, dict(s, optimize_travel=False), fill_text=True
+        )
+        ordered = gcode.generate_gcode_lines(layout, s, fill_text=True)
+        self.assertEqual(len(plain), len(ordered))
+
+        def rapids(lines):
+            return sum(math.hypot(s[2] - s[0], s[3] - s[1])
+                       for s in gcode.simulate_gcode(lines) if s[4] == "rapid")
+
+        self.assertLess(rapids(ordered), rapids(plain) / 3)
+
+        # every cut segment is still cut, whichever way round
+        def cuts(lines):
+            return sorted(
+                tuple(sorted([(round(s[0], 3), round(s[1], 3)), (round(s[2], 3), round(s[3], 3))]))
+                + (s[4], s[5]) for s in gcode.simulate_gcode(lines) if s[4] != "rapid"
+            )
+        self.assertEqual(cuts(plain), cuts(ordered))
+
+
+class LinkMoveTests(unittest.TestCase):
+    def test_links_only_when_close_and_inside(self):
+        region = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])
+        shapely.prepare(region)
+        strokes = [[(0, 1), (10, 1)], [(10, 2), (0, 2)],  # close, inside
+                   [(0, 9), (10, 9)],                      # too far
+                   [(12, 9), (15, 9)]]                     # close, outside
+        self.assertEqual(gcode.link_moves(strokes, region, 3.0), [False, True, False, False])
+        self.assertEqual(gcode.link_moves(strokes, region, 0), [False] * 4)
+
+    def test_filled_text_stays_down_between_hatch_lines(self):
+        layout = geometry.build_layout(["OHM 8"], FONT, 10, 10, 2, 300, 200)
+        lifted = gcode.generate_gcode_lines(layout, dict(SETTINGS, link_distance=0), True)
+        linked = gcode.generate_gcode_lines(layout, SETTINGS, True)
+
+        def retracts(lines):
+            return sum(l.startswith("G0 Z") for l in lines)
+
+        self.assertLess(retracts(linked), retracts(lifted) / 3)
+        # every feed at text depth that isn't a hatch line runs inside the text
+        item = layout[0]
+        geom = shapely.affinity.translate(
+            item["geom"], item["x"], 200 - item["y_top"] - item["height"]
+        ).buffer(1e-2)
+        for x0, y0, x1, y1, kind, z in gcode.simulate_gcode(linked):
+            if kind == "engrave" and y0 != y1:
+                self.assertTrue(geom.covers(LineString([(x0, y0), (x1, y1)])))
+
+    def test_outlines_always_lift(self):
+        layout = geometry.build_layout(["OHM 8"], FONT, 10, 10, 2, 300, 200)
+        self.assertEqual(
+            gcode.generate_gcode_lines(layout, SETTINGS, False),
+            gcode.generate_gcode_lines(layout, dict(SETTINGS, link_distance=0), False),
+        )
+
+
+class ArcFitTests(unittest.TestCase):
+    def test_circle_becomes_arcs_within_tolerance(self):
+        a = [2 * math.pi * k / 64 for k in range(65)]
+        ring = [(10 + 5 * math.cos(t), 10 + 5 * math.sin(t)) for t in a]
+        moves = gcode.fit_arcs(ring, 0.01)
+        self.assertLessEqual(len(moves), 3)
+        self.assertEqual(moves[-1][:2], ring[-1])
+        x, y = ring[0]
+        for mx, my, (cx, cy, clockwise) in moves:
+            self.assertFalse(clockwise)
+            for px, py in gcode.arc_points(x, y, mx, my, cx, cy, clockwise, 0.002):
+                self.assertAlmostEqual(math.hypot(px - 10, py - 10), 5, delta=0.01)
+            x, y = mx, my
+        corners = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]
+        self.assertEqual([arc for _, _, arc in gcode.fit_arcs(corners, 0.01)], [None] * 4)
+
+    def test_simplify_drops_points_within_tolerance(self):
+        strokes = [[(0, 0), (1, 0.004), (2, 0), (2, 3)], [(0, 0), (5, 5)]]
+        self.assertEqual(gcode.simplify_strokes(strokes, 0.01),
+                         [[(0, 0), (2, 0), (2, 3)], [(0, 0), (5, 5)]])
+
+    def test_outlines_emit_fewer_lines_and_simulate_the_same(self):
+        layout = geometry.build_layout(["GO 8"], FONT, 8, 10, 2, 300, 200)
+        plain = gcode.generate_gcode_lines(layout, SETTINGS, fill_text=False)
+        settings = dict(SETTINGS, arc_tolerance=0.01, simplify_tolerance=0.005)
+        tp = gcode.build_toolpath(layout, settings, fill_text=False)
+        lines = gcode.render_gcode(tp, settings)
+        arcs = [line for line in lines if re.match(r"G[23] ", line)]
+        self.assertTrue(arcs)
+        self.assertLess(len(lines), 0.8 * len(plain))
+        # F rides on the first cutting move after each plunge, arc or not
+        for prev, line in zip(lines, lines[1:]):
+            if prev.startswith("G1 Z-"):
+                self.assertIn(" F", line)
+        sim = gcode.simulate_gcode(lines, as_array=True)
+        seg = gcode.toolpath_segments(tp, as_array=True)
+        self.assertEqual(len(sim), len(seg))
+        for col in ("x0", "y0", "x1", "y1"):
+            self.assertLess(abs(sim[col] - seg[col]).max(), 2e-3)
+        self.assertAlmostEqual(gcode.estimate_time(tp, settings)["total"],
+                               gcode.estimate_time(gcode.build_toolpath(
+                                   layout, SETTINGS, fill_text=False), SETTINGS)["total"],
+                               delta=10)
+
+
+class ToolpathIRTests(unittest.TestCase):
+    def setUp(self):
+        self.layout = geometry.build_layout(["AB", "C"], FONT, 8, 10, 2, 300, 200)
+        self.tp = gcode.build_toolpath(self.layout, SETTINGS, fill_text=True)
+
+    def test_rendered_text_is_the_exported_gcode(self):
+        self.assertEqual(gcode.render_gcode(self.tp, SETTINGS),
+                         gcode.generate_gcode_lines(self.layout, SETTINGS, True))
+
+    def test_segments_match_simulated_text(self):
+        sim = gcode.simulate_gcode(gcode.render_gcode(self.tp, SETTINGS), as_array=True)
+        seg = gcode.toolpath_segments(self.tp, as_array=True)
+        self.assertEqual(len(sim), len(seg))
+        self.assertTrue((sim["kind"] == seg["kind"]).all())
+        for col in ("x0", "y0", "x1", "y1", "z"):
+            self.assertLess(abs(sim[col] - seg[col]).max(), 1e-3)
+
+    def test_moves_know_label_kind_and_depth(self):
+        col = self.tp.columns()
+        first, second = (item["label"] for item in self.layout)
+        self.assertEqual(self.tp.labels, [first, second])
+        self.assertEqual([(k, self.tp.labels[i]) for _, i, k in self.tp.sections],
+                         [(1, first), (2, first), (1, second), (2, second)])
+        plunges = col["op"] == gcode.MOVE_PLUNGE
+        self.assertTrue((col["z"][plunges] == -col["depth"][plunges]).all())
+        cut = col["kind"] == gcode.KIND_CODES["cutout"]
+        self.assertEqual(col["depth"][cut].max(), SETTINGS["label_cutout_depth"])
+        self.assertEqual(set(col["depth"][~cut].tolist()), {SETTINGS["text_cut_depth"]})
+
+    def test_streamed_program_matches_joined_text(self):
+        lines = gcode.generate_gcode_lines(self.layout, SETTINGS, True)
+        self.assertEqual(list(gcode.iter_gcode_lines(self.layout, SETTINGS, True)), lines)
+        out = io.StringIO()
+        saved, gcode.WRITE_CHUNK_LINES = gcode.WRITE_CHUNK_LINES, 7
+        try:
+            count = gcode.write_gcode(out, gcode.iter_gcode_lines(self.layout, SETTINGS, True))
+        finally:
+            gcode.WRITE_CHUNK_LINES = saved
+        self.assertEqual(count, len(lines))
+        self.assertEqual(out.getvalue(), "\n".join(lines))
+
+    def test_sendable_line_count_without_rendering(self):
+        for mode, arcs in (("Spindle", 0.0), ("Laser", 0.0), ("Spindle", 0.02)):
+            with self.subTest(mode=mode, arc_tolerance=arcs):
+                s = dict(SETTINGS, tool_mode=mode, arc_tolerance=arcs)
+                tp = gcode.build_toolpath(self.layout, s, fill_text=False)
+                sent = machine.sendable_lines(gcode.iter_gcode(tp, s))
+                self.assertEqual(gcode.sendable_line_count(tp, s), len(sent))
+
+
+class EstimateTests(unittest.TestCase):
+    # feed 300 mm/min = 5 mm/s; GRBL's default 10 mm/s² on every axis
+    def estimate(self, moves, motion=None):
+        tp = gcode.Toolpath()
+        tp.begin("A", gcode.KIND_CODES["engrave"])
+        for op, x, y in moves:
+            tp.move(op, x, y)
+        return gcode.estimate_time(tp, SETTINGS, motion)["time"]["cut"]
+
+    def test_long_move_is_a_trapezoid_short_one_a_triangle(self):
+        F = gcode.MOVE_FEED
+        # cruise at 5 mm/s plus v/a lost getting up to speed and back down
+        self.assertAlmostEqual(self.estimate([(F, 100, 0)]), 100 / 5 + 5 / 10)
+        self.assertAlmostEqual(self.estimate([(F, 0.1, 0)]), 2 * math.sqrt(0.1 / 10))
+
+    def test_corners_slow_by_junction_deviation(self):
+        F = gcode.MOVE_FEED
+        straight = self.estimate([(F, 50, 0), (F, 100, 0)])
+        self.assertAlmostEqual(straight, self.estimate([(F, 100, 0)]))
+        corner = self.estimate([(F, 50, 0), (F, 50, 50)])
+        stop = 2 * (50 / 5 + 5 / 10)
+        self.assertTrue(straight < corner < stop)
+        sharp = {**gcode.GRBL_MOTION_DEFAULTS, 11: 0.0}
+        self.assertAlmostEqual(self.estimate([(F, 50, 0), (F, 50, 50)], sharp), stop)
+
+    def test_job_breakdown_adds_up(self):
+        layout = geometry.build_layout(["AB", "C"], FONT, 8, 10, 2, 300, 200)
+        tp = gcode.build_toolpath(layout, SETTINGS, fill_text=False)
+        est = gcode.estimate_time(tp, SETTINGS)
+        self.assertAlmostEqual(sum(est["time"].values()), est["total"])
+        self.assertAlmostEqual(sum(est["labels"]) + gcode.SPINDLE_SPINUP_S, est["total"])
+        self.assertTrue(all(t > 0 for t in est["labels"]))
+        plunge = SETTINGS["label_cutout_depth"] + SETTINGS["safe_z"]
+        self.assertGreater(est["distance"]["plunge"], 2 * plunge)
+        # Faster machine, shorter job; a job of two sheets is their sum
+        quick = dict(SETTINGS, grbl_motion={"110": 3000, "111": 3000, "120": 200})
+        self.assertLess(gcode.estimate_time(tp, quick)["total"], est["total"])
+        self.assertAlmostEqual(gcode.sum_estimates([est, est])["total"], 2 * est["total"])
+
+    def test_motion_settings_from_dump(self):
+        values = machine.parse_grbl_settings(MachineLinkTests.GRBL_DUMP)
+        motion = gcode.grbl_motion({"grbl_motion": {str(k): v for k, v in values.items()}})
+        self.assertEqual((motion[110], motion[120]), (1000.0, 50.0))
+        self.assertEqual(motion[11], gcode.GRBL_MOTION_DEFAULTS[11])
+        self.assertEqual(gcode.format_duration(3725), "1h 02m")
+        self.assertEqual(gcode.format_duration(245), "4m 05s")
+
+
 class DryRunTests(unittest.TestCase):
     def _layout(self):
-        return app.build_layout(
+        return geometry.build_layout(
             ["AB", "CD"], FONT, 8, 10, SETTINGS["cutout_padding"],
             SETTINGS["material_width"], SETTINGS["material_height"],
             margin=SETTINGS["tool_diameter"] / 2,
         )
 
     def test_spindle_dry_run_safe_z_spindle_off(self):
-        g = app.generate_dry_run_lines(self._layout(), SETTINGS)
+        g = gcode.generate_dry_run_lines(self._layout(), SETTINGS)
         text = "\n".join(g)
         self.assertNotIn("M3", text)
         self.assertNotIn("M4", text)
@@ -231,7 +843,7 @@ class DryRunTests(unittest.TestCase):
 
     def test_laser_dry_run_no_power_no_z(self):
         s = dict(SETTINGS, tool_mode="Laser")
-        g = app.generate_dry_run_lines(self._layout(), s)
+        g = gcode.generate_dry_run_lines(self._layout(), s)
         text = "\n".join(g)
         self.assertNotIn("M3", text, "dry run must never power the tool")
         self.assertNotIn("M4", text, "dry run must never power the tool")
@@ -240,8 +852,8 @@ class DryRunTests(unittest.TestCase):
 
     def test_dry_run_bounds_match_job_bounds(self):
         layout = self._layout()
-        job = xy_moves(app.generate_gcode_lines(layout, SETTINGS, fill_text=False))
-        dry = xy_moves(app.generate_dry_run_lines(layout, SETTINGS))
+        job = xy_moves(gcode.generate_gcode_lines(layout, SETTINGS, fill_text=False))
+        dry = xy_moves(gcode.generate_dry_run_lines(layout, SETTINGS))
         for axis in (0, 1):
             self.assertAlmostEqual(min(m[axis] for m in job), min(m[axis] for m in dry), places=3)
             self.assertAlmostEqual(max(m[axis] for m in job), max(m[axis] for m in dry), places=3)
@@ -249,13 +861,13 @@ class DryRunTests(unittest.TestCase):
 
 class SimulateTests(unittest.TestCase):
     def setUp(self):
-        self.layout = app.build_layout(
+        self.layout = geometry.build_layout(
             ["AB"], FONT, 8, 10, SETTINGS["cutout_padding"],
             SETTINGS["material_width"], SETTINGS["material_height"],
             margin=SETTINGS["tool_diameter"] / 2,
         )
-        self.gcode = app.generate_gcode_lines(self.layout, SETTINGS, fill_text=False)
-        self.segs = app.simulate_gcode(self.gcode)
+        self.gcode = gcode.generate_gcode_lines(self.layout, SETTINGS, fill_text=False)
+        self.segs = gcode.simulate_gcode(self.gcode)
 
     def test_all_kinds_present(self):
         kinds = {s[4] for s in self.segs}
@@ -278,6 +890,118 @@ class SimulateTests(unittest.TestCase):
         engrave_zs = {s[5] for s in self.segs if s[4] == "engrave"}
         self.assertEqual(engrave_zs, {-SETTINGS["text_cut_depth"]})
 
+    def test_array_form_matches_tuples(self):
+        arr = gcode.simulate_gcode(self.gcode, as_array=True)
+        self.assertEqual(arr.dtype, gcode.SEGMENT_DTYPE)
+        self.assertEqual(
+            [(a, b, c, d, gcode.SEGMENT_KINDS[k], z) for a, b, c, d, k, z in arr.tolist()],
+            self.segs,
+        )
+        engrave = arr[arr["kind"] == gcode.KIND_CODES["engrave"]]
+        self.assertTrue((engrave["z"] == -SETTINGS["text_cut_depth"]).all())
+        self.assertEqual(list(gcode.toolpath_runs(arr)), list(gcode.toolpath_runs(self.segs)))
+
+    def test_tokenizer_handles_comments_and_packed_words(self):
+        self.assertEqual(gcode.gcode_words("G1 X2 Y-3.5 F300 ; cut"),
+                         [("G", 1), ("X", 2), ("Y", -3.5), ("F", 300)])
+        self.assertEqual(gcode.gcode_words("g1x.5 (note X9) y2"),
+                         [("G", 1), ("X", 0.5), ("Y", 2)])
+        segs = gcode.simulate_gcode(["G21 ; mm", "G0 X1 Y1", "G1X2Y1 F100",
+                                   "G01 X2 Y3 (Label: X7)", "G4 P2"])
+        self.assertEqual([s[:4] for s in segs], [(0, 0, 1, 1), (1, 1, 2, 1), (2, 1, 2, 3)])
+        self.assertEqual([s[4] for s in segs], ["rapid", "engrave", "engrave"])
+
+    def test_toolpath_runs_join_contiguous_moves(self):
+        runs = list(gcode.toolpath_runs(self.segs))
+        self.assertLess(len(runs), len(self.segs) / 3)
+        # each run redraws exactly the segments it replaced
+        replayed = []
+        for kind, z, pts in runs:
+            for i in range(0, len(pts) - 2, 2):
+                replayed.append((*pts[i:i + 4], kind, z))
+        self.assertEqual(replayed, self.segs)
+
+
+class ComputeWorkerTests(unittest.TestCase):
+    def setUp(self):
+        self.posted = queue.Queue()
+        self.worker = app.ComputeWorker(self.posted.put)
+
+    def run_posted(self, until):
+        while not until():
+            self.posted.get(timeout=10)()
+
+    def test_newer_job_replaces_running_one(self):
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def slow(progress):
+            started.set()
+            release.wait(10)
+            progress(1, 2)  # raises: a newer job was submitted meanwhile
+            return "old"
+
+        self.worker.submit("preview", slow, results.append)
+        started.wait(10)
+        self.worker.submit("preview", lambda progress: "new", results.append)
+        release.set()
+        self.run_posted(lambda: results)
+        self.assertEqual(results, ["new"])
+
+    def test_stale_result_is_dropped_on_delivery(self):
+        results = []
+        self.worker.submit("export", lambda progress: 1, results.append)
+        # let the result get posted, then supersede it before it is handled
+        callback = self.posted.get(timeout=10)
+        self.worker.cancel("export")
+        callback()
+        self.assertEqual(results, [])
+
+    def test_errors_and_progress_come_back_through_post(self):
+        seen, errors = [], []
+
+        def failing(progress):
+            progress(3, 7)
+            raise ValueError("bad font")
+
+        self.worker.submit("x", failing, seen.append, errors.append,
+                           lambda done, total: seen.append((done, total)))
+        self.run_posted(lambda: errors)
+        self.assertEqual(seen, [(3, 7)])
+        self.assertEqual(str(errors[0]), "bad font")
+
+    def test_build_layout_reports_progress(self):
+        calls = []
+        geometry.build_layout(["A", "B", "C"], FONT, 8, 10, 2, 300, 200,
+                         progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(calls, [(0, 3), (1, 3), (2, 3)])
+
+
+class DebouncerTests(unittest.TestCase):
+    class FakeTk:
+        def __init__(self):
+            self.timers, self.next_id = {}, 0
+
+        def after(self, ms, fn):
+            self.next_id += 1
+            self.timers[self.next_id] = fn
+            return self.next_id
+
+        def after_cancel(self, timer):
+            del self.timers[timer]
+
+    def test_burst_runs_once(self):
+        tk, calls = self.FakeTk(), []
+        debounced = app.Debouncer(tk, 150, lambda: calls.append(1))
+        for _ in range(20):
+            debounced("<KeyRelease>")
+        self.assertEqual(len(tk.timers), 1)
+        for timer in list(tk.timers):
+            tk.timers.pop(timer)()
+        self.assertEqual(calls, [1])
+        debounced()
+        self.assertEqual(len(tk.timers), 1, "a new burst schedules again")
+
 
 class MachineLinkTests(unittest.TestCase):
     # Excerpt of a real $$ dump + status chatter from a CNC 3018 console log
@@ -299,7 +1023,7 @@ $J=G91 G21 F1500 Y-50
 ok""".splitlines()
 
     def test_parse_grbl_settings(self):
-        settings = app.parse_grbl_settings(self.GRBL_DUMP)
+        settings = machine.parse_grbl_settings(self.GRBL_DUMP)
         self.assertEqual(settings[130], "298.000")
         self.assertEqual(settings[0], "10")
         self.assertEqual(len(settings), 11, "status/jog/ok lines must be ignored")
@@ -313,7 +1037,7 @@ ok""".splitlines()
             "M2 ; end program",
         ]
         self.assertEqual(
-            app.sendable_lines(lines), ["G21", "G1 X5.000 Y0.000 F300", "M2"]
+            machine.sendable_lines(lines), ["G21", "G1 X5.000 Y0.000 F300", "M2"]
         )
 
     def test_await_ok_ignores_status_chatter(self):
@@ -324,24 +1048,81 @@ ok""".splitlines()
             def readline(self):
                 return (self.responses.pop(0) + "\n").encode() if self.responses else b""
 
-        self.assertIsNone(app.await_ok(FakeSerial([
+        self.assertIsNone(machine.await_ok(FakeSerial([
             "<Idle|WPos:2.000,168.000,0.000|FS:0,0|PS:100|PF:100>",
             "[MSG:...]",
             "ok",
         ])))
-        self.assertEqual(app.await_ok(FakeSerial(["error:3"])), "error:3")
+        self.assertEqual(machine.await_ok(FakeSerial(["error:3"])), "error:3")
         with self.assertRaises(TimeoutError):
-            app.await_ok(FakeSerial([]), timeout_s=0.2)
+            machine.await_ok(FakeSerial([]), timeout_s=0.2)
         # Quiet reads while buffered motion executes (e.g. waiting on M5's
         # planner sync) must be tolerated, not treated as a dead link
-        self.assertIsNone(app.await_ok(FakeSerial(["", "", "", "ok"]), timeout_s=2))
+        self.assertIsNone(machine.await_ok(FakeSerial(["", "", "", "ok"]), timeout_s=2))
+
+    def test_char_counting_stream_fills_buffer_and_matches_errors(self):
+        class FakeGrbl:
+            """Answers the oldest buffered line on each read; rejects one."""
+
+            def __init__(self, rx_size, bad):
+                self.rx_size, self.bad = rx_size, bad
+                self.rx = []
+                self.peak = 0
+
+            def write(self, data):
+                self.rx.append(data.decode().strip())
+                self.peak = max(self.peak, sum(len(c) + 1 for c in self.rx))
+
+            def readline(self):
+                if not self.rx:
+                    return b""
+                cmd = self.rx.pop(0)
+                return b"error:20\n" if cmd == self.bad else b"ok\n"
+
+        lines = [f"G1 X{i}.000 Y0.000" for i in range(200)]
+        grbl = FakeGrbl(128, bad="G1 X57.000 Y0.000")
+        progress = []
+        sent, errors = machine.stream_gcode(
+            grbl, lines, rx_buffer=128, on_progress=lambda i, n: progress.append(i)
+        )
+        self.assertEqual((sent, errors), (200, 1))
+        self.assertEqual(progress, list(range(1, 201)))
+        self.assertLessEqual(grbl.peak, 128, "must never overrun GRBL's RX buffer")
+        self.assertGreater(grbl.peak, 100, "buffer should be kept nearly full")
+
+        # A generator streams the same way when the total is given up front
+        grbl = FakeGrbl(128, bad=None)
+        progress = []
+        sent, errors = machine.stream_gcode(
+            grbl, iter(lines), rx_buffer=128, total=len(lines),
+            on_progress=lambda i, n: progress.append((i, n)),
+        )
+        self.assertEqual((sent, errors), (200, 0))
+        self.assertEqual(progress[-1], (200, 200))
+
+    def test_char_counting_stream_stops_on_alarm(self):
+        class AlarmingGrbl:
+            def __init__(self):
+                self.written = []
+
+            def write(self, data):
+                self.written.append(data)
+
+            def readline(self):
+                return b"ok\n" if len(self.written) < 3 else b"ALARM:1\n"
+
+        sent, errors = machine.stream_gcode(
+            AlarmingGrbl(), ["G0 X1", "G0 X2", "G0 X3", "G0 X4"], rx_buffer=128
+        )
+        self.assertEqual(errors, 1)
+        self.assertLess(sent, 4)
 
     def test_link_kind_classification(self):
-        self.assertEqual(app.link_kind("COM3"), "serial")
-        self.assertEqual(app.link_kind("/dev/ttyUSB0"), "serial")
-        self.assertEqual(app.link_kind("192.168.1.207"), "esp3d")
-        self.assertEqual(app.link_kind("http://192.168.1.207"), "esp3d")
-        self.assertEqual(app.link_kind("ws://192.168.1.207:81"), "ws")
+        self.assertEqual(machine.link_kind("COM3"), "serial")
+        self.assertEqual(machine.link_kind("/dev/ttyUSB0"), "serial")
+        self.assertEqual(machine.link_kind("192.168.1.207"), "esp3d")
+        self.assertEqual(machine.link_kind("http://192.168.1.207"), "esp3d")
+        self.assertEqual(machine.link_kind("ws://192.168.1.207:81"), "ws")
 
     def test_home_machine_waits_through_slow_cycle(self):
         class FakeSerial:
@@ -356,30 +1137,30 @@ ok""".splitlines()
                 return (self.responses.pop(0) + "\n").encode() if self.responses else b""
 
         ok_ser = FakeSerial(["", "", "<Home|MPos:0,0,0>", "ok"])
-        self.assertIsNone(app.home_machine(ok_ser, timeout_s=2))
+        self.assertIsNone(machine.home_machine(ok_ser, timeout_s=2))
         self.assertEqual(ok_ser.written, [b"$H\n"])
 
         alarm = FakeSerial(["ALARM:8"])
-        self.assertEqual(app.home_machine(alarm, timeout_s=2), "ALARM:8")
+        self.assertEqual(machine.home_machine(alarm, timeout_s=2), "ALARM:8")
 
         with self.assertRaises(TimeoutError):
-            app.home_machine(FakeSerial([]), timeout_s=0.2)
+            machine.home_machine(FakeSerial([]), timeout_s=0.2)
 
     def test_normalize_target_forgives_missing_slashes(self):
         self.assertEqual(
-            app.normalize_target("ws:192.168.1.207:81"), "ws://192.168.1.207:81"
+            machine.normalize_target("ws:192.168.1.207:81"), "ws://192.168.1.207:81"
         )
         self.assertEqual(
-            app.normalize_target("ws:/192.168.1.207:81"), "ws://192.168.1.207:81"
+            machine.normalize_target("ws:/192.168.1.207:81"), "ws://192.168.1.207:81"
         )
         self.assertEqual(
-            app.normalize_target(" WS://192.168.1.207:81 "), "ws://192.168.1.207:81"
+            machine.normalize_target(" WS://192.168.1.207:81 "), "ws://192.168.1.207:81"
         )
-        self.assertEqual(app.normalize_target("COM5"), "COM5")
-        self.assertEqual(app.normalize_target("192.168.1.207"), "192.168.1.207")
+        self.assertEqual(machine.normalize_target("COM5"), "COM5")
+        self.assertEqual(machine.normalize_target("192.168.1.207"), "192.168.1.207")
 
     def test_esp3d_write_sends_http_commands(self):
-        link = object.__new__(app.ESP3DLink)
+        link = object.__new__(machine.ESP3DLink)
         link.host = "192.168.1.207"
         link.timeout = 5
         urls = []
@@ -388,21 +1169,21 @@ ok""".splitlines()
             def read(self):
                 return b""
 
-        original = app.urllib.request.urlopen
-        app.urllib.request.urlopen = lambda url, timeout: urls.append(url) or FakeResponse()
+        original = urllib.request.urlopen
+        urllib.request.urlopen = lambda url, timeout: urls.append(url) or FakeResponse()
         try:
             link.write(b"$$\n")
             link.write("G1 X5 Y0 F300\n")
             link.write(b"\r\n\r\n")  # wake noise: no commands, no requests
         finally:
-            app.urllib.request.urlopen = original
+            urllib.request.urlopen = original
         self.assertEqual(urls, [
             "http://192.168.1.207/command?plain=%24%24",
             "http://192.168.1.207/command?plain=G1%20X5%20Y0%20F300",
         ])
 
     def test_websocket_readline_reassembles_frames(self):
-        link = object.__new__(app.WebSocketLink)
+        link = object.__new__(machine.WebSocketLink)
         link.buffer = b""
         link.timeout = 5
 
@@ -424,7 +1205,7 @@ ok""".splitlines()
     def test_websocket_drops_esp3d_control_frames(self):
         # Seen on the live machine: a newline-less PING frame arriving right
         # before 'ok' must not corrupt it into 'PING:0ok'
-        link = object.__new__(app.WebSocketLink)
+        link = object.__new__(machine.WebSocketLink)
         link.buffer = b""
         link.timeout = 5
 
@@ -0,0 +1,65 @@
+# Import-time budget for each layer of GUI/: what a host that needs only that
+# layer pays at startup. Every import is measured in a fresh interpreter.
+# Run with:  python -m unittest discover tests   (from the repo root)
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+GUI = os.path.join(ROOT, "GUI")
+CONSOLE = os.path.join(ROOT, "Console")
+
+HEAVY = ("numpy", "shapely", "matplotlib", "tkinter")
+
+# layer: (import budget in seconds, heavy modules it may load). Measured at
+# ~0.02 s for machine and ~0.2 s for the rest; the slack is for slow CI.
+LAYERS = {
+    "machine": (0.25, ()),
+    "geometry": (1.0, ("numpy", "shapely")),
+    "strokefont": (1.0, ("numpy",)),
+    "gcode": (1.0, ("numpy", "shapely")),
+    "create_gui": (1.0, ("numpy", "shapely")),
+    "batch": (1.0, ("numpy", "shapely")),
+    "create": (1.0, ("numpy",)),
+}
+
+PROBE = """
+import json, sys, time
+sys.path[:0] = {paths!r}
+t = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - t
+{then}
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module, then="", env=None):
+    """Import module in a fresh interpreter: {"seconds", "heavy"}."""
+    code = PROBE.format(paths=[GUI, CONSOLE], module=module, then=then, heavy=HEAVY)
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True,
+                         text=True, env=env).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+class ImportBudgetTests(unittest.TestCase):
+    def test_layers_stay_within_budget(self):
+        for module, (budget, allowed) in LAYERS.items():
+            with self.subTest(module=module):
+                result = probe(module)
+                self.assertLessEqual(set(result["heavy"]), set(allowed))
+                self.assertLess(result["seconds"], budget)
+
+    def test_streaming_host_loads_nothing_heavy(self):
+        # Only the import is timed, inside the child, against the layer's
+        # budget: interpreter start-up is the host's, not ours
+        result = probe("machine", "machine.sendable_lines(['G0 X1 ; rapid', '(note)'])")
+        self.assertEqual(result["heavy"], [])
+        self.assertLess(result["seconds"], LAYERS["machine"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
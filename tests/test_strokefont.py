@@ -0,0 +1,181 @@
+# Tests for the compiled stroke font (GUI/strokefont.py) and the console grid
+# generator built on it (Console/create.py).
+# Run with:  python -m unittest discover tests   (from the repo root)
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "GUI"))
+sys.path.insert(0, os.path.join(ROOT, "Console"))
+
+import create
+import strokefont
+
+import numpy as np
+
+
+def engraved(gcode):
+    """{frozenset of two (x, y) strings}: every segment cut below Z0."""
+    segments, pos, down = set(), None, False
+    for line in gcode.splitlines():
+        words = dict((w[0], w[1:]) for w in line.split()[1:] if w[0] in "XYZ")
+        if "Z" in words:
+            down = float(words["Z"]) < 0
+        elif "X" in words:
+            if down and line.startswith("G1"):
+                segments.add(frozenset((pos, (words["X"], words["Y"]))))
+            pos = (words["X"], words["Y"])
+    return segments
+
+
+class ChainTests(unittest.TestCase):
+    def test_segments_sharing_endpoints_become_one_polyline(self):
+        square = [[[0, 0], [0, 10]], [[10, 10], [10, 0]], [[0, 10], [10, 10]],
+                  [[10, 0], [0, 0]]]
+        self.assertEqual(len(strokefont.chain_segments(square)), 1)
+
+    def test_a_branch_needs_a_second_polyline(self):
+        # A "T": the stem meets the bar mid-way, so one pen-up is unavoidable
+        tee = [[[0, 10], [5, 10]], [[5, 10], [10, 10]], [[5, 10], [5, 0]]]
+        lines = strokefont.chain_segments(tee)
+        self.assertEqual(sorted(len(line) for line in lines), [2, 3])
+
+    def test_every_glyph_keeps_every_segment(self):
+        with open(create.FONT_PATH) as f:
+            glyphs = json.load(f)
+        for char, segments in glyphs.items():
+            glyph = create.FONT.glyph(char)
+            self.assertEqual(sum(n - 1 for n in glyph.sizes), len(segments), char)
+
+
+class PackedFontTests(unittest.TestCase):
+    def test_shipped_fonts_are_packed_from_their_json(self):
+        for name, path in strokefont.stroke_fonts().items():
+            with self.subTest(font=name):
+                with open(path, "rb") as f:
+                    sha1 = hashlib.sha1(f.read()).digest()
+                packed = strokefont.PackedStrokeFont(
+                    os.path.splitext(path)[0] + strokefont.PACKED_EXT)
+                self.assertEqual(packed.source_sha1, sha1,
+                                 "stale .sfont: run python GUI/strokefont.py fonts/*.json")
+
+    def test_packed_glyphs_match_the_json(self):
+        path = os.path.join(strokefont.FONT_DIR, "font_simplex.json")
+        parsed = strokefont.StrokeFont.from_json(path)
+        with tempfile.TemporaryDirectory() as tmp:
+            packed = strokefont.PackedStrokeFont(
+                strokefont.pack_json(path, os.path.join(tmp, "simplex.sfont")))
+            self.assertEqual(sorted(packed.chars()), sorted(parsed.chars()))
+            self.assertEqual(packed._compiled, {})  # nothing decoded up front
+            for char in parsed.chars():
+                a, b = parsed.glyph(char), packed.glyph(char)
+                self.assertEqual(a.sizes, b.sizes, char)
+                np.testing.assert_allclose(a.points, b.points, atol=1e-5)
+            self.assertIsNone(packed.glyph("\u00e9"))
+
+    def test_edited_json_is_not_shadowed_by_its_old_pack(self):
+        self.addCleanup(strokefont._fonts.clear)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mine.json")
+            with open(path, "w") as f:
+                json.dump({"I": [[[0, 0], [0, 10]]]}, f)
+            strokefont.pack_json(path)
+            self.assertIsInstance(strokefont.open_font(path), strokefont.PackedStrokeFont)
+            with open(path, "w") as f:
+                json.dump({"I": [[[5, 0], [5, 10]]]}, f)
+            strokefont._fonts.clear()
+            font = strokefont.open_font(path)
+            self.assertIsInstance(font, strokefont.StrokeFont)
+            self.assertEqual(font.glyph("I").points[0].tolist(), [5.0, 0.0])
+            self.assertEqual(strokefont.stroke_fonts(tmp), {"mine": path})
+
+    def test_not_a_packed_font(self):
+        with tempfile.NamedTemporaryFile(suffix=".sfont") as f:
+            f.write(b"{}" * 40)
+            f.flush()
+            with self.assertRaises(ValueError):
+                strokefont.PackedStrokeFont(f.name)
+
+
+class LayoutTests(unittest.TestCase):
+    def setUp(self):
+        self.font = strokefont.open_font(os.path.join(strokefont.FONT_DIR, "font_simplex.json"))
+
+    def test_advances_follow_the_strokes(self):
+        layout = strokefont.TextLayout(self.font, gap=2, space=6)
+        self.assertAlmostEqual(layout.width("iii"), 4)  # three bare stems, two gaps
+        self.assertAlmostEqual(layout.width("WWW"), 3 * 9.5 + 4)
+        self.assertAlmostEqual(layout.width("i i"), 2 + 6 + 2)
+        offsets, _ = layout.place("ii")
+        # "i" is a stem at x = 4.75 in its cell: drawn so the stem lands on 0
+        self.assertEqual([round(x, 2) for x in offsets], [-4.75, -2.75])
+
+    def test_kerning_pairs_adjust_the_gap(self):
+        plain = strokefont.TextLayout(self.font, gap=2)
+        kerned = strokefont.TextLayout(self.font, gap=2, kerning={"AV": -1.5})
+        self.assertAlmostEqual(kerned.width("AVA"), plain.width("AVA") - 1.5)
+        self.assertEqual(kerned.place("VA"), plain.place("VA"))
+
+    def test_metrics_are_measured_once_per_font(self):
+        strokefont.TextLayout(self.font, gap=2).width("HI")
+        box = self.font._bounds["H"]
+        self.assertIs(strokefont.TextLayout(self.font, gap=5).font.bounds("H"), box)
+        self.assertEqual(self.font.cap_height(), 9.5)
+
+    def test_console_labels_are_no_wider_than_fixed_cells(self):
+        for text in ("SN-00042", "iii", "Pump 7"):
+            self.assertLessEqual(create.text_width(text), len(text) * 12 - 2)
+
+
+class GridTests(unittest.TestCase):
+    def test_glyph_gcode_cuts_exactly_the_font_segments(self):
+        with open(create.FONT_PATH) as f:
+            glyphs = json.load(f)
+        for char in "AB8kx?":
+            expected = {frozenset(((f"{x1:.2f}", f"{y1:.2f}"), (f"{x2:.2f}", f"{y2:.2f}")))
+                        for (x1, y1), (x2, y2) in glyphs[char]}
+            self.assertEqual(engraved(create.draw_text(char, 0, 0)), expected, char)
+
+    def test_joined_strokes_do_not_retract(self):
+        gcode = create.draw_text("O", 0, 0)
+        self.assertEqual(gcode.count(f"G0 Z{create.SAFE_Z:.2f}"), 1)
+
+    def test_fill_holes_matches_percent_format(self):
+        values = [0, 0.125, 0.375, 2.675, -0.001, -3.5, 12.345, 999.995, 1234.5]
+        text = "".join(f"<{create.HOLE}>" for _ in values)
+        self.assertEqual(create.fill_holes(text, values),
+                         "".join(f"<{v:.2f}>" for v in values))
+        with self.assertRaises(ValueError):
+            create.fill_holes(create.HOLE, [1, 2])
+
+    def test_grid_file_has_every_label_and_pass(self):
+        labels = [f"SN-{i:04d}" for i in range(create.CHUNK_LABELS + 5)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "grid.gcode")
+            with contextlib.redirect_stdout(io.StringIO()):
+                create.generate_grid_gcode(labels, path)
+            with open(path) as f:
+                lines = f.read().split("\n")
+        self.assertEqual(lines[0], "G21 ; mm")
+        self.assertEqual(lines[-1], "M30 ; End of job")
+        self.assertIn(f"( Label {len(labels)}: '{labels[-1]}' at row 86, col 2 )", lines)
+        self.assertEqual(sum(line.startswith("( Cut Label") for line in lines),
+                         4 * len(labels))
+        self.assertNotIn("", lines)
+
+    def test_missing_character_is_skipped_with_a_warning(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            gcode = create.draw_text("Aé", 0, 0)
+        self.assertIn("not found", out.getvalue())
+        self.assertEqual(gcode, create.draw_text("A", 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()